@@ -1,9 +1,46 @@
+import os
+import time
+import textwrap
 import pandas as pd
-from typing import Dict, Any, Tuple, List, Union
-from config import Config
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Dict, Any, Tuple, List, Union, Callable, Optional
+from config import Config, ApiSettings
+import metrics
 from api_client import APIClient
 from script_executor import ScriptExecutor
-import json
+from completion_cache import CompletionCache
+from dataset_cache import to_json_rows
+from prompt_compactor import compact_data_sections, estimate_tokens
+from script_validator import validate_script, find_slow_patterns, SLOW_PATTERNS
+import sql_engine
+
+# 提示词中的脚本示例
+SCRIPT_EXAMPLE = """def analyze_data(df):
+    try:
+        df = df.copy()
+
+        output.start_section("分析结果")
+
+        # 数据处理
+        df['成绩'] = pd.to_numeric(df['成绩'], errors='coerce')
+        result_df = df[df['成绩'] < 60].copy()
+
+        # 统计和输出
+        output.add_stat("筛选结果数量", len(result_df))
+
+        if len(result_df) > 0:
+            result_df = result_df[['班级', '学号', '姓名', '成绩']].sort_values('成绩')
+            output.add_table(result_df, "详细名单")
+
+        output.end_section()
+        return df
+
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return None
+"""
 
 def create_excel_info(df: pd.DataFrame) -> Dict[str, Any]:
     """创建Excel文件信息字典，确保所有数据都是JSON可序列化的"""
@@ -14,22 +51,181 @@ def create_excel_info(df: pd.DataFrame) -> Dict[str, Any]:
     return {
         'columns': columns,
         'preview': preview_str,
+        'head_rows': to_json_rows(df.head()),
         'row_count': len(df),
         'dtypes': dtypes_dict
     }
 
+def create_excel_info_from_profile(profile: Dict[str, Any], dtypes: Dict[str, str] = None) -> Dict[str, Any]:
+    """根据流式概况创建文件信息字典，无需将整个数据集读入内存"""
+    columns = [str(col) for col in profile['columns']]
+    head = pd.DataFrame(profile['head'][:5], columns=columns)
+    
+    return {
+        'columns': columns,
+        'preview': head.to_string(index=False),
+        'head_rows': profile['head'][:5],
+        'row_count': profile['row_count'],
+        'dtypes': dtypes or {str(col): str(dtype) for col, dtype in profile['dtypes'].items()}
+    }
+
+def sheet_paths(excel_info: Dict[str, Any]) -> Optional[Dict[str, str]]:
+    """多工作表分析时返回 {工作表名: 缓存数据集路径}（第一项为 df 对应的工作表），单表分析返回 None"""
+    sheets = excel_info.get('sheets') or []
+    if len(sheets) < 2:
+        return None
+    return {sheet['name']: sheet['path'] for sheet in sheets}
+
+def describe_sheets(excel_info: Dict[str, Any], engine: str = 'pandas', max_columns: int = 40) -> str:
+    """列出本次分析可用的其他工作表及其列，加入提示词"""
+    sheets = excel_info.get('sheets') or []
+    if len(sheets) < 2:
+        return ""
+    if engine == 'sql':
+        lines = [f"除表 {sql_engine.TABLE_NAME}（工作表「{sheets[0]['name']}」）外，以下工作表也已按名称注册为表，"
+                 f"查询时用双引号括起表名，如 \"{sheets[1]['name']}\"："]
+    else:
+        lines = [f"脚本中可通过 sheets[\"工作表名\"] 获取以下工作表的DataFrame"
+                 f"（df 即工作表「{sheets[0]['name']}」，其余工作表只在访问时加载）："]
+    for sheet in sheets[1:]:
+        columns = [f"{col}({dtype})" for col, dtype in sheet['dtypes'].items()]
+        if len(columns) > max_columns:
+            columns = columns[:max_columns] + [f"等共{len(columns)}列"]
+        lines.append(f"- 工作表「{sheet['name']}」，{sheet['row_count']}行：{', '.join(columns)}")
+    return "\n".join(lines)
+
+def dtype_notes(dtypes: Dict[str, str]) -> str:
+    """导入时压缩过的列类型在脚本中需要注意的用法"""
+    notes = []
+    if any(dtype == 'category' for dtype in dtypes.values()):
+        notes.append("category 类型的列只能取已有的类别：用新值 fillna、赋值或 replace 会抛出 TypeError，"
+                     "做这些操作或字符串拼接前先 astype(str)；groupby 时传入 observed=True")
+    if any(dtype in ('int8', 'int16', 'int32') for dtype in dtypes.values()):
+        notes.append("int32 等较小整数类型的列相乘、累乘等结果可能超出范围的运算前先 astype('int64')")
+    return "\n".join(f"- {note}" for note in notes)
+
+class AttemptStats:
+    """按提示中是否包含列概况分组，统计每次成功分析平均需要的尝试次数"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._groups: Dict[str, Dict[str, int]] = {}
+
+    def record(self, group: str, attempts: int, success: bool):
+        with self._lock:
+            counters = self._groups.setdefault(group, {'successes': 0, 'failures': 0, 'success_attempts': 0})
+            if success:
+                counters['successes'] += 1
+                counters['success_attempts'] += attempts
+            else:
+                counters['failures'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                group: dict(counters, avg_attempts_per_success=round(
+                    counters['success_attempts'] / counters['successes'], 4) if counters['successes'] else None)
+                for group, counters in self._groups.items()
+            }
+
+attempt_stats = AttemptStats()
+
+class PerformanceStats:
+    """统计生成脚本中低效写法的出现次数，以及向量化改写的次数和加速比"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.patterns: Dict[str, int] = {}
+        self.rewrites = 0
+        self.improved = 0
+        self.speedups: List[float] = []
+
+    def record_patterns(self, patterns: List[Tuple[str, int]]):
+        with self._lock:
+            for name in {name for name, _ in patterns}:
+                self.patterns[name] = self.patterns.get(name, 0) + 1
+
+    def record_rewrite(self, speedup: Optional[float]):
+        """speedup 为改写前后执行耗时之比，改写失败或未变快时为 None"""
+        with self._lock:
+            self.rewrites += 1
+            if speedup is not None:
+                self.improved += 1
+                self.speedups.append(speedup)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'patterns': dict(self.patterns),
+                'rewrites': self.rewrites,
+                'improved': self.improved,
+                'avg_speedup': round(sum(self.speedups) / len(self.speedups), 2) if self.speedups else None,
+                'max_speedup': round(max(self.speedups), 2) if self.speedups else None
+            }
+
+perf_stats = PerformanceStats()
+
+def slow_script_context(patterns: List[Tuple[str, int]], seconds: float, row_count: int) -> str:
+    """生成请求向量化改写的错误上下文"""
+    lines = [f"- 第{lineno}行：{SLOW_PATTERNS[name]}" for name, lineno in patterns]
+    return (f"脚本执行成功，但处理{row_count}行数据耗时{seconds:.1f}秒，检测到以下低效写法：\n" + "\n".join(lines) +
+            "\n请在保持分析逻辑和输出内容不变的前提下，改写为向量化的 pandas/numpy 实现："
+            "用列运算、np.where、groupby/agg、merge 等替代逐行遍历和 apply(axis=1)，不要对同一个 DataFrame 反复调用 copy() 或在循环中复制。")
+
 class Analyzer:
-    def __init__(self, api_key: str, api_base: str = None, api_type: str = "openai"):
-        self.api_client = APIClient(api_key, api_type, api_base)
+    def __init__(self, api_key: str, api_base: str = None, api_type: str = "openai", max_retries: int = None):
+        self.api_client = APIClient.get_client(api_key, api_type, api_base)
         self.script_executor = ScriptExecutor()
+        self.completion_cache = CompletionCache.get_instance()
+        # 在创建时确定，之后其他请求修改全局配置不会影响进行中的分析
+        self.max_retries = max_retries or Config.MAX_RETRIES
+
+    @classmethod
+    def from_settings(cls, settings: ApiSettings) -> 'Analyzer':
+        """根据单次请求的API配置快照创建分析器"""
+        return cls(settings.api_key, settings.api_base, settings.api_type, settings.max_retries)
 
     def get_models(self) -> List[str]:
         """获取可用模型列表"""
         return self.api_client.get_models()
 
-    def _build_prompt(self, user_query: str, excel_info: Dict[str, Any], error_context: str = None) -> str:
-        """构建分析提示"""
-        type_info = "\n".join([f"{col}: {dtype}" for col, dtype in excel_info['dtypes'].items()])
+    def _build_prompt(self, user_query: str, excel_info: Dict[str, Any], error_context: str = None,
+                      engine: str = 'pandas') -> str:
+        """构建分析提示（engine 为 'sql' 时要求生成SQL），数据描述部分按 PROMPT_TOKEN_BUDGET 压缩"""
+        render = self._render_sql_prompt if engine == 'sql' else self._render_prompt
+        budget = Config.PROMPT_TOKEN_BUDGET
+        sheets_info = describe_sheets(excel_info, engine)
+        dtype_note = dtype_notes(excel_info.get('dtypes') or {}) if engine != 'sql' else ""
+        empty_sections = {'type_info': '', 'preview': '', 'profile_info': '',
+                          'sheets_info': sheets_info, 'dtype_note': dtype_note}
+        fixed_tokens = estimate_tokens(render(user_query, empty_sections, error_context))
+        sections, decisions = compact_data_sections(user_query, excel_info, max(0, budget - fixed_tokens))
+        sections['sheets_info'] = sheets_info
+        sections['dtype_note'] = dtype_note
+        prompt = render(user_query, sections, error_context)
+        
+        if decisions['compacted']:
+            print(f"提示词约{estimate_tokens(prompt)} tokens（预算{budget}），已压缩：共{decisions['columns']}列，"
+                  f"保留详情{decisions.get('detailed_columns', decisions['columns'])}列，"
+                  f"仅列名{decisions.get('listed_columns', 0)}列，省略{decisions.get('omitted_columns', 0)}列，"
+                  f"预览单元格截断至{decisions['preview_cell_width']}字符，"
+                  f"相关度最高的列：{decisions.get('top_columns', [])}")
+        else:
+            print(f"提示词约{estimate_tokens(prompt)} tokens（预算{budget}），未压缩")
+        return prompt
+
+    def _render_prompt(self, user_query: str, sections: Dict[str, str], error_context: str = None) -> str:
+        """用数据描述部分填充提示模板"""
+        type_info = sections['type_info']
+        if sections.get('dtype_note'):
+            type_info += f"\n列类型说明（导入时已按取值压缩列类型）：\n{sections['dtype_note']}"
+        sheets_info = f"\n{sections['sheets_info']}\n" if sections.get('sheets_info') else ""
+        profile_info = ""
+        if sections['profile_info']:
+            profile_info = f"""
+列概况（基于全部数据；"可转为数值"为文本列中能解析为数字的比例）：
+{sections['profile_info']}
+"""
         
         base_prompt = f"""
 分析任务：
@@ -43,8 +239,8 @@ Excel文件信息：
 {type_info}
 
 数据预览：
-{excel_info['preview']}
-
+{sections['preview']}
+{profile_info}{sheets_info}
 分析要求：
 1. 关注核心需求
    根据用户的实际查询需求进行分析，如果用户没有要求基础统计分析，
@@ -103,30 +299,7 @@ Excel文件信息：
 技术规范：
 1. 函数定义：
    ```python
-   def analyze_data(df):
-    try:
-        df = df.copy()
-        
-        output.start_section("分析结果")
-        
-        # 数据处理
-        df['成绩'] = pd.to_numeric(df['成绩'], errors='coerce')
-        result_df = df[df['成绩'] < 60].copy()
-        
-        # 统计和输出
-        output.add_stat("筛选结果数量", len(result_df))
-        
-        if len(result_df) > 0:
-            result_df = result_df[['班级', '学号', '姓名', '成绩']].sort_values('成绩')
-            output.add_table(result_df, "详细名单")
-        
-        output.end_section()
-        return df
-        
-    except Exception as e:
-        print(f"Error: {str(e)}")
-        return None
-   ```
+""" + textwrap.indent(SCRIPT_EXAMPLE, '   ') + """   ```
 
 2. 代码结构规范：
    - 所有代码块使用4空格缩进
@@ -151,60 +324,438 @@ Excel文件信息：
 """
         return base_prompt
 
-    def analyze(self, user_query: str, excel_info: Dict[str, Any], excel_path: str, model: str = None) -> Tuple[str, Union[Dict[str, Any], str], str]:
+    def _render_sql_prompt(self, user_query: str, sections: Dict[str, str], error_context: str = None) -> str:
+        """SQL引擎的提示模板：数据集已注册为 DuckDB 表 data，结果通过注释指令映射为分析部分"""
+        sheets_info = f"\n{sections['sheets_info']}\n" if sections.get('sheets_info') else ""
+        profile_info = ""
+        if sections['profile_info']:
+            profile_info = f"""
+列概况（基于全部数据）：
+{sections['profile_info']}
+"""
+        
+        prompt = f"""
+分析任务：
+根据以下要求编写 DuckDB SQL 查询完成数据分析。数据集已注册为表 {sql_engine.TABLE_NAME}，列名与下方一致，
+列名包含空格、中文或特殊字符时用双引号括起。
+
+用户需求：
+{user_query}
+
+表 {sql_engine.TABLE_NAME} 的列名及数据类型：
+{sections['type_info']}
+
+数据预览：
+{sections['preview']}
+{profile_info}{sheets_info}
+输出格式：
+每条查询以分号结尾，并在查询前用注释指令说明结果的展示方式：
+   ```sql
+   -- section: 销售概况
+   -- stat: 总销售额
+   SELECT SUM("销售额") FROM data;
+   -- table: 各地区销售额
+   SELECT "地区", SUM("销售额") AS "销售额" FROM data GROUP BY "地区" ORDER BY 2 DESC;
+   -- text: 对结果的简要说明
+   ```
+   - section 开始一个新的分析部分
+   - stat 查询只返回一行；返回多列时每列作为一项统计
+   - table 查询的结果作为表格展示
+   - text 添加一段说明文字
+
+查询要求：
+1. 只使用 SELECT 或 WITH 查询，不修改数据，不读取其他文件
+2. 只输出与用户需求直接相关的结果，明细查询使用 LIMIT 限制行数
+3. 文本列需要比较数值时使用 TRY_CAST 转换
+"""
+        if error_context:
+            prompt += f"""
+修正说明：
+前次SQL存在以下问题：
+{error_context}
+"""
+        prompt += """
+请直接返回完整的SQL，不要包含其他说明。
+"""
+        return prompt
+
+    @staticmethod
+    def _emit(on_event: Optional[Callable[[str, Dict[str, Any]], None]], event: str, **info):
+        """向调用方报告分析进度，回调异常不影响分析流程"""
+        if on_event is None:
+            return
+        try:
+            on_event(event, info)
+        except Exception as e:
+            print(f"进度回调失败: {str(e)}")
+
+    def _generate(self, user_query: str, excel_info: Dict[str, Any], model: str, error_context: Optional[str],
+                  attempt: int, use_cache: bool = True, temperature: float = 0.5,
+                  on_event: Callable[[str, Dict[str, Any]], None] = None, stream: bool = False,
+                  engine: str = 'pandas', **event_info) -> Tuple[Optional[str], Optional[str], str, bool]:
+        """
+        生成（或复用缓存的）脚本并做执行前静态预检，返回 (脚本, 错误信息, 脚本缓存键, 是否复用缓存)。
+        脚本生成失败时脚本为 None；预检未通过时返回脚本和预检错误。
+        """
+        # 相同数据结构、查询和错误上下文下已验证可用的脚本直接复用
+        cache_key = self.completion_cache.make_key(excel_info, user_query, model, error_context, engine)
+        cached_script = self.completion_cache.get(cache_key) if use_cache else None
+        
+        if cached_script is not None:
+            script = cached_script
+        else:
+            # 生成脚本
+            self._emit(on_event, 'generating', attempt=attempt, max_attempts=self.max_retries, **event_info)
+            with metrics.timer('build_prompt', attempt=attempt):
+                prompt = self._build_prompt(user_query, excel_info, error_context, engine)
+            on_token = None
+            if stream:
+                on_token = lambda text: self._emit(on_event, 'token', attempt=attempt, text=text)
+            with metrics.timer('llm_generate', attempt=attempt):
+                script = self.api_client.generate_completion(prompt, model, temperature, on_token=on_token)
+            
+            if script.startswith("生成脚本时出错"):
+                metrics.inc('analysis_attempts_total', model=model or '', result='generation_error')
+                return None, f"生成脚本失败: {script}", cache_key, False
+                
+            # 清理和格式化代码
+            script = sql_engine.clean_sql(script) if engine == 'sql' else self.script_executor._clean_code(script)
+        
+        # 执行前静态预检：语法、入口函数、禁止的导入和不存在的列，不通过时无需启动执行进程
+        with metrics.timer('validate', attempt=attempt):
+            if engine == 'sql':
+                validation_error = sql_engine.validate_sql(script)
+            else:
+                validation_error = validate_script(script, excel_info.get('columns'))
+        if validation_error:
+            self.completion_cache.invalidate(cache_key)
+            metrics.inc('analysis_attempts_total', model=model or '', result='validation_error')
+            return script, validation_error, cache_key, cached_script is not None
+        return script, None, cache_key, cached_script is not None
+
+    def _record_execution(self, cache_key: str, script: str, model: str, success: bool):
+        """记录一次脚本执行的结果：成功的脚本写入缓存，执行失败的脚本不能再被复用"""
+        metrics.inc('analysis_attempts_total', model=model or '', result='success' if success else 'execution_error')
+        if success:
+            self.completion_cache.set(cache_key, script)
+        else:
+            self.completion_cache.invalidate(cache_key)
+
+    def _attempt(self, user_query: str, excel_info: Dict[str, Any], excel_path: str, model: str,
+                 error_context: Optional[str], attempt: int, use_cache: bool = True, temperature: float = 0.5,
+                 on_event: Callable[[str, Dict[str, Any]], None] = None, cancel_event: threading.Event = None,
+                 stream: bool = False, timing: Dict[str, float] = None, engine: str = 'pandas',
+                 **event_info) -> Tuple[Optional[str], Union[Dict[str, Any], str], bool]:
+        """
+        执行一次“生成（或复用缓存脚本）→ 执行”尝试。
+        返回 (脚本, 执行结果或错误信息, 是否成功)；脚本生成失败时脚本为 None。
+        提供 timing 时写入本次执行的总耗时 timing['execute']（含排队等待）和
+        工作进程内测得的脚本运行时间 timing['script_run']（秒）。
+        engine 为 'sql' 时生成SQL并由嵌入式 DuckDB 执行。
+        """
+        script, error, cache_key, cached = self._generate(
+            user_query, excel_info, model, error_context, attempt, use_cache=use_cache, temperature=temperature,
+            on_event=on_event, stream=stream, engine=engine, **event_info
+        )
+        if error:
+            return script, error, False
+        
+        # 执行脚本
+        self._emit(on_event, 'executing', attempt=attempt, max_attempts=self.max_retries,
+                   script=script, cached=cached, **event_info)
+        on_section = None
+        if stream:
+            on_section = lambda section: self._emit(on_event, 'section', attempt=attempt, section=section)
+        start = time.perf_counter()
+        with metrics.timer('execute', attempt=attempt):
+            if engine == 'sql':
+                result, success = sql_engine.execute(script, excel_path, cancel_event, on_section,
+                                                     sheet_paths(excel_info))
+            else:
+                result, success = self.script_executor.execute(script, excel_path, cancel_event, on_section,
+                                                               sheet_paths(excel_info), timing)
+        if timing is not None:
+            timing['execute'] = time.perf_counter() - start
+        
+        if cancel_event is not None and cancel_event.is_set():
+            return script, "分析已取消", False
+        
+        self._record_execution(cache_key, script, model, success)
+        return script, result, success
+
+    @staticmethod
+    def resolve_engine(engine: Optional[str], excel_path: str) -> str:
+        """确定本次分析使用的引擎：'auto' 时缓存数据集超过 SQL_ENGINE_AUTO_BYTES 字节使用SQL引擎"""
+        engine = engine or Config.ANALYSIS_ENGINE
+        if engine == 'auto':
+            large = os.path.getsize(excel_path) >= Config.SQL_ENGINE_AUTO_BYTES
+            engine = 'sql' if large and sql_engine.available() else 'pandas'
+        elif engine == 'sql' and not sql_engine.available():
+            print("未安装 duckdb，改用 pandas 引擎")
+            engine = 'pandas'
+        elif engine not in ('pandas', 'sql'):
+            engine = 'pandas'
+        return engine
+
+    def analyze(self, user_query: str, excel_info: Dict[str, Any], excel_path: str, model: str = None,
+                use_cache: bool = True, on_event: Callable[[str, Dict[str, Any]], None] = None,
+                cancel_event: threading.Event = None, stream: bool = False,
+                speculative: Dict[str, Any] = None, engine: str = None) -> Tuple[str, Union[Dict[str, Any], str], str]:
         """
         分析数据并返回结果。
+        use_cache 为 False 时跳过已缓存的脚本强制重新生成（新脚本成功后仍会写入缓存）。
+        on_event(事件名, 信息) 在生成和执行各阶段被调用；cancel_event 被设置后停止重试并终止正在执行的脚本。
+        stream 为 True 时额外推送模型输出片段（token）和每个完成的分析部分（section）。
+        speculative 为 {'candidates': K, 'max_llm_calls': N} 时使用推测式并行生成（仅 pandas 引擎）。
+        engine 为 'pandas'、'sql' 或 'auto'，默认取 ANALYSIS_ENGINE。
         返回元组: (生成的代码, 执行结果, 错误/状态信息)
         """
+        engine = self.resolve_engine(engine, excel_path)
+        if speculative is not None and engine == 'pandas':
+            return self._analyze_speculative(user_query, excel_info, excel_path, model, speculative,
+                                             use_cache, on_event, cancel_event)
+        
         script = None
         error_context = None
         attempts = 0
+        stats_group = 'with_profile' if excel_info.get('column_profile') else 'without_profile'
         
-        while attempts < Config.MAX_RETRIES:
+        while attempts < self.max_retries:
+            if cancel_event is not None and cancel_event.is_set():
+                return script or "", "", "分析已取消"
             attempts += 1
+            timing = {}
             try:
-                # 生成脚本
-                prompt = self._build_prompt(user_query, excel_info, error_context)
-                script = self.api_client.generate_completion(prompt, model)
+                attempt_script, result, success = self._attempt(
+                    user_query, excel_info, excel_path, model, error_context, attempts,
+                    use_cache=use_cache, on_event=on_event, cancel_event=cancel_event, stream=stream, timing=timing,
+                    engine=engine
+                )
                 
-                if script.startswith("生成脚本时出错"):
-                    error_context = f"生成脚本失败: {script}"
-                    continue
-                    
-                # 清理和格式化代码
-                script = self.script_executor._clean_code(script)
+                if cancel_event is not None and cancel_event.is_set():
+                    return attempt_script or script or "", "", "分析已取消"
                 
-                # 执行脚本
-                result, success = self.script_executor.execute(script, excel_path)
+                if attempt_script is None:
+                    error_context = result
+                    continue
+                script = attempt_script
                 
                 if not success:
                     error_context = result
-                    if attempts < Config.MAX_RETRIES:
+                    if attempts < self.max_retries:
                         continue
                     else:
-                        return script, "", f"尝试{Config.MAX_RETRIES}次后失败。最后的错误：{error_context}"
+                        attempt_stats.record(stats_group, attempts, False)
+                        return script, "", f"尝试{self.max_retries}次后失败。最后的错误：{error_context}"
                 else:
+                    attempt_stats.record(stats_group, attempts, True)
+                    note = ""
+                    if Config.PERF_REWRITE_ENABLED and engine == 'pandas':
+                        script, result, note = self._vet_performance(
+                            user_query, excel_info, excel_path, model, script, result, error_context,
+                            timing.get('script_run', 0.0), attempts + 1, on_event, cancel_event, stream
+                        )
                     # 检查是否返回了结构化结果
                     is_structured = isinstance(result, dict) and 'sections' in result
-                    
-                    # 确保结构化结果中的所有数据都是可序列化的
-                    if is_structured:
-                        try:
-                            # 尝试序列化结果，确保它可以被JSON化
-                            json.dumps(result)
-                        except Exception as e:
-                            print(f"结果序列化失败: {str(e)}")
-                            # 如果序列化失败，返回错误信息
-                            return script, str(result), f"成功（尝试次数：{attempts}）- 但结果无法序列化为JSON"
-                            
-                    status = f"成功（尝试次数：{attempts}）" + (" - 结构化输出" if is_structured else "")
+                    status = f"成功（尝试次数：{attempts}）" + (" - 结构化输出" if is_structured else "") + note
+                    if engine == 'sql':
+                        status += " - SQL引擎"
                     return script, result, status
                     
             except Exception as e:
                 error_context = str(e)
-                if attempts < Config.MAX_RETRIES:
+                if attempts < self.max_retries:
                     continue
                 else:
-                    return script or "生成失败", "", f"重试{Config.MAX_RETRIES}次后失败。最后的错误：{error_context}"
+                    attempt_stats.record(stats_group, attempts, False)
+                    return script or "生成失败", "", f"重试{self.max_retries}次后失败。最后的错误：{error_context}"
+        
+        attempt_stats.record(stats_group, attempts, False)
+        return script or "生成失败", "", f"重试次数过多（{self.max_retries}次），停止重试。最后的错误：{error_context}"
+
+    def analyze_batch(self, user_queries: List[str], excel_info: Dict[str, Any], excel_path: str, model: str = None,
+                      use_cache: bool = True, engine: str = None) -> List[Tuple[str, Union[Dict[str, Any], str], str]]:
+        """
+        批量分析同一数据集上的多个查询，返回与 user_queries 一一对应的 (生成的代码, 执行结果, 错误/状态信息)。
+        每轮并发生成所有未完成查询的脚本，预检通过的脚本在同一个工作进程中批量执行，数据集只加载一次；
+        失败的查询带着各自的错误上下文进入下一轮，互不影响。SQL引擎下各查询依次在 DuckDB 中执行。
+        """
+        engine = self.resolve_engine(engine, excel_path)
+        count = len(user_queries)
+        scripts: List[Optional[str]] = [None] * count
+        errors: List[Optional[str]] = [None] * count
+        outcomes: List[Optional[Tuple[str, Union[Dict[str, Any], str], str]]] = [None] * count
+        stats_group = 'with_profile' if excel_info.get('column_profile') else 'without_profile'
+        sheets = sheet_paths(excel_info)
+        
+        pending = list(range(count))
+        pool = ThreadPoolExecutor(max_workers=max(1, min(count, Config.BATCH_GENERATION_CONCURRENCY)))
+        try:
+            for attempt in range(1, self.max_retries + 1):
+                if not pending:
+                    break
+                # 在生成线程中沿用当前请求的指标标签和耗时收集
+                futures = [pool.submit(contextvars.copy_context().run, self._generate, user_queries[index], excel_info,
+                                       model, errors[index], attempt, use_cache=use_cache, engine=engine)
+                           for index in pending]
+                executable = []
+                for index, future in zip(pending, futures):
+                    try:
+                        script, error, cache_key, _ = future.result()
+                    except Exception as e:
+                        script, error, cache_key = None, str(e), None
+                    scripts[index] = script or scripts[index]
+                    if error:
+                        errors[index] = error
+                    else:
+                        executable.append((index, script, cache_key))
+                
+                with metrics.timer('execute', attempt=attempt):
+                    if engine == 'sql':
+                        results = [sql_engine.execute(script, excel_path, sheets=sheets) for _, script, _ in executable]
+                    else:
+                        results = self.script_executor.execute_batch([script for _, script, _ in executable],
+                                                                     excel_path, sheets=sheets)
+                
+                for (index, script, cache_key), (result, success) in zip(executable, results):
+                    self._record_execution(cache_key, script, model, success)
+                    if not success:
+                        errors[index] = result
+                        continue
+                    attempt_stats.record(stats_group, attempt, True)
+                    is_structured = isinstance(result, dict) and 'sections' in result
+                    status = f"成功（尝试次数：{attempt}）" + (" - 结构化输出" if is_structured else "")
+                    if engine == 'sql':
+                        status += " - SQL引擎"
+                    outcomes[index] = (script, result, status)
+                pending = [index for index in pending if outcomes[index] is None]
+        finally:
+            pool.shutdown(wait=False)
+        
+        for index in pending:
+            attempt_stats.record(stats_group, self.max_retries, False)
+            outcomes[index] = (scripts[index] or "生成失败", "",
+                               f"尝试{self.max_retries}次后失败。最后的错误：{errors[index]}")
+        return outcomes
+
+    def _vet_performance(self, user_query: str, excel_info: Dict[str, Any], excel_path: str, model: str,
+                         script: str, result: Union[Dict[str, Any], str], error_context: Optional[str],
+                         seconds: float, attempt: int, on_event: Callable[[str, Dict[str, Any]], None] = None,
+                         cancel_event: threading.Event = None,
+                         stream: bool = False) -> Tuple[str, Union[Dict[str, Any], str], str]:
+        """
+        检查执行成功的脚本中的低效写法。脚本运行时间（seconds，工作进程内测得，不含排队等待）和数据行数都超过阈值时，
+        带着改写要求再生成一次，保留执行更快的版本；返回 (脚本, 结果, 状态补充说明)。
+        """
+        patterns = find_slow_patterns(script)
+        if not patterns:
+            return script, result, ""
+        perf_stats.record_patterns(patterns)
+        for name in {name for name, _ in patterns}:
+            metrics.inc('slow_pattern_total', pattern=name)
+        
+        row_count = excel_info.get('row_count') or 0
+        if seconds < Config.PERF_REWRITE_MIN_SECONDS or row_count < Config.PERF_REWRITE_MIN_ROWS:
+            return script, result, ""
+        if cancel_event is not None and cancel_event.is_set():
+            return script, result, ""
+        
+        timing = {}
+        context = slow_script_context(patterns, seconds, row_count)
+        try:
+            new_script, new_result, success = self._attempt(
+                user_query, excel_info, excel_path, model, context, attempt,
+                on_event=on_event, cancel_event=cancel_event, stream=stream, timing=timing, optimizing=True
+            )
+        except Exception as e:
+            print(f"向量化改写失败: {str(e)}")
+            success = False
+        
+        new_seconds = timing.get('script_run')
+        if not success or new_seconds is None or new_seconds >= seconds:
+            perf_stats.record_rewrite(None)
+            return script, result, ""
+        
+        speedup = seconds / max(new_seconds, 1e-6)
+        perf_stats.record_rewrite(speedup)
+        # 之后相同的请求直接复用更快的版本
+        self.completion_cache.set(
+            self.completion_cache.make_key(excel_info, user_query, model, error_context), new_script)
+        return new_script, new_result, f" - 已改写为向量化实现（执行耗时{seconds:.2f}秒→{new_seconds:.2f}秒）"
+
+    def _analyze_speculative(self, user_query: str, excel_info: Dict[str, Any], excel_path: str, model: str,
+                             options: Dict[str, Any], use_cache: bool = True,
+                             on_event: Callable[[str, Dict[str, Any]], None] = None,
+                             cancel_event: threading.Event = None) -> Tuple[str, Union[Dict[str, Any], str], str]:
+        """
+        推测式并行分析：同时以不同温度生成K个候选脚本并在执行进程池中并行执行，
+        返回最先成功的结果并取消其余候选；只有失败的候选会带着各自的错误上下文进入下一轮修复，
+        模型调用总次数不超过 max_llm_calls。
+        """
+        candidates = max(1, min(int(options.get('candidates', Config.SPECULATIVE_CANDIDATES)),
+                                Config.SPECULATIVE_MAX_CANDIDATES))
+        max_llm_calls = max(1, min(int(options.get('max_llm_calls', candidates * self.max_retries)),
+                                   Config.SPECULATIVE_MAX_LLM_CALLS))
+        temperatures = Config.SPECULATIVE_TEMPERATURES
+        
+        pending = [{'index': i, 'error_context': None} for i in range(candidates)]
+        llm_calls = 0
+        last_script = None
+        last_error = None
+        pool = ThreadPoolExecutor(max_workers=candidates)
+        try:
+            for round_number in range(1, self.max_retries + 1):
+                batch = pending[:max_llm_calls - llm_calls]
+                if not batch:
+                    break
+                llm_calls += len(batch)
+                
+                candidate_events = [threading.Event() for _ in batch]
+                futures = {}
+                for candidate, candidate_event in zip(batch, candidate_events):
+                    # 在候选线程中沿用当前请求的指标标签和耗时收集
+                    future = pool.submit(
+                        contextvars.copy_context().run, self._attempt, user_query, excel_info, excel_path, model,
+                        candidate['error_context'], round_number,
+                        use_cache=use_cache and candidate['index'] == 0,
+                        temperature=temperatures[candidate['index'] % len(temperatures)],
+                        on_event=on_event, cancel_event=candidate_event,
+                        candidate=candidate['index'] + 1, candidates=candidates
+                    )
+                    futures[future] = candidate
+                
+                failed = []
+                not_done = set(futures)
+                while not_done:
+                    done, not_done = wait(not_done, timeout=0.1, return_when=FIRST_COMPLETED)
+                    if cancel_event is not None and cancel_event.is_set():
+                        for candidate_event in candidate_events:
+                            candidate_event.set()
+                        return last_script or "", "", "分析已取消"
+                    
+                    for future in done:
+                        candidate = futures[future]
+                        try:
+                            script, result, success = future.result()
+                        except Exception as e:
+                            script, result, success = None, str(e), False
+                        
+                        if success:
+                            # 取消其余仍在生成或执行的候选
+                            for candidate_event in candidate_events:
+                                candidate_event.set()
+                            is_structured = isinstance(result, dict) and 'sections' in result
+                            status = (f"成功（推测执行：第{round_number}轮，候选{candidate['index'] + 1}/{candidates}，"
+                                      f"模型调用{llm_calls}次）" + (" - 结构化输出" if is_structured else ""))
+                            return script, result, status
+                        
+                        candidate['error_context'] = result
+                        last_error = result
+                        last_script = script or last_script
+                        failed.append(candidate)
+                
+                pending = sorted(failed, key=lambda c: c['index'])
+        finally:
+            pool.shutdown(wait=False)
         
-        return script or "生成失败", "", f"重试次数过多（{Config.MAX_RETRIES}次），停止重试。最后的错误：{error_context}"
+        return last_script or "生成失败", "", f"推测执行失败（模型调用{llm_calls}次）。最后的错误：{last_error}"
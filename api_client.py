@@ -1,12 +1,50 @@
+import json
+import time
+import threading
 import requests
-from typing import Dict, List, Any
+from collections import OrderedDict
+from requests.adapters import HTTPAdapter
+from typing import Dict, List, Any, Callable
 from config import Config
 
 class APIClient:
+    # 进程级客户端注册表：(api_type, api_base, api_key) -> APIClient，复用连接池和模型列表缓存
+    _registry: 'OrderedDict[tuple, APIClient]' = OrderedDict()
+    _registry_lock = threading.Lock()
+
     def __init__(self, api_key: str, api_type: str = "openai", api_base: str = None):
         self.api_key = api_key
         self.api_type = api_type
         self.api_config = Config.get_api_config(api_type, api_base)
+        self.timeout = (Config.HTTP_CONNECT_TIMEOUT, Config.HTTP_READ_TIMEOUT)
+
+        # 保持长连接的会话，避免每次请求重新进行TCP/TLS握手
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                              pool_maxsize=Config.HTTP_POOL_MAXSIZE)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update(self._get_headers())
+
+        self._models = None
+        self._models_expire_at = 0.0
+        self._models_lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, api_key: str, api_type: str = "openai", api_base: str = None) -> 'APIClient':
+        """从注册表获取（或创建）共享的客户端实例"""
+        key = (api_type, api_base or '', api_key or '')
+        with cls._registry_lock:
+            client = cls._registry.get(key)
+            if client is None:
+                client = APIClient(api_key, api_type, api_base)
+                cls._registry[key] = client
+                while len(cls._registry) > Config.API_CLIENT_REGISTRY_SIZE:
+                    _, evicted = cls._registry.popitem(last=False)
+                    evicted.session.close()
+            else:
+                cls._registry.move_to_end(key)
+            return client
 
     def _get_headers(self) -> Dict[str, str]:
         """获取请求头"""
@@ -18,28 +56,41 @@ class APIClient:
         return headers
 
     def get_models(self) -> List[str]:
-        """获取可用模型列表"""
+        """获取可用模型列表（成功结果在 MODELS_CACHE_TTL 秒内复用）"""
+        with self._models_lock:
+            if self._models is not None and time.time() < self._models_expire_at:
+                return list(self._models)
+
         try:
-            response = requests.get(
+            response = self.session.get(
                 self.api_config['models_url'],
-                headers=self._get_headers()
+                timeout=self.timeout
             )
             response.raise_for_status()
             result = response.json()
             
             if self.api_type == "azure":
-                return ["gpt-35-turbo"]
+                models = ["gpt-35-turbo"]
             elif "data" in result:
-                return [model["id"] for model in result["data"]]
+                models = [model["id"] for model in result["data"]]
             else:
-                return ["gpt-3.5-turbo"]
+                models = ["gpt-3.5-turbo"]
                 
         except Exception as e:
             print(f"获取模型列表失败: {str(e)}")
             return ["gpt-3.5-turbo"]
 
-    def generate_completion(self, prompt: str, model: str = None, temperature: float = 0.5) -> str:
-        """生成完成响应"""
+        with self._models_lock:
+            self._models = models
+            self._models_expire_at = time.time() + Config.MODELS_CACHE_TTL
+        return list(models)
+
+    def generate_completion(self, prompt: str, model: str = None, temperature: float = 0.5,
+                            on_token: Callable[[str], None] = None) -> str:
+        """
+        生成完成响应。
+        提供 on_token 时使用流式接口（stream: true），每收到一段文本即回调一次，最终仍返回完整文本。
+        """
         try:
             if not model:
                 models = self.get_models()
@@ -55,10 +106,13 @@ class APIClient:
                 "max_tokens": 2000
             }
 
-            response = requests.post(
+            if on_token is not None:
+                return self._stream_completion(payload, on_token).strip()
+
+            response = self.session.post(
                 self.api_config['chat_url'],
-                headers=self._get_headers(),
-                json=payload
+                json=payload,
+                timeout=self.timeout
             )
             response.raise_for_status()
             result = response.json()
@@ -70,3 +124,29 @@ class APIClient:
                 
         except Exception as e:
             return f"生成脚本时出错: {str(e)}"
+
+    def _stream_completion(self, payload: Dict[str, Any], on_token: Callable[[str], None]) -> str:
+        """以SSE流式方式请求补全，逐段回调并拼接完整文本"""
+        payload = dict(payload, stream=True)
+        parts = []
+        with self.session.post(self.api_config['chat_url'], json=payload,
+                               timeout=self.timeout, stream=True) as response:
+            response.raise_for_status()
+            for raw_line in response.iter_lines():
+                line = raw_line.decode('utf-8')
+                if not line.startswith('data:'):
+                    continue
+                data = line[len('data:'):].strip()
+                if data == '[DONE]':
+                    break
+                chunk = json.loads(data)
+                choices = chunk.get('choices') or []
+                if not choices:
+                    continue
+                text = (choices[0].get('delta') or {}).get('content')
+                if text:
+                    parts.append(text)
+                    on_token(text)
+        if not parts:
+            raise Exception("API返回的响应格式不正确")
+        return ''.join(parts)
@@ -1,9 +1,20 @@
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, Response, request, jsonify, render_template, session
 import os
-import pandas as pd
+import json
+import re
+import uuid
 from werkzeug.utils import secure_filename
-from config import Config
-from analyzer import Analyzer, create_excel_info
+from config import Config, ApiSettings
+from analyzer import Analyzer, attempt_stats, perf_stats, create_excel_info_from_profile
+from dataset_cache import DatasetCache
+from dataset_profiler import get_profile, get_column_profile
+from executor_pool import ExecutorPool
+from workbook import list_sheets
+from completion_cache import CompletionCache
+from result_cache import ResultCache
+from result_store import HANDLE_PATTERN, read_table_rows
+from job_manager import JobManager, JobQueueFull
+import metrics
 
 app = Flask(__name__)
 app.secret_key = 'your-secret-key'  # 添加session支持
@@ -14,8 +25,29 @@ if not os.path.exists(Config.UPLOAD_FOLDER):
 
 @app.route('/')
 def index():
+    # 浏览器打开页面时分配会话ID，之后提交的任务按会话区分用户
+    if 'user_id' not in session:
+        session['user_id'] = uuid.uuid4().hex
     return render_template('index.html')
 
+def settings_json(settings: ApiSettings) -> dict:
+    return {
+        'type': settings.api_type,
+        'key': settings.api_key,
+        'base': settings.api_base,
+        'max_retries': settings.max_retries
+    }
+
+def request_settings(api_config: dict) -> ApiSettings:
+    """
+    生成本次请求使用的API配置快照。请求中的配置与已保存的不同时在后台更新配置文件，
+    不阻塞请求，也不影响其他请求进行中的分析。
+    """
+    config = Config.get_instance()
+    settings = ApiSettings.from_request(api_config, config.snapshot())
+    config.update_config(wait=False, **settings.as_config())
+    return settings
+
 @app.route('/save_api_config', methods=['POST'])
 def save_api_config():
     try:
@@ -26,32 +58,16 @@ def save_api_config():
         
         # 如果是空配置，则只返回当前配置
         if not api_config:
-            return jsonify({
-                'api_config': {
-                    'type': Config.API_TYPE,
-                    'key': Config.API_KEY,
-                    'base': Config.API_BASE,
-                    'max_retries': Config.MAX_RETRIES
-                }
-            })
+            return jsonify({'api_config': settings_json(config.snapshot())})
         
-        # 否则更新配置
-        success = config.update_config(
-            API_KEY=api_config.get('key'),
-            API_BASE=api_config.get('base'),
-            API_TYPE=api_config.get('type', 'openai'),
-            MAX_RETRIES=api_config.get('max_retries', 3)
-        )
+        # 否则更新配置（值未变化时不写文件）
+        settings = ApiSettings.from_request(api_config, config.snapshot())
+        success = config.update_config(**settings.as_config())
         
         if success:
             return jsonify({
                 'message': 'API配置已保存',
-                'api_config': {
-                    'type': Config.API_TYPE,
-                    'key': Config.API_KEY,
-                    'base': Config.API_BASE,
-                    'max_retries': Config.MAX_RETRIES
-                }
+                'api_config': settings_json(settings)
             })
         else:
             return jsonify({'error': '保存配置失败'}), 500
@@ -64,20 +80,7 @@ def get_models():
         data = request.get_json()
         api_config = data.get('api_config', {})
         
-        # 保存API配置
-        config = Config.get_instance()
-        config.update_config(
-            API_KEY=api_config.get('key'),
-            API_BASE=api_config.get('base'),
-            API_TYPE=api_config.get('type', 'openai'),
-            MAX_RETRIES=api_config.get('max_retries', 3)
-        )
-        
-        analyzer = Analyzer(
-            api_key=api_config.get('key'),
-            api_base=api_config.get('base'),
-            api_type=api_config.get('type', 'openai')
-        )
+        analyzer = Analyzer.from_settings(request_settings(api_config))
         
         models = analyzer.get_models()
         return jsonify({'models': models})
@@ -86,6 +89,10 @@ def get_models():
 
 @app.route('/upload', methods=['POST'])
 def upload_file():
+    with metrics.request_scope():
+        return _upload_file()
+
+def _upload_file():
     try:
         if 'file' not in request.files:
             return jsonify({'error': '没有上传文件'}), 400
@@ -99,24 +106,32 @@ def upload_file():
             filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
             file.save(filepath)
             
-            # 根据文件扩展名选择读取方式
-            file_ext = os.path.splitext(filepath)[1].lower()
-            if file_ext == '.csv':
-                df = pd.read_csv(filepath)
-            else:
-                df = pd.read_excel(filepath)
+            # 预热执行进程池，用户输入查询期间工作进程即可就绪
+            ExecutorPool.get_instance()
             
-            # 创建文件分析信息
-            analysis = create_excel_info(df)
+            # 流式生成概况（不将整个文件读入内存），并按概况中的列类型分块导入列式缓存
+            with metrics.timer('upload_profile'):
+                profile = get_profile(filepath)
+            metrics.update_scope(rows=metrics.rows_bucket(profile['row_count']))
+            cache = DatasetCache.get_instance()
+            with metrics.timer('upload_ingest'):
+                dataset_id = cache.ingest(filepath, profile['dtypes'])
             
-            # 创建两个预览：一个简短（10行）一个完整（最多100行）
-            preview_short = df.head(10).to_html(classes='table table-striped table-bordered', index=False)
-            preview_full = df.head(100).to_html(classes='table table-striped table-bordered', index=False)
+            # 预先计算逐列概况，分析请求直接复用
+            if Config.COLUMN_PROFILE_ENABLED:
+                with metrics.timer('upload_column_profile'):
+                    get_column_profile(filepath, cache.get_path(dataset_id))
             
-            analysis['preview'] = f"""
-                <div class="preview-short">{preview_short}</div>
-                <div class="preview-full" style="display: none;">{preview_full}</div>
-            """
+            # 创建文件分析信息；工作簿只列出工作表名称和行列数，其余工作表在分析中用到时才解析
+            analysis = create_excel_info_from_profile(profile, cache.schema_dtypes(dataset_id))
+            analysis['dataset_id'] = dataset_id
+            # 导入时列类型压缩前后的内存
+            analysis['memory'] = cache.memory_report(dataset_id)
+            with metrics.timer('upload_sheets'):
+                analysis['sheets'] = list_sheets(filepath)
+            
+            # 预览数据不再内嵌在响应中，前端通过 /datasets/<id>/rows 按需分页读取
+            analysis.pop('preview', None)
             
             return jsonify({
                 'filename': filename,
@@ -125,54 +140,101 @@ def upload_file():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def perform_analysis(data):
-    """执行分析并返回结果"""
+def run_analysis(data, on_event=None, cancel_event=None, stream=False, settings=None):
+    """
+    执行分析，返回 (响应数据, HTTP状态码)；同步请求和异步任务共用。
+    请求中 timing 为 true 时，响应中附带各阶段耗时明细。
+    settings 为调用方已生成的API配置快照，未提供时根据请求生成。
+    """
+    with metrics.request_scope(collect=bool(data.get('timing')), model=data.get('model') or '') as timings:
+        with metrics.timer('total'):
+            response_data, status_code = _run_analysis(data, on_event, cancel_event, stream, settings)
+    
+    if timings is not None:
+        response_data['timings'] = metrics.summarize(timings)
+    if status_code != 200:
+        result = 'bad_request'
+    else:
+        result = 'success' if response_data.get('success') else 'failed'
+    metrics.inc('analysis_requests_total', result=result)
+    return response_data, status_code
+
+def prepare_sheet(filepath, sheet=None):
+    """
+    获取工作表（sheet 为 None 时为第一个工作表或CSV文件）的概况和缓存数据集，返回 (概况, 数据集ID)。
+    每个工作表在第一次被分析用到时才解析，之后复用保存的概况和列式缓存。
+    """
+    with metrics.timer('profile'):
+        profile = get_profile(filepath, sheet)
+    cache = DatasetCache.get_instance()
+    with metrics.timer('ingest'):
+        dataset_id = cache.ingest(filepath, profile['dtypes'], sheet)
+    return profile, dataset_id
+
+def resolve_sheets(filepath, names):
+    """
+    校验请求中的工作表名，返回 [(工作表名, 缓存键)]；第一个工作表的缓存键为 None，与上传时的缓存共用。
+    名称不存在时抛出 ValueError。
+    """
+    available = [sheet['name'] for sheet in list_sheets(filepath)]
+    resolved = []
+    for name in names:
+        if not isinstance(name, str) or name not in available:
+            raise ValueError(f"工作表不存在: {name}")
+        if name not in [item[0] for item in resolved]:
+            resolved.append((name, None if name == available[0] else name))
+    return resolved
+
+def _run_analysis(data, on_event=None, cancel_event=None, stream=False, settings=None):
     filename = data.get('filename')
     query = data.get('query')
     model = data.get('model')
     api_config = data.get('api_config', {})
     retry_count = data.get('retry_count', 0)
+    regenerate = data.get('regenerate', False)
+    # 分析引擎："pandas"、"sql" 或 "auto"（默认取 ANALYSIS_ENGINE）
+    engine = data.get('engine')
+    # 参与分析的工作表名列表：第一个作为脚本中的 df，全部可通过 sheets["名称"] 引用；默认只用第一个工作表
+    sheet_names = data.get('sheets') or []
+    # 推测式并行生成：true 使用默认配置，或 {"candidates": K, "max_llm_calls": N}
+    speculative = data.get('speculative')
+    if speculative is True:
+        speculative = {}
     
-    # 保存API配置
-    config = Config.get_instance()
-    config.update_config(
-        API_KEY=api_config.get('key'),
-        API_BASE=api_config.get('base'),
-        API_TYPE=api_config.get('type', 'openai'),
-        MAX_RETRIES=api_config.get('max_retries', 3)
-    )
+    # 本次请求使用的API配置快照
+    settings = settings or request_settings(api_config)
     
     if not filename or not query:
-        return jsonify({'error': '缺少必要参数'}), 400
+        return {'error': '缺少必要参数'}, 400
         
-    filepath = os.path.join(Config.UPLOAD_FOLDER, filename)
+    filepath = os.path.join(Config.UPLOAD_FOLDER, secure_filename(filename))
     if not os.path.exists(filepath):
-        return jsonify({'error': '文件不存在'}), 404
+        return {'error': '文件不存在'}, 404
         
-    # 根据文件扩展名读取文件
-    file_ext = os.path.splitext(filepath)[1].lower()
-    if file_ext == '.csv':
-        df = pd.read_csv(filepath)
-    else:
-        df = pd.read_excel(filepath)
-    excel_info = create_excel_info(df)
+    if not isinstance(sheet_names, list):
+        return {'error': 'sheets 应为工作表名列表'}, 400
+    try:
+        sheets = resolve_sheets(filepath, sheet_names) if sheet_names else [(None, None)]
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    excel_info, dataset_path = load_analysis_data(filepath, sheets)
     
     # 创建分析器实例
-    analyzer = Analyzer(
-        api_key=api_config.get('key'),
-        api_base=api_config.get('base'),
-        api_type=api_config.get('type', 'openai')
-    )
+    analyzer = Analyzer.from_settings(settings)
     
     # 分析数据
-    script, result, status = analyzer.analyze(query, excel_info, filepath, model)
+    script, result, status = analyzer.analyze(query, excel_info, dataset_path, model,
+                                              use_cache=not regenerate, on_event=on_event,
+                                              cancel_event=cancel_event, stream=stream,
+                                              speculative=speculative if isinstance(speculative, dict) else None,
+                                              engine=engine)
     
     response_data = {
         'script': script,
         'retry_count': retry_count,
-        'can_retry': retry_count < Config.MAX_RETRIES - 1,
+        'can_retry': retry_count < settings.max_retries - 1,
         'attempt': retry_count + 1,
-        'max_attempts': Config.MAX_RETRIES
+        'max_attempts': settings.max_retries
     }
     
     if status.startswith("成功"):
@@ -189,63 +251,274 @@ def perform_analysis(data):
         })
     
     # 处理结果，确保它适合前端显示
+    response_data['result'] = structured_result(result)
+    return response_data, 200
+
+def load_analysis_data(filepath, sheets):
+    """
+    准备分析所需的文件信息和缓存数据集路径，返回 (excel_info, 数据集路径)。
+    sheets 为 resolve_sheets 的结果，第一个工作表作为 df。
+    """
+    # 复用上传时保存的概况，从列式缓存读取数据集（缓存被淘汰时重新导入）
+    primary_key = sheets[0][1]
+    profile, dataset_id = prepare_sheet(filepath, primary_key)
+    metrics.update_scope(rows=metrics.rows_bucket(profile['row_count']))
+    cache = DatasetCache.get_instance()
+    dataset_path = cache.get_path(dataset_id)
+    excel_info = create_excel_info_from_profile(profile, cache.schema_dtypes(dataset_id))
+    if Config.COLUMN_PROFILE_ENABLED:
+        with metrics.timer('column_profile'):
+            excel_info['column_profile'] = get_column_profile(filepath, dataset_path, primary_key)
+    
+    # 多工作表分析：其他工作表按需解析并单独缓存
+    if len(sheets) > 1:
+        excel_info['sheets'] = [{'name': sheets[0][0], 'path': dataset_path,
+                                 'row_count': excel_info['row_count'], 'dtypes': excel_info['dtypes']}]
+        for name, key in sheets[1:]:
+            sheet_profile, sheet_id = prepare_sheet(filepath, key)
+            excel_info['sheets'].append({
+                'name': name,
+                'path': cache.get_path(sheet_id),
+                'row_count': sheet_profile['row_count'],
+                'dtypes': cache.schema_dtypes(sheet_id) or sheet_profile['dtypes']
+            })
+    return excel_info, dataset_path
+
+def structured_result(result):
+    """将执行结果统一为前端显示的结构化格式"""
     if isinstance(result, dict):
-        # 如果已经是结构化结果，检查里面的数据确保都是可JSON序列化的
+        # 结构化结果在执行器中产生时已保证可JSON序列化，直接返回
         if 'sections' in result:
-            for section in result['sections']:
-                if 'data' in section and isinstance(section['data'], dict):
-                    # 确保所有值都是字符串或JSON可序列化的
-                    for key, value in section['data'].items():
-                        if isinstance(value, dict) or isinstance(value, list):
-                            # 已经是JSON格式，不需要处理
-                            pass
-                        else:
-                            # 确保它是字符串
-                            section['data'][key] = str(value)
-            response_data['result'] = result
-        else:
-            # 包装成结构化格式
-            response_data['result'] = {
-                'sections': [{
-                    'title': '分析结果',
-                    'content': [{'type': 'text', 'text': str(result)}],
-                    'data': {}
-                }]
-            }
-    else:
-        # 如果是普通文本结果，包装成结构化格式
-        response_data['result'] = {
+            return result
+        # 包装成结构化格式
+        return {
             'sections': [{
                 'title': '分析结果',
-                'content': [{'type': 'text', 'text': str(result) if result else '无结果'}],
+                'content': [{'type': 'text', 'text': str(result)}],
                 'data': {}
             }]
         }
-    
-    return jsonify(response_data)
+    # 如果是普通文本结果，包装成结构化格式
+    return {
+        'sections': [{
+            'title': '分析结果',
+            'content': [{'type': 'text', 'text': str(result) if result else '无结果'}],
+            'data': {}
+        }]
+    }
+
+def perform_analysis(data, settings=None):
+    """执行分析并返回结果"""
+    response_data, status_code = run_analysis(data, settings=settings)
+    return jsonify(response_data), status_code
+
+def run_job(job):
+    """在任务工作线程中执行分析"""
+    response_data, _ = run_analysis(job.data, on_event=job.on_event, cancel_event=job.cancel_event,
+                                    stream=bool(job.data.get('stream')))
+    return response_data
+
+job_manager = JobManager(run_job)
+
+def current_user():
+    """用于任务公平调度的用户标识：客户端带回的会话ID，不带Cookie时（如API调用）为客户端地址"""
+    return session.get('user_id') or request.remote_addr
 
 @app.route('/analyze', methods=['POST'])
 def analyze():
+    settings = None
     try:
         data = request.get_json()
         
         # 保存当前请求信息到session
         session['last_analysis'] = data
         
-        return perform_analysis(data)
+        # 出错时的重试次数也以本次请求的配置快照为准
+        settings = request_settings(data.get('api_config', {}))
+        return perform_analysis(data, settings)
         
     except Exception as e:
         retry_count = request.get_json().get('retry_count', 0)
+        max_retries = (settings or Config.get_instance().snapshot()).max_retries
         return jsonify({
             'error': str(e),
             'script': '生成或执行脚本时发生错误',
             'success': False,
             'retry_count': retry_count,
-            'can_retry': retry_count < Config.MAX_RETRIES - 1,
+            'can_retry': retry_count < max_retries - 1,
             'attempt': retry_count + 1,
-            'max_attempts': Config.MAX_RETRIES
+            'max_attempts': max_retries
         }), 500
 
+@app.route('/analyze/batch', methods=['POST'])
+def analyze_batch():
+    """
+    对同一数据集批量分析多个查询：脚本并发生成，数据集只加载一次，各查询的成败互不影响。
+    请求：{"filename", "queries": [...], "model", "api_config", "sheets", "engine", "regenerate", "timing"}
+    """
+    try:
+        data = request.get_json() or {}
+        with metrics.request_scope(collect=bool(data.get('timing')), model=data.get('model') or '') as timings:
+            with metrics.timer('total'):
+                response_data, status_code = _analyze_batch(data)
+        if timings is not None and status_code == 200:
+            response_data['timings'] = metrics.summarize(timings)
+        return jsonify(response_data), status_code
+    except Exception as e:
+        return jsonify({'error': str(e), 'success': False}), 500
+
+def _analyze_batch(data):
+    filename = data.get('filename')
+    queries = data.get('queries')
+    if not filename:
+        return {'error': '缺少文件名'}, 400
+    if (not isinstance(queries, list) or not queries
+            or not all(isinstance(query, str) and query.strip() for query in queries)):
+        return {'error': 'queries 应为非空的查询文本列表'}, 400
+    if len(queries) > Config.BATCH_MAX_QUERIES:
+        return {'error': f'单次最多提交{Config.BATCH_MAX_QUERIES}个查询'}, 400
+
+    filepath = os.path.join(Config.UPLOAD_FOLDER, secure_filename(filename))
+    if not os.path.exists(filepath):
+        return {'error': '文件不存在'}, 404
+    sheet_names = data.get('sheets') or []
+    if not isinstance(sheet_names, list):
+        return {'error': 'sheets 应为工作表名列表'}, 400
+    try:
+        sheets = resolve_sheets(filepath, sheet_names) if sheet_names else [(None, None)]
+    except ValueError as e:
+        return {'error': str(e)}, 400
+    excel_info, dataset_path = load_analysis_data(filepath, sheets)
+
+    analyzer = Analyzer.from_settings(request_settings(data.get('api_config', {})))
+    outcomes = analyzer.analyze_batch(queries, excel_info, dataset_path, data.get('model'),
+                                      use_cache=not data.get('regenerate', False), engine=data.get('engine'))
+
+    results = []
+    for query, (script, result, status) in zip(queries, outcomes):
+        item = {'query': query, 'script': script, 'status': status}
+        if status.startswith("成功"):
+            item.update({'result': structured_result(result), 'success': True})
+        else:
+            item.update({'error': status, 'details': result or '无执行结果', 'success': False})
+        metrics.inc('batch_queries_total', result='success' if item['success'] else 'failed')
+        results.append(item)
+    succeeded = sum(1 for item in results if item['success'])
+    return {'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded}, 200
+
+@app.route('/jobs', methods=['POST'])
+def submit_job():
+    """提交异步分析任务，立即返回任务ID"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('filename') or not data.get('query'):
+            return jsonify({'error': '缺少必要参数'}), 400
+        job = job_manager.submit(current_user(), data)
+        return jsonify({'job_id': job.id, 'status': job.status}), 202
+    except JobQueueFull as e:
+        return jsonify({'error': str(e)}), 429
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询任务状态、当前尝试次数和结果"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以SSE推送任务事件：生成阶段、模型输出片段、完成的分析部分，最后为 done 事件"""
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    
+    # 断线重连时浏览器会带上最后收到的事件序号；缺失或无法解析时从头重放
+    try:
+        last_event_id = int(request.headers.get('Last-Event-ID', -1))
+    except (TypeError, ValueError):
+        last_event_id = -1
+    start = max(last_event_id, -1) + 1
+    
+    def generate():
+        index = start
+        while True:
+            events = job.wait_events(index, timeout=Config.SSE_KEEPALIVE_INTERVAL)
+            if not events:
+                yield ': keep-alive\n\n'
+                continue
+            for event, info in events:
+                yield f"id: {index}\nevent: {event}\ndata: {json.dumps(info, ensure_ascii=False)}\n\n"
+                index += 1
+                if event == 'done':
+                    return
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """取消任务，正在执行的脚本进程会被终止"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify({'job_id': job.id, 'status': job.status})
+
+@app.route('/datasets/<dataset_id>/rows', methods=['GET'])
+def dataset_rows(dataset_id):
+    """从列式缓存分页读取数据行：offset 起始行，limit 行数，columns 以逗号分隔的列名（可选）"""
+    if not re.fullmatch(r'[0-9a-f]{64}', dataset_id):
+        return jsonify({'error': '数据集ID无效'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(1, int(request.args.get('limit', Config.PREVIEW_PAGE_ROWS))), Config.PREVIEW_MAX_ROWS)
+    except ValueError:
+        return jsonify({'error': 'offset 和 limit 必须是整数'}), 400
+    columns = [col for col in request.args.get('columns', '').split(',') if col] or None
+    
+    try:
+        return jsonify(DatasetCache.get_instance().read_rows(dataset_id, offset, limit, columns))
+    except FileNotFoundError:
+        return jsonify({'error': '数据集不存在，请重新上传文件'}), 404
+    except KeyError as e:
+        return jsonify({'error': f'列不存在: {e}'}), 400
+
+@app.route('/results/<handle>/rows', methods=['GET'])
+def result_rows(handle):
+    """分页读取分析结果中卸载到结果存储的大表：offset 起始行，limit 行数"""
+    if not HANDLE_PATTERN.fullmatch(handle):
+        return jsonify({'error': '结果表格句柄无效'}), 400
+    try:
+        offset = max(0, int(request.args.get('offset', 0)))
+        limit = min(max(1, int(request.args.get('limit', Config.RESULT_TABLE_PAGE_ROWS))), Config.PREVIEW_MAX_ROWS)
+    except ValueError:
+        return jsonify({'error': 'offset 和 limit 必须是整数'}), 400
+    
+    try:
+        return jsonify(read_table_rows(handle, offset, limit))
+    except FileNotFoundError:
+        return jsonify({'error': '结果表格不存在或已过期，请重新运行分析'}), 404
+
+@app.route('/cache/stats', methods=['GET'])
+def cache_stats():
+    """返回脚本缓存和执行结果缓存的命中统计"""
+    return jsonify({
+        'completion_cache': CompletionCache.get_instance().stats(),
+        'result_cache': ResultCache.get_instance().stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    """以 Prometheus 文本格式导出各阶段耗时直方图和计数器"""
+    return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/analysis/stats', methods=['GET'])
+def analysis_stats():
+    """返回按提示中是否包含列概况分组的平均尝试次数，以及低效写法检测和向量化改写的统计"""
+    return jsonify({'attempts': attempt_stats.stats(), 'performance': perf_stats.stats()})
+
 @app.route('/retry', methods=['POST'])
 def retry_analysis():
     """重试上一次的分析请求"""
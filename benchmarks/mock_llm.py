@@ -0,0 +1,174 @@
+"""
+本地模拟的 OpenAI 兼容接口（/v1/models、/v1/chat/completions），用于离线基准测试。
+返回预置的分析脚本，可配置响应延迟、HTTP失败率和脚本执行失败率，支持流式（stream: true）响应。
+
+用法：
+    python benchmarks/mock_llm.py --port 8001 --latency 0.5 --failure-rate 0.05
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+MODEL_NAME = 'mock-model'
+
+# 对任意数据集都能执行成功的向量化脚本
+GOOD_SCRIPT = '''def analyze_data(df):
+    try:
+        df = df.copy()
+        output.start_section("基准测试")
+        output.add_stat("行数", len(df))
+        numeric = df.select_dtypes(include='number')
+        if not numeric.empty:
+            output.add_table(numeric.describe().T.reset_index(), "数值列统计")
+        text = df.select_dtypes(exclude=['number', 'bool'])
+        if not text.empty:
+            counts = text.iloc[:, 0].value_counts().head(20).reset_index()
+            output.add_table(counts, "取值分布")
+        output.end_section()
+        return df
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        return None
+'''
+
+# 执行时出错的脚本，用于触发重试
+BAD_SCRIPT = '''def analyze_data(df):
+    output.start_section("基准测试")
+    output.add_stat("合计", df["__missing_column__"].sum())
+    output.end_section()
+    return df
+'''
+
+
+class MockLLMServer:
+    """在后台线程中运行的模拟模型服务"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, jitter: float = 0.0,
+                 failure_rate: float = 0.0, script_failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.script_failure_rate = script_failure_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.http_failures = 0
+        self.script_failures = 0
+
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, body: dict):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path.startswith('/v1/models'):
+                    self._send_json(200, {'object': 'list', 'data': [{'id': MODEL_NAME, 'object': 'model'}]})
+                else:
+                    self._send_json(404, {'error': 'not found'})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                payload = json.loads(self.rfile.read(length) or b'{}')
+                if not self.path.startswith('/v1/chat/completions'):
+                    self._send_json(404, {'error': 'not found'})
+                    return
+
+                outcome, delay = server._next_outcome()
+                time.sleep(delay)
+                if outcome == 'http_error':
+                    self._send_json(500, {'error': {'message': 'mock failure'}})
+                    return
+
+                content = f"```python\n{BAD_SCRIPT if outcome == 'bad_script' else GOOD_SCRIPT}```"
+                if payload.get('stream'):
+                    self._send_stream(content)
+                else:
+                    self._send_json(200, {
+                        'id': 'mock', 'object': 'chat.completion', 'model': payload.get('model') or MODEL_NAME,
+                        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                     'finish_reason': 'stop'}]
+                    })
+
+            def _send_stream(self, content: str):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                for i in range(0, len(content), 40):
+                    chunk = {'choices': [{'index': 0, 'delta': {'content': content[i:i + 40]}}]}
+                    self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode('utf-8'))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _next_outcome(self):
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            roll = self._random.random()
+            if roll < self.failure_rate:
+                self.http_failures += 1
+                return 'http_error', delay
+            if roll < self.failure_rate + self.script_failure_rate:
+                self.script_failures += 1
+                return 'bad_script', delay
+            return 'ok', delay
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'MockLLMServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-llm', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'http_failures': self.http_failures,
+                'script_failures': self.script_failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='启动模拟的 OpenAI 兼容接口')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.5, help='每次补全的平均延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0, help='延迟的随机波动范围（秒）')
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='返回HTTP 500的比例')
+    parser.add_argument('--script-failure-rate', type=float, default=0.0, help='返回执行出错脚本的比例')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockLLMServer(args.host, args.port, args.latency, args.jitter,
+                           args.failure_rate, args.script_failure_rate, args.seed)
+    print(f"模拟模型服务已启动: {server.url}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""
+端到端基准测试：生成合成数据集，启动模拟模型服务和应用服务，
+按指定并发度驱动 /upload 和 /analyze，以JSON输出吞吐量、延迟分位数、峰值内存和各阶段耗时。
+所有文件写入临时目录，可离线运行，便于在不同提交之间比较结果。
+
+用法：
+    python benchmarks/run_benchmark.py --rows 100000 --columns 20 --concurrency 1,4,8 --requests 20 \\
+        --latency 0.5 --script-failure-rate 0.1 --output result.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import argparse
+import tempfile
+import platform
+import threading
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import redirect_stdout
+from typing import Any, Dict, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+
+import requests
+from synthetic_data import DTYPES, parse_dtypes, write_dataset
+from mock_llm import MODEL_NAME, MockLLMServer
+
+QUERIES = [
+    '统计各数值列的平均值和最大值',
+    '按类别统计记录数量',
+    '找出数值最大的前10条记录',
+    '统计每年的记录数量变化趋势',
+]
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    return {
+        'mean': round(sum(values) / len(values), 6),
+        'p50': round(percentile(values, 50), 6),
+        'p95': round(percentile(values, 95), 6),
+        'p99': round(percentile(values, 99), 6),
+        'max': round(max(values), 6)
+    }
+
+
+def _process_tree_rss(root_pid: int) -> int:
+    """统计进程及其所有子孙进程（包括脚本执行进程）的常驻内存之和"""
+    children: Dict[int, List[int]] = {}
+    rss: Dict[int, int] = {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            with open(f'/proc/{name}/statm') as f:
+                rss[int(name)] = int(f.read().split()[1]) * page_size
+        except (OSError, IndexError, ValueError):
+            continue
+        children.setdefault(int(fields[1]), []).append(int(name))
+
+    total = 0
+    stack = [root_pid]
+    while stack:
+        pid = stack.pop()
+        total += rss.get(pid, 0)
+        stack.extend(children.get(pid, []))
+    return total
+
+
+class RSSSampler:
+    """后台定期采样进程树内存，记录峰值"""
+
+    def __init__(self, interval: float = 0.1):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self.peak = 0
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._sample()
+            self._stop.wait(self.interval)
+
+    def _sample(self):
+        if os.path.isdir('/proc'):
+            self.peak = max(self.peak, _process_tree_rss(os.getpid()))
+        else:
+            import resource
+            usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+            self.peak = max(self.peak, usage)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+def start_app(workdir: str, completion_cache: bool, dtype_optimization: bool = True):
+    """在临时目录中配置并启动应用服务，返回 (服务, 基础URL)"""
+    from config import Config
+    Config._config_file = os.path.join(workdir, 'config.json')
+    Config.UPLOAD_FOLDER = os.path.join(workdir, 'uploads')
+    Config.DATASET_CACHE_FOLDER = os.path.join(workdir, 'uploads', '.dataset_cache')
+    Config.RESULT_STORE_FOLDER = os.path.join(workdir, 'uploads', '.result_store')
+    Config.COMPLETION_CACHE_PATH = os.path.join(workdir, 'completion_cache.sqlite3')
+    Config.COMPLETION_CACHE_BACKEND = 'memory' if completion_cache else 'none'
+    Config.RESULT_CACHE_ENABLED = completion_cache
+    Config.DTYPE_OPTIMIZE_ENABLED = dtype_optimization
+
+    from werkzeug.serving import make_server
+    from app import app
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+def run_uploads(base_url: str, dataset_path: str, count: int, concurrency: int, level: int) -> Dict[str, Any]:
+    ext = os.path.splitext(dataset_path)[1]
+
+    def upload(i: int):
+        start = time.perf_counter()
+        with open(dataset_path, 'rb') as f:
+            response = requests.post(f"{base_url}/upload",
+                                     files={'file': (f"bench_c{level}_{i}{ext}", f)}, timeout=600)
+        elapsed = time.perf_counter() - start
+        data = response.json()
+        memory = (data.get('analysis') or {}).get('memory')
+        return elapsed, response.status_code == 200, data.get('filename') or data.get('error'), memory
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(upload, range(count)))
+    wall = time.perf_counter() - start
+    latencies = [elapsed for elapsed, ok, _, _ in results if ok]
+    memory = next((memory for _, ok, _, memory in results if ok and memory), None)
+    return {
+        'requests': count,
+        'successes': len(latencies),
+        'throughput_rps': round(len(latencies) / wall, 4) if wall else 0.0,
+        'latency': latency_summary(latencies),
+        'errors': sorted({error for _, ok, error, _ in results if not ok})[:3],
+        # 缓存数据集列类型压缩前后的内存字节数
+        'dataset_memory': {key: memory[key] for key in ('memory_before', 'memory_after')} if memory else None,
+        'filenames': [name for _, ok, name, _ in results if ok]
+    }
+
+
+def run_analyses(base_url: str, llm_url: str, filenames: List[str], count: int, concurrency: int,
+                 extra: Dict[str, Any]) -> Dict[str, Any]:
+    api_config = {'type': 'custom', 'base': llm_url, 'key': 'benchmark', 'max_retries': 3}
+
+    def analyze(i: int):
+        payload = dict(extra, filename=filenames[i % len(filenames)], query=QUERIES[i % len(QUERIES)],
+                       model=MODEL_NAME, api_config=api_config, timing=True)
+        start = time.perf_counter()
+        response = requests.post(f"{base_url}/analyze", json=payload, timeout=600)
+        elapsed = time.perf_counter() - start
+        data = response.json()
+        return elapsed, bool(data.get('success')), (data.get('timings') or {}).get('stages', {}), data.get('error')
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(analyze, range(count)))
+    wall = time.perf_counter() - start
+
+    stages: Dict[str, List[float]] = {}
+    for _, _, breakdown, _ in results:
+        for stage, seconds in breakdown.items():
+            stages.setdefault(stage, []).append(seconds)
+    successes = [elapsed for elapsed, ok, _, _ in results if ok]
+    return {
+        'requests': count,
+        'successes': len(successes),
+        'failures': count - len(successes),
+        'throughput_rps': round(len(successes) / wall, 4) if wall else 0.0,
+        'latency': latency_summary([elapsed for elapsed, _, _, _ in results]),
+        'errors': sorted({str(error) for _, ok, _, error in results if not ok and error})[:3],
+        'stages': {stage: latency_summary(values) for stage, values in sorted(stages.items())}
+    }
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端性能基准测试')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--columns', type=int, default=10)
+    parser.add_argument('--dtypes', type=parse_dtypes, default=list(DTYPES))
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('--concurrency', default='1,4', help='逗号分隔的并发度列表')
+    parser.add_argument('--requests', type=int, default=20, help='每个并发度下的分析请求数')
+    parser.add_argument('--uploads', type=int, default=None, help='每个并发度下的上传请求数（默认等于并发度）')
+    parser.add_argument('--latency', type=float, default=0.2, help='模拟模型的平均响应延迟（秒）')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--failure-rate', type=float, default=0.0, help='模拟模型返回HTTP 500的比例')
+    parser.add_argument('--script-failure-rate', type=float, default=0.0, help='模拟模型返回出错脚本的比例')
+    parser.add_argument('--completion-cache', action='store_true', help='启用脚本缓存和执行结果缓存（默认关闭以测量完整流程）')
+    parser.add_argument('--speculative', action='store_true', help='使用推测式并行生成')
+    parser.add_argument('--no-dtype-optimization', action='store_true',
+                        help='关闭导入时的列类型压缩，用于对比峰值内存')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='结果JSON文件（默认输出到标准输出）')
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+    workdir = tempfile.mkdtemp(prefix='datasheet-bench-')
+    llm = MockLLMServer(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate,
+                        script_failure_rate=args.script_failure_rate, seed=args.seed).start()
+    server = None
+    # 应用的日志输出转到标准错误，标准输出只保留结果JSON
+    with redirect_stdout(sys.stderr):
+        try:
+            dataset_path = os.path.join(workdir, f"dataset.{args.format}")
+            start = time.perf_counter()
+            write_dataset(dataset_path, args.rows, args.columns, args.dtypes, args.seed)
+            generate_seconds = time.perf_counter() - start
+
+            server, base_url = start_app(workdir, args.completion_cache, not args.no_dtype_optimization)
+            extra = {'speculative': True} if args.speculative else {}
+
+            results = []
+            for level in levels:
+                sampler = RSSSampler()
+                with sampler:
+                    uploads = run_uploads(base_url, dataset_path, args.uploads or level, level, level)
+                    analyses = run_analyses(base_url, llm.url, uploads.pop('filenames') or ['missing'],
+                                            args.requests, level, extra)
+                results.append({
+                    'concurrency': level,
+                    'upload': uploads,
+                    'analyze': analyses,
+                    'peak_rss_bytes': sampler.peak
+                })
+
+            report = {
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'cpu_count': os.cpu_count(),
+                'config': {key: value for key, value in vars(args).items() if key != 'output'},
+                'dataset': {'format': args.format, 'bytes': os.path.getsize(dataset_path),
+                            'generate_seconds': round(generate_seconds, 4)},
+                'mock_llm': llm.stats(),
+                'levels': results
+            }
+        finally:
+            if server is not None:
+                server.shutdown()
+            llm.stop()
+            try:
+                from executor_pool import ExecutorPool
+                if ExecutorPool._instance is not None:
+                    ExecutorPool._instance.shutdown()
+            except ImportError:
+                pass
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import Config
+
+
+def _normalize_text(text: Optional[str]) -> str:
+    return re.sub(r'\s+', ' ', (text or '').strip()).lower()
+
+
+class _MemoryBackend:
+    """进程内LRU缓存，带过期时间"""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, created_at = entry
+            if time.time() - created_at > self.ttl:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, created_at: float = None):
+        with self._lock:
+            self._entries[key] = (value, created_at or time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _SQLiteBackend:
+    """磁盘上的SQLite缓存，进程重启后仍然有效"""
+
+    def __init__(self, path: str, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS completions ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    def get(self, key: str) -> Optional[tuple]:
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT value, created_at FROM completions WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+                return None
+            self._conn.execute("UPDATE completions SET accessed_at = ? WHERE key = ?", (now, key))
+            return row
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO completions (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._conn.execute("DELETE FROM completions WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM completions WHERE key IN ("
+                "SELECT key FROM completions ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def delete(self, key: str):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM completions WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM completions").fetchone()[0]
+
+
+class CompletionCache:
+    """
+    LLM生成脚本的内容寻址缓存。
+    键为（列名及类型、查询文本、模型、错误上下文）规范化后的哈希；只缓存执行成功的脚本，
+    缓存脚本之后执行失败时自动失效。后端为内存LRU，可选叠加SQLite持久化。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, backend: str = None, ttl: float = None, max_entries: int = None, path: str = None):
+        self.backend = backend or Config.COMPLETION_CACHE_BACKEND
+        ttl = ttl or Config.COMPLETION_CACHE_TTL
+        max_entries = max_entries or Config.COMPLETION_CACHE_MAX_ENTRIES
+
+        self.enabled = self.backend != 'none'
+        self._memory = _MemoryBackend(max_entries, ttl)
+        self._disk = None
+        if self.backend == 'sqlite':
+            self._disk = _SQLiteBackend(path or Config.COMPLETION_CACHE_PATH, max_entries, ttl)
+
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def get_instance(cls) -> 'CompletionCache':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = CompletionCache()
+            return cls._instance
+
+    @staticmethod
+    def make_key(excel_info: Dict[str, Any], user_query: str, model: str = None,
+                 error_context: str = None, engine: str = 'pandas') -> str:
+        """根据数据结构指纹、查询、模型、错误上下文和分析引擎生成缓存键"""
+        schema = sorted((str(col), str(dtype)) for col, dtype in excel_info.get('dtypes', {}).items())
+        fields = {
+            'schema': schema,
+            'query': _normalize_text(user_query),
+            'model': model or '',
+            'error': _normalize_text(error_context),
+        }
+        # pandas 引擎的键保持不变，已有缓存仍然有效
+        if engine != 'pandas':
+            fields['engine'] = engine
+        # 多工作表分析时，其他工作表的名称和结构也影响生成的脚本
+        sheets = excel_info.get('sheets') or []
+        if len(sheets) > 1:
+            fields['sheets'] = [[sheet['name'], sorted((str(col), str(dtype)) for col, dtype in sheet['dtypes'].items())]
+                                for sheet in sheets]
+        payload = json.dumps(fields, ensure_ascii=False, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _count(self, hit: bool):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            return None
+        value = self._memory.get(key)
+        if value is None and self._disk is not None:
+            row = self._disk.get(key)
+            if row is not None:
+                value, created_at = row
+                self._memory.set(key, value, created_at)
+        self._count(value is not None)
+        return value
+
+    def set(self, key: str, script: str):
+        if not self.enabled:
+            return
+        self._memory.set(key, script)
+        if self._disk is not None:
+            self._disk.set(key, script)
+
+    def invalidate(self, key: str):
+        if not self.enabled:
+            return
+        self._memory.delete(key)
+        if self._disk is not None:
+            self._disk.delete(key)
+        with self._stats_lock:
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'backend': self.backend,
+            'hits': self.hits,
+            'misses': self.misses,
+            'invalidations': self.invalidations,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'entries': len(self._disk) if self._disk is not None else len(self._memory)
+        }
@@ -1,10 +1,36 @@
 import json
 import os
-from typing import Dict, Any
+import time
+import threading
+from typing import Dict, Any, NamedTuple, Optional
+
+class ApiSettings(NamedTuple):
+    """单次请求使用的API配置快照；不可变，请求处理过程中不受其他请求修改配置的影响"""
+    api_type: str
+    api_base: Optional[str]
+    api_key: Optional[str]
+    max_retries: int
+
+    @classmethod
+    def from_request(cls, api_config: Dict[str, Any], defaults: 'ApiSettings') -> 'ApiSettings':
+        """以请求中提供的API配置覆盖已保存的配置"""
+        return cls(
+            api_type=api_config.get('type') or defaults.api_type,
+            api_base=api_config.get('base', defaults.api_base),
+            api_key=api_config.get('key', defaults.api_key),
+            max_retries=int(api_config.get('max_retries') or defaults.max_retries)
+        )
+
+    def as_config(self) -> Dict[str, Any]:
+        return {'API_TYPE': self.api_type, 'API_BASE': self.api_base, 'API_KEY': self.api_key,
+                'MAX_RETRIES': self.max_retries}
 
 class Config:
     _instance = None
+    _instance_lock = threading.Lock()
     _config_file = 'config.json'
+    # 持久化到配置文件的设置项
+    _PERSISTED_KEYS = ('MAX_RETRIES', 'UPLOAD_FOLDER', 'API_TYPE', 'API_BASE', 'API_KEY')
     
     # 类属性定义
     MAX_RETRIES = 3
@@ -13,51 +39,208 @@ class Config:
     API_BASE = None
     API_KEY = None
     
+    # 数据集缓存
+    DATASET_CACHE_FOLDER = os.path.join('uploads', '.dataset_cache')
+    DATASET_CACHE_MAX_BYTES = 2 * 1024 ** 3
+    
+    # 导入时压缩列类型：不同值数量不超过行数的 DTYPE_CATEGORY_MAX_RATIO 且不超过 DTYPE_CATEGORY_MAX_DISTINCT 的文本列转为 category，
+    # 整数列降位（不低于 DTYPE_INT_MIN_BITS 位，过低时脚本中的逐元素运算容易溢出），浮点列保持不变；
+    # DTYPE_ARROW_STRINGS 在 pandas 3 之前也将文本列加载为 Arrow 支持的 string 类型（pandas 3 默认如此）
+    DTYPE_OPTIMIZE_ENABLED = True
+    DTYPE_CATEGORY_MAX_RATIO = 0.05
+    DTYPE_CATEGORY_MAX_DISTINCT = 1000
+    DTYPE_INT_MIN_BITS = 32
+    DTYPE_ARROW_STRINGS = True
+    
+    # 流式数据集概况：分块行数、头部样本行数、蓄水池抽样行数
+    PROFILE_CHUNK_ROWS = 100000
+    PROFILE_HEAD_ROWS = 100
+    PROFILE_SAMPLE_ROWS = 1000
+    
+    # 逐列概况：是否加入提示词、常见值个数、提示词中概况部分的字符上限
+    COLUMN_PROFILE_ENABLED = True
+    COLUMN_PROFILE_TOP_K = 5
+    PROMPT_PROFILE_MAX_CHARS = 2000
+    
+    # 提示词token预算（估计值）及压缩时预览单元格的最大宽度
+    PROMPT_TOKEN_BUDGET = 6000
+    PROMPT_PREVIEW_CELL_WIDTH = 20
+    
+    # 性能指标：是否记录各阶段耗时（/metrics），以及耗时直方图的区间上界（秒）
+    METRICS_ENABLED = True
+    METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120]
+    
+    # 数据预览分页：默认每页行数和单次请求的最大行数
+    PREVIEW_PAGE_ROWS = 100
+    PREVIEW_MAX_ROWS = 1000
+    
+    # 脚本执行进程池
+    EXECUTOR_POOL_SIZE = max(2, os.cpu_count() or 1)
+    EXECUTOR_MAX_JOBS_PER_WORKER = 50
+    EXECUTOR_MAX_WORKER_MEMORY = 1024 ** 3
+    
+    # 脚本执行资源限制：墙钟超时和CPU时间（秒）、工作进程匿名内存（不含映射的数据集文件）和结果大小（字节），设为 0 表示不限制
+    EXECUTOR_TIMEOUT = 60
+    EXECUTOR_CPU_LIMIT = 30
+    EXECUTOR_MEMORY_LIMIT = 4 * 1024 ** 3
+    EXECUTOR_MAX_OUTPUT_BYTES = 50 * 1024 ** 2
+    # 同时执行的脚本数上限（准入控制），超出的执行请求排队等待
+    EXECUTOR_MAX_CONCURRENT = os.cpu_count() or 1
+    
+    # LLM生成脚本缓存：backend 可选 'memory'、'sqlite'（内存LRU + SQLite持久化）或 'none'
+    COMPLETION_CACHE_BACKEND = 'sqlite'
+    COMPLETION_CACHE_PATH = os.path.join('uploads', '.completion_cache.sqlite3')
+    COMPLETION_CACHE_TTL = 7 * 24 * 3600
+    COMPLETION_CACHE_MAX_ENTRIES = 1000
+    
+    # LLM API 连接
+    HTTP_POOL_CONNECTIONS = 4
+    HTTP_POOL_MAXSIZE = 16
+    HTTP_CONNECT_TIMEOUT = 10
+    HTTP_READ_TIMEOUT = 120
+    MODELS_CACHE_TTL = 600
+    API_CLIENT_REGISTRY_SIZE = 32
+    
+    # 分析引擎：'pandas'（生成Python脚本）、'sql'（生成SQL，由嵌入式 DuckDB 执行，需安装 duckdb）
+    # 或 'auto'（缓存数据集超过 SQL_ENGINE_AUTO_BYTES 字节时使用SQL引擎）
+    ANALYSIS_ENGINE = 'auto'
+    SQL_ENGINE_AUTO_BYTES = 1024 ** 3
+    # SQL引擎：线程数（0 表示CPU核数）、内存上限（超出时写入临时目录）、同时执行的查询数、结果读取批大小
+    SQL_ENGINE_THREADS = 0
+    SQL_ENGINE_MEMORY_LIMIT = '2GB'
+    SQL_ENGINE_TEMP_FOLDER = os.path.join('uploads', '.sql_tmp')
+    SQL_ENGINE_MAX_CONCURRENT = 1
+    SQL_ENGINE_BATCH_ROWS = 100000
+    
+    # 大表结果卸载：超过 RESULT_TABLE_MAX_ROWS 行的结果表格写入列式结果存储，响应中只包含首页和句柄
+    RESULT_STORE_FOLDER = os.path.join('uploads', '.result_store')
+    RESULT_STORE_MAX_BYTES = 1024 ** 3
+    RESULT_STORE_TTL = 24 * 3600
+    RESULT_TABLE_MAX_ROWS = 1000
+    RESULT_TABLE_PAGE_ROWS = 100
+    
+    # 低效写法检测：脚本执行耗时和数据行数都超过阈值且检测到逐行遍历等写法时，请求模型改写为向量化实现并保留更快的版本
+    PERF_REWRITE_ENABLED = True
+    PERF_REWRITE_MIN_SECONDS = 2.0
+    PERF_REWRITE_MIN_ROWS = 10000
+    
+    # 脚本执行结果缓存：按（规范化脚本、数据集内容哈希）缓存结构化结果，总大小超过上限时按LRU淘汰
+    RESULT_CACHE_ENABLED = True
+    RESULT_CACHE_MAX_BYTES = 256 * 1024 ** 2
+    
+    # 生成脚本预检：禁止导入的模块
+    SCRIPT_FORBIDDEN_MODULES = [
+        'os', 'sys', 'subprocess', 'shutil', 'socket', 'requests', 'urllib', 'http', 'ftplib',
+        'ctypes', 'multiprocessing', 'threading', 'signal', 'importlib', 'builtins', 'pickle', 'marshal'
+    ]
+    
+    # 异步分析任务
+    JOB_WORKERS = 4
+    JOB_MAX_QUEUED = 100
+    JOB_MAX_QUEUED_PER_USER = 10
+    JOB_RESULT_TTL = 3600
+    SSE_KEEPALIVE_INTERVAL = 15
+    
+    # 批量分析：单次请求的查询数上限、同时生成脚本的查询数
+    BATCH_MAX_QUERIES = 30
+    BATCH_GENERATION_CONCURRENCY = 8
+    
+    # 推测式并行生成：每轮候选数、候选温度及单次请求的模型调用上限
+    SPECULATIVE_CANDIDATES = 3
+    SPECULATIVE_MAX_CANDIDATES = 5
+    SPECULATIVE_MAX_LLM_CALLS = 10
+    SPECULATIVE_TEMPERATURES = [0.2, 0.5, 0.8, 1.0, 0.35]
+    
+    # 检查配置文件是否被外部修改（热加载）的最小间隔（秒）
+    CONFIG_RELOAD_INTERVAL = 2.0
+    
     def __init__(self):
+        self._write_lock = threading.Lock()
+        self._file_mtime = None
+        self._next_check = 0.0
+        self._snapshot = self._build_snapshot()
         self.load_config()
     
     @classmethod
     def get_instance(cls):
-        if cls._instance is None:
-            cls._instance = Config()
-        return cls._instance
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = Config()
+            return cls._instance
+    
+    @staticmethod
+    def _build_snapshot() -> ApiSettings:
+        return ApiSettings(Config.API_TYPE, Config.API_BASE, Config.API_KEY, Config.MAX_RETRIES)
+    
+    @staticmethod
+    def _file_signature(path: str):
+        try:
+            stat = os.stat(path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
     
     def load_config(self):
         """从配置文件加载配置"""
-        if os.path.exists(self._config_file):
+        with self._write_lock:
+            self._file_mtime = self._file_signature(self._config_file)
+            if self._file_mtime is not None:
+                try:
+                    with open(self._config_file, 'r', encoding='utf-8') as f:
+                        config_data = json.load(f)
+                        # 更新类属性
+                        for key, value in config_data.items():
+                            if hasattr(Config, key):
+                                setattr(Config, key, value)
+                except Exception as e:
+                    print(f"加载配置文件失败: {e}")
+            self._snapshot = self._build_snapshot()
+    
+    def snapshot(self) -> ApiSettings:
+        """
+        返回当前已保存API配置的不可变快照。读取路径不加锁：快照整体替换，读到的总是完整的一份；
+        每隔 CONFIG_RELOAD_INTERVAL 秒检查一次配置文件，被外部修改时重新加载。
+        """
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.CONFIG_RELOAD_INTERVAL
+            if self._file_signature(self._config_file) != self._file_mtime:
+                self.load_config()
+        return self._snapshot
+    
+    def save_config(self):
+        """保存配置到文件：先写临时文件再原子替换，读取方不会看到写了一半的文件"""
+        with self._write_lock:
             try:
-                with open(self._config_file, 'r', encoding='utf-8') as f:
-                    config_data = json.load(f)
-                    # 更新类属性
-                    for key, value in config_data.items():
-                        if hasattr(Config, key):
-                            setattr(Config, key, value)
+                config_data = {key: getattr(Config, key) for key in self._PERSISTED_KEYS}
+                tmp_path = f"{self._config_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    json.dump(config_data, f, indent=4, ensure_ascii=False)
+                os.replace(tmp_path, self._config_file)
+                self._file_mtime = self._file_signature(self._config_file)
+                return True
             except Exception as e:
-                print(f"加载配置文件失败: {e}")
+                print(f"保存配置文件失败: {e}")
+                return False
     
-    def save_config(self):
-        """保存配置到文件"""
-        try:
-            config_data = {
-                'MAX_RETRIES': Config.MAX_RETRIES,
-                'UPLOAD_FOLDER': Config.UPLOAD_FOLDER,
-                'API_TYPE': Config.API_TYPE,
-                'API_BASE': Config.API_BASE,
-                'API_KEY': Config.API_KEY
-            }
-            with open(self._config_file, 'w', encoding='utf-8') as f:
-                json.dump(config_data, f, indent=4, ensure_ascii=False)
-            return True
-        except Exception as e:
-            print(f"保存配置文件失败: {e}")
-            return False
-    
-    def update_config(self, **kwargs):
-        """更新配置"""
-        for key, value in kwargs.items():
-            if hasattr(Config, key):
+    def update_config(self, wait: bool = True, **kwargs):
+        """
+        更新配置，只有值实际变化时才写入配置文件。
+        wait 为 False 时在后台线程中写入，不阻塞请求处理。
+        """
+        with self._write_lock:
+            changes = {key: value for key, value in kwargs.items()
+                       if hasattr(Config, key) and getattr(Config, key) != value}
+            for key, value in changes.items():
                 setattr(Config, key, value)
-        return self.save_config()
+            if changes:
+                self._snapshot = self._build_snapshot()
+        if not changes:
+            return True
+        if wait:
+            return self.save_config()
+        threading.Thread(target=self.save_config, name='config-save', daemon=True).start()
+        return True
     
     @classmethod
     def get_api_config(cls, api_type: str = None, api_base: str = None) -> Dict[str, str]:
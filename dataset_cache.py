@@ -0,0 +1,501 @@
+import os
+import json
+import math
+import shutil
+import hashlib
+import tempfile
+import time
+import datetime
+import threading
+from collections.abc import Mapping
+from functools import lru_cache
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.feather as feather
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+from workbook import read_sheet
+
+
+def read_source_file(filepath: str, sheet: str = None) -> pd.DataFrame:
+    """根据文件扩展名读取原始上传文件，工作簿读取 sheet 指定的工作表（默认第一个）"""
+    file_ext = os.path.splitext(filepath)[1].lower()
+    if file_ext == '.csv':
+        df = pd.read_csv(filepath)
+    else:
+        df = read_sheet(filepath, sheet)
+    df.columns = df.columns.astype(str)
+    return df
+
+
+def to_json_value(value: Any) -> Any:
+    """将单元格值转换为可写入JSON的内置类型"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, np.generic):
+        return to_json_value(value.item())
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    return str(value)
+
+
+def to_json_rows(df: pd.DataFrame) -> List[List[Any]]:
+    """将DataFrame的行转换为可写入JSON的二维列表"""
+    return [[to_json_value(v) for v in row] for row in df.itertuples(index=False, name=None)]
+
+
+def enable_copy_on_write() -> bool:
+    """
+    开启 pandas 写时复制模式。
+    零拷贝映射得到的数组是只读的，只有在写时复制模式下脚本修改数据才会自动复制而不是报错。
+    """
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        pd.set_option('mode.copy_on_write', True)
+        return True
+    except (KeyError, pd.errors.OptionError):
+        return False
+
+
+@lru_cache(maxsize=4)
+def _open_mapped_table(path: str, inode: int, size: int) -> pa.Table:
+    return feather.read_table(path, memory_map=True)
+
+
+def open_mapped_table(path: str) -> pa.Table:
+    """以内存映射方式打开Arrow缓存文件，同一进程内重复打开时复用已映射的表"""
+    # 缓存文件只会被整体替换（os.replace），inode和大小即可标识文件内容；访问时间的刷新不影响复用
+    stat = os.stat(path)
+    return _open_mapped_table(path, stat.st_ino, stat.st_size)
+
+
+# Arrow 缓存文件 schema 元数据中记录列类型压缩结果的键
+OPTIMIZATION_METADATA_KEY = b'dtype_optimization'
+_INT_TYPES = [(8, pa.int8()), (16, pa.int16()), (32, pa.int32())]
+
+
+def _sorted_dictionary_encode(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """按排序后的取值编码为字典列：转换为 category 后分组、排序结果的顺序与原文本列一致"""
+    dictionary = pc.unique(column).drop_null()
+    dictionary = dictionary.take(pc.array_sort_indices(dictionary))
+    dict_type = pa.dictionary(pa.int32(), dictionary.type)
+    chunks = [pa.DictionaryArray.from_arrays(pc.index_in(chunk, value_set=dictionary), dictionary)
+              for chunk in column.chunks]
+    return pa.chunked_array(chunks, type=dict_type)
+
+
+def _optimized_column(column: pa.ChunkedArray, rows: int) -> Tuple[Optional[pa.ChunkedArray], str]:
+    """返回压缩后的列和新类型名称，无需压缩时返回 (None, '')"""
+    dtype = column.type
+    if rows == 0 or column.null_count == rows:
+        return None, ''
+    if pa.types.is_string(dtype) or pa.types.is_large_string(dtype):
+        limit = min(rows * Config.DTYPE_CATEGORY_MAX_RATIO, Config.DTYPE_CATEGORY_MAX_DISTINCT)
+        if pc.count_distinct(column).as_py() <= limit:
+            return _sorted_dictionary_encode(column), 'category'
+    elif pa.types.is_signed_integer(dtype) and column.null_count == 0:
+        # 含空值的整数列在 pandas 中为 float64，降位没有效果
+        bounds = pc.min_max(column)
+        low, high = bounds['min'].as_py(), bounds['max'].as_py()
+        for bits, target in _INT_TYPES:
+            if Config.DTYPE_INT_MIN_BITS <= bits < dtype.bit_width and -2 ** (bits - 1) <= low and high < 2 ** (bits - 1):
+                return column.cast(target), str(target)
+    return None, ''
+
+
+def optimize_table(table: pa.Table) -> Tuple[pa.Table, Dict[str, Any]]:
+    """
+    压缩列类型：低基数文本列编码为字典列（pandas 中为 category），整数列按取值范围降位。
+    float64 列保持不变：float32 累加会改变大数据量上的求和结果。
+    返回 (压缩后的表, 报告)，报告同时写入 schema 元数据，包含压缩前后的内存字节数和各列的类型变化。
+    """
+    before = table.get_total_buffer_size()
+    changes = {}
+    for index, field in enumerate(table.schema):
+        column, new_type = _optimized_column(table.column(index), table.num_rows)
+        if column is None:
+            continue
+        changes[field.name] = f"{_type_name(field.type)} → {new_type}"
+        table = table.set_column(index, field.with_type(column.type), column)
+    return _with_report(table, before, changes)
+
+
+def _type_name(dtype: pa.DataType) -> str:
+    return 'string' if pa.types.is_large_string(dtype) else str(dtype)
+
+
+def _with_report(table: pa.Table, before: int, changes: Dict[str, str]) -> Tuple[pa.Table, Dict[str, Any]]:
+    """生成压缩报告并写入 schema 元数据"""
+    report = {'memory_before': before, 'memory_after': table.get_total_buffer_size(), 'columns': changes}
+    metadata = dict(table.schema.metadata or {})
+    metadata[OPTIMIZATION_METADATA_KEY] = json.dumps(report, ensure_ascii=False).encode('utf-8')
+    return table.replace_schema_metadata(metadata), report
+
+
+def _contiguous_column(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    """合并为单个连续块；string 列合并后超过2GB时偏移量溢出，改用 large_string"""
+    if column.num_chunks <= 1:
+        return column
+    try:
+        return pa.chunked_array([column.combine_chunks()], type=column.type)
+    except pa.ArrowInvalid:
+        if not pa.types.is_string(column.type):
+            raise
+        column = column.cast(pa.large_string())
+        return pa.chunked_array([column.combine_chunks()], type=column.type)
+
+
+def _write_single_batch(table: pa.Table, path: str):
+    feather.write_feather(table, path, compression='uncompressed', chunksize=max(table.num_rows, 1))
+
+
+def write_contiguous(table: pa.Table, path: str):
+    """
+    每列合并为单个连续块后写入Arrow文件（整个文件只有一个记录批次）。
+    多个批次的列在 to_pandas 时需要拼接复制，无法直接引用映射的页面。
+    """
+    columns = [_contiguous_column(column) for column in table.columns]
+    fields = [field.with_type(column.type) for field, column in zip(table.schema, columns)]
+    _write_single_batch(pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=table.schema.metadata)), path)
+
+
+def rewrite_contiguous(source_path: str, path: str, optimize: bool = False) -> Optional[Dict[str, Any]]:
+    """
+    将流式写入的多批次Arrow文件重写为每列一个连续块的单批次文件，optimize 为 True 时同时压缩列类型。
+    逐列处理：每列合并（和压缩）后先写入单列临时文件再映射回来，进程内同时只物化一列，
+    最终文件从映射的页面写出，内存占用不随数据集大小增长。返回列类型压缩报告，未压缩时为 None。
+    """
+    table = feather.read_table(source_path, memory_map=True)
+    column_dir = tempfile.mkdtemp(prefix='.columns-', dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        columns, fields, changes = [], [], {}
+        for index, field in enumerate(table.schema):
+            original = column = table.column(index)
+            if optimize:
+                optimized, new_type = _optimized_column(column, table.num_rows)
+                if optimized is not None:
+                    changes[field.name] = f"{_type_name(field.type)} → {new_type}"
+                    column = optimized
+            column = _contiguous_column(column)
+            # 新物化的列先落盘再映射，已经是单个块的原列直接引用源文件的映射
+            if column is not original:
+                column_path = os.path.join(column_dir, f'{index}.arrow')
+                _write_single_batch(pa.table([column], names=['column']), column_path)
+                column = feather.read_table(column_path, memory_map=True).column(0)
+            columns.append(column)
+            fields.append(field.with_type(column.type))
+        result = pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=table.schema.metadata))
+        report = None
+        if optimize:
+            result, report = _with_report(result, table.get_total_buffer_size(), changes)
+        _write_single_batch(result, path)
+        return report
+    finally:
+        shutil.rmtree(column_dir, ignore_errors=True)
+
+
+def _types_mapper():
+    """pandas 3 之前 Arrow 文本列默认转换为 object 列，开启 DTYPE_ARROW_STRINGS 时改为 Arrow 支持的 string 类型"""
+    if not Config.DTYPE_ARROW_STRINGS or int(pd.__version__.split('.')[0]) >= 3:
+        return None
+    dtype = pd.StringDtype('pyarrow')
+    return {pa.string(): dtype, pa.large_string(): dtype}.get
+
+
+def load_dataset(path: str, zero_copy: bool = False) -> pd.DataFrame:
+    """
+    读取缓存数据集文件（Arrow IPC 或 pickle 备用格式）。
+    zero_copy 为 True 时通过内存映射构建DataFrame，数值列直接引用映射的页面而不复制，
+    多个进程读取同一数据集时共享物理内存。
+    """
+    file_ext = os.path.splitext(path)[1].lower()
+    if file_ext == '.arrow':
+        if zero_copy:
+            return open_mapped_table(path).to_pandas(split_blocks=True, types_mapper=_types_mapper())
+        return feather.read_table(path, memory_map=False).to_pandas(types_mapper=_types_mapper())
+    if file_ext == '.pkl':
+        return pd.read_pickle(path)
+    return read_source_file(path)
+
+
+class LazySheets(Mapping):
+    """
+    工作表名到DataFrame的只读映射，供脚本通过 sheets["名称"] 引用多个工作表。
+    每个工作表在第一次被访问时才从缓存数据集加载，未使用的工作表不产生读取开销。
+    """
+
+    def __init__(self, paths: Dict[str, str], loaded: Dict[str, pd.DataFrame] = None, zero_copy: bool = False):
+        self._paths = dict(paths)
+        self._frames = dict(loaded or {})
+        self._zero_copy = zero_copy
+
+    def __getitem__(self, name: str) -> pd.DataFrame:
+        if name not in self._frames:
+            if name not in self._paths:
+                raise KeyError(f"工作表不存在: {name}，可用的工作表: {list(self._paths)}")
+            df = load_dataset(self._paths[name], zero_copy=self._zero_copy)
+            df.columns = df.columns.astype(str)
+            self._frames[name] = df
+        return self._frames[name]
+
+    def __iter__(self):
+        return iter(self._paths)
+
+    def __len__(self) -> int:
+        return len(self._paths)
+
+
+def file_digest(filepath: str, chunk_size: int = 1024 * 1024) -> str:
+    """计算文件内容的SHA-256哈希"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DatasetCache:
+    """
+    上传文件的列式缓存。
+    文件在上传时只解析一次并转换为 Arrow IPC 格式，按内容哈希寻址；
+    之后的元数据分析和脚本执行都直接读取缓存文件。缓存总大小超过上限时按LRU淘汰。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+    EXTENSIONS = ('.arrow', '.pkl')
+
+    def __init__(self, folder: str = None, max_bytes: int = None):
+        self.folder = folder or Config.DATASET_CACHE_FOLDER
+        self.max_bytes = max_bytes if max_bytes is not None else Config.DATASET_CACHE_MAX_BYTES
+        self._lock = threading.Lock()
+        # (源文件绝对路径, 大小, 修改时间) -> 数据集ID，避免重复计算哈希
+        self._sources: Dict[Tuple[str, int, int], str] = {}
+        os.makedirs(self.folder, exist_ok=True)
+
+    @classmethod
+    def get_instance(cls) -> 'DatasetCache':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = DatasetCache()
+            return cls._instance
+
+    def _source_key(self, filepath: str) -> Tuple[str, int, int]:
+        stat = os.stat(filepath)
+        return (os.path.abspath(filepath), stat.st_size, stat.st_mtime_ns)
+
+    def _find(self, dataset_id: str) -> Optional[str]:
+        for ext in self.EXTENSIONS:
+            path = os.path.join(self.folder, dataset_id + ext)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def dataset_id_for(self, filepath: str, sheet: str = None) -> str:
+        """
+        返回源文件对应的数据集ID（内容哈希）。
+        指定工作表时为（文件哈希, 工作表名）的哈希，工作簿中每个工作表单独缓存；sheet 为 None 表示第一个工作表。
+        """
+        key = self._source_key(filepath)
+        dataset_id = self._sources.get(key)
+        if dataset_id is None:
+            dataset_id = file_digest(filepath)
+            self._sources[key] = dataset_id
+        if sheet is not None:
+            dataset_id = hashlib.sha256(f"{dataset_id}:{sheet}".encode('utf-8')).hexdigest()
+        return dataset_id
+
+    def ingest(self, filepath: str, dtypes: Dict[str, str] = None, sheet: str = None) -> str:
+        """
+        将源文件（或工作簿中的一个工作表）导入缓存（已存在则直接复用），返回数据集ID。
+        提供 dtypes（流式概况合并出的列类型）时，CSV文件按块解析并逐块写入，不在内存中物化整个文件。
+        """
+        dataset_id = self.dataset_id_for(filepath, sheet)
+        if self.get_path(dataset_id):
+            return dataset_id
+
+        path = None
+        if dtypes is not None and os.path.splitext(filepath)[1].lower() == '.csv':
+            path = self._write_csv_stream(dataset_id, filepath, dtypes)
+        if path is None:
+            df = read_source_file(filepath, sheet)
+            path = self._write(dataset_id, df)
+        self._evict(keep=path)
+        return dataset_id
+
+    def _write_csv_stream(self, dataset_id: str, filepath: str, dtypes: Dict[str, str]) -> Optional[str]:
+        """按块读取CSV并以固定的列类型逐块写入Arrow文件，失败时返回None"""
+        # 延迟导入，避免与 dataset_profiler 循环依赖
+        from dataset_profiler import iter_source_chunks
+
+        read_dtypes = {col: ('str' if dtype == 'object' else dtype) for col, dtype in dtypes.items()}
+        path = os.path.join(self.folder, dataset_id + '.arrow')
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        writer = None
+        try:
+            with pa.OSFile(tmp_path, 'wb') as sink:
+                schema = None
+                for chunk in iter_source_chunks(filepath, dtypes=read_dtypes):
+                    chunk.columns = chunk.columns.astype(str)
+                    table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+                    if writer is None:
+                        schema = table.schema
+                        writer = pa.ipc.new_file(sink, schema)
+                    writer.write_table(table)
+                if writer is not None:
+                    writer.close()
+        except (ValueError, TypeError, pa.ArrowException) as e:
+            print(f"流式导入CSV失败，改为整体读取: {e}")
+            writer = None
+        if writer is None:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            return None
+        self._finish_stream(dataset_id, tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def _finish_stream(self, dataset_id: str, tmp_path: str):
+        """
+        流式写入的文件由多个记录批次组成，写完后逐列重写一次：各列合并为连续块；
+        列类型在导入完成前无法确定，同时在这里压缩。
+        """
+        contiguous_path = tmp_path + '.contiguous'
+        report = rewrite_contiguous(tmp_path, contiguous_path, Config.DTYPE_OPTIMIZE_ENABLED)
+        if report is not None:
+            self._log_optimization(dataset_id, report)
+        os.replace(contiguous_path, tmp_path)
+
+    @staticmethod
+    def _log_optimization(dataset_id: str, report: Dict[str, Any]):
+        if report['columns']:
+            print(f"数据集 {dataset_id[:12]} 列类型压缩：内存 {report['memory_before']} → {report['memory_after']} 字节，"
+                  f"{len(report['columns'])}列：{report['columns']}")
+
+    def _write(self, dataset_id: str, df: pd.DataFrame) -> str:
+        """以原子方式写入缓存文件，无法转换为Arrow的数据退回pickle格式"""
+        try:
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if Config.DTYPE_OPTIMIZE_ENABLED:
+                table, report = optimize_table(table)
+                self._log_optimization(dataset_id, report)
+            path = os.path.join(self.folder, dataset_id + '.arrow')
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            write_contiguous(table, tmp_path)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            print(f"转换为Arrow格式失败，改用pickle缓存: {e}")
+            path = os.path.join(self.folder, dataset_id + '.pkl')
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    def get_path(self, dataset_id: str) -> Optional[str]:
+        """返回缓存文件路径并刷新其访问时间（LRU依据），不存在时返回None"""
+        path = self._find(dataset_id)
+        if path:
+            # 只刷新访问时间、保留修改时间
+            try:
+                os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+            except OSError:
+                return None
+        return path
+
+    def schema_dtypes(self, dataset_id: str) -> Optional[Dict[str, str]]:
+        """从Arrow文件的schema读取列类型（不读取数据），pickle缓存返回None"""
+        path = self.get_path(dataset_id)
+        if not path or not path.endswith('.arrow'):
+            return None
+        empty = open_mapped_table(path).schema.empty_table().to_pandas(types_mapper=_types_mapper())
+        return {str(col): str(dtype) for col, dtype in empty.dtypes.items()}
+
+    def memory_report(self, dataset_id: str) -> Optional[Dict[str, Any]]:
+        """
+        列类型压缩报告：{memory_before, memory_after, columns}（内存为Arrow列的字节数）。
+        导入时未做压缩的数据集按当前大小报告，pickle缓存返回None。
+        """
+        path = self.get_path(dataset_id)
+        if not path or not path.endswith('.arrow'):
+            return None
+        table = open_mapped_table(path)
+        raw = (table.schema.metadata or {}).get(OPTIMIZATION_METADATA_KEY)
+        if raw:
+            return json.loads(raw.decode('utf-8'))
+        size = table.get_total_buffer_size()
+        return {'memory_before': size, 'memory_after': size, 'columns': {}}
+
+    def read_rows(self, dataset_id: str, offset: int, limit: int, columns: List[str] = None) -> Dict[str, Any]:
+        """
+        读取数据集的一个行窗口，返回可JSON序列化的结果。
+        Arrow缓存通过内存映射按记录批次的偏移切片，只转换请求的行和列，耗时与数据集大小无关。
+        """
+        path = self.get_path(dataset_id)
+        if not path:
+            raise FileNotFoundError(f"数据集缓存不存在: {dataset_id}")
+        if path.endswith('.arrow'):
+            table = open_mapped_table(path)
+            total = table.num_rows
+            if columns:
+                table = table.select(columns)
+            window = table.slice(offset, limit).to_pandas()
+        else:
+            df = pd.read_pickle(path)
+            total = len(df)
+            if columns:
+                df = df[columns]
+            window = df.iloc[offset:offset + limit]
+        return {
+            'columns': [str(col) for col in window.columns],
+            'rows': to_json_rows(window),
+            'offset': offset,
+            'total': total
+        }
+
+    def load(self, dataset_id: str) -> pd.DataFrame:
+        path = self.get_path(dataset_id)
+        if not path:
+            raise FileNotFoundError(f"数据集缓存不存在: {dataset_id}")
+        # 仅用于读取元数据，可直接使用只读的零拷贝映射
+        return load_dataset(path, zero_copy=True)
+
+    def _evict(self, keep: str = None):
+        """缓存总大小超过上限时，按最近访问时间淘汰最旧的文件"""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.folder):
+                if not name.endswith(self.EXTENSIONS):
+                    continue
+                path = os.path.join(self.folder, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_atime, stat.st_size, path))
+                total += stat.st_size
+
+            entries.sort()
+            evicted = False
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                    total -= size
+                    evicted = True
+                except OSError:
+                    pass
+            # 释放已删除文件的内存映射，避免其磁盘空间一直被占用
+            if evicted:
+                _open_mapped_table.cache_clear()
@@ -0,0 +1,321 @@
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from config import Config
+from dataset_cache import open_mapped_table, to_json_rows, to_json_value
+from workbook import read_sheet
+
+PROFILE_SUFFIX = '.profile.json'
+PROFILE_VERSION = 1
+
+
+def _merge_dtype(current: Optional[str], new: str) -> str:
+    """合并两个分块推断出的列类型"""
+    if current is None or current == new:
+        return new
+    numeric = {'int64', 'float64'}
+    if current in numeric and new in numeric:
+        return 'float64'
+    return 'object'
+
+
+def _normalize_dtype(dtype) -> str:
+    if pd.api.types.is_bool_dtype(dtype):
+        return 'bool'
+    if pd.api.types.is_integer_dtype(dtype):
+        return 'int64'
+    if pd.api.types.is_float_dtype(dtype):
+        return 'float64'
+    if pd.api.types.is_datetime64_any_dtype(dtype):
+        return 'datetime64[ns]'
+    return 'object'
+
+
+class _ProfileBuilder:
+    """逐块累积数据集概况：精确行数、跨块合并的列类型、头部样本和蓄水池抽样"""
+
+    def __init__(self, head_rows: int, sample_rows: int, seed: int = 0):
+        self.head_rows = head_rows
+        self.sample_rows = sample_rows
+        self.columns: Optional[List[str]] = None
+        self.dtypes: Dict[str, Optional[str]] = {}
+        self.has_nulls: Dict[str, bool] = {}
+        self.row_count = 0
+        self.head: List[List[Any]] = []
+        self.sample: List[List[Any]] = []
+        self._rng = np.random.default_rng(seed)
+
+    def add(self, chunk: pd.DataFrame):
+        if self.columns is None:
+            self.columns = [str(col) for col in chunk.columns]
+            self.dtypes = {col: None for col in self.columns}
+            self.has_nulls = {col: False for col in self.columns}
+        chunk.columns = self.columns
+
+        nulls = chunk.isna()
+        for col in self.columns:
+            column_nulls = nulls[col]
+            if column_nulls.all():
+                # 全空的分块无法提供类型信息
+                self.has_nulls[col] = self.has_nulls[col] or len(chunk) > 0
+                continue
+            self.has_nulls[col] = self.has_nulls[col] or bool(column_nulls.any())
+            self.dtypes[col] = _merge_dtype(self.dtypes[col], _normalize_dtype(chunk[col].dtype))
+
+        if len(self.head) < self.head_rows:
+            self.head.extend(to_json_rows(chunk.head(self.head_rows - len(self.head))))
+
+        self._reservoir(chunk)
+        self.row_count += len(chunk)
+
+    def _reservoir(self, chunk: pd.DataFrame):
+        """蓄水池抽样（Algorithm R），按块向量化生成随机下标"""
+        start = self.row_count
+        fill = max(0, min(self.sample_rows - len(self.sample), len(chunk)))
+        if fill:
+            self.sample.extend(to_json_rows(chunk.iloc[:fill]))
+        if fill == len(chunk):
+            return
+        positions = np.arange(start + fill, start + len(chunk))
+        slots = self._rng.integers(0, positions + 1)
+        accepted = np.nonzero(slots < self.sample_rows)[0]
+        if len(accepted):
+            rows = to_json_rows(chunk.iloc[accepted + fill])
+            for slot, row in zip(slots[accepted], rows):
+                self.sample[slot] = row
+
+    def result(self) -> Dict[str, Any]:
+        dtypes = {}
+        for col in self.columns or []:
+            # 全空列与 pandas 的推断保持一致，视为浮点列
+            dtype = self.dtypes[col] or 'float64'
+            # 含空值的整数/布尔列无法保持原类型
+            if self.has_nulls[col] and dtype == 'int64':
+                dtype = 'float64'
+            elif self.has_nulls[col] and dtype == 'bool':
+                dtype = 'object'
+            dtypes[col] = dtype
+        return {
+            'version': PROFILE_VERSION,
+            'columns': list(self.columns or []),
+            'dtypes': dtypes,
+            'row_count': self.row_count,
+            'head': self.head,
+            'sample': self.sample
+        }
+
+
+def _dedup_columns(header: Tuple[Any, ...]) -> List[str]:
+    """
+    与 pandas.read_excel 相同的表头处理：空列名为 "Unnamed: 序号"，重复的列名依次加上 .1、.2 等后缀
+    （跳过表头中已有的名称），先处理有名称的列，再处理空列名。
+    """
+    columns = [f"Unnamed: {i}" if name is None else str(name) for i, name in enumerate(header)]
+    unnamed = [i for i, name in enumerate(header) if name is None]
+    counts: Dict[str, int] = {}
+    for i in [i for i in range(len(columns)) if header[i] is not None] + unnamed:
+        col = old_col = columns[i]
+        count = counts.get(col, 0)
+        while count > 0:
+            counts[old_col] = count + 1
+            col = f"{old_col}.{count}"
+            count = count + 1 if col in columns else counts.get(col, 0)
+        columns[i] = col
+        counts[col] = count + 1
+    return columns
+
+
+def _iter_xlsx_chunks(filepath: str, chunk_size: int, sheet: str = None) -> Iterator[pd.DataFrame]:
+    """以 openpyxl 只读模式逐行读取工作表（默认第一个），按块生成DataFrame"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(filepath, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet is not None else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _dedup_columns(header)
+        buffer = []
+        for row in rows:
+            buffer.append(row[:len(columns)])
+            if len(buffer) >= chunk_size:
+                yield pd.DataFrame(buffer, columns=columns).infer_objects()
+                buffer = []
+        if buffer:
+            yield pd.DataFrame(buffer, columns=columns).infer_objects()
+    finally:
+        workbook.close()
+
+
+def iter_source_chunks(filepath: str, chunk_size: int = None, dtypes: Dict[str, str] = None,
+                       sheet: str = None) -> Iterator[pd.DataFrame]:
+    """按块读取源文件（工作簿读取 sheet 指定的工作表，默认第一个），内存占用与文件大小无关（旧版 .xls 格式除外）"""
+    chunk_size = chunk_size or Config.PROFILE_CHUNK_ROWS
+    file_ext = os.path.splitext(filepath)[1].lower()
+    if file_ext == '.csv':
+        yield from pd.read_csv(filepath, chunksize=chunk_size, dtype=dtypes)
+    elif file_ext in ('.xlsx', '.xlsm'):
+        yield from _iter_xlsx_chunks(filepath, chunk_size, sheet)
+    else:
+        # xlrd 不支持流式读取，整表读取
+        yield read_sheet(filepath, sheet)
+
+
+def profile_file(filepath: str, sheet: str = None) -> Dict[str, Any]:
+    """流式生成文件（或指定工作表）概况"""
+    builder = _ProfileBuilder(Config.PROFILE_HEAD_ROWS, Config.PROFILE_SAMPLE_ROWS)
+    for chunk in iter_source_chunks(filepath, sheet=sheet):
+        builder.add(chunk)
+    return builder.result()
+
+
+def _profile_path(filepath: str, sheet: str = None) -> str:
+    if sheet is None:
+        return filepath + PROFILE_SUFFIX
+    # 工作表名可能包含不适合作文件名的字符
+    return f"{filepath}.{hashlib.sha1(sheet.encode('utf-8')).hexdigest()[:16]}{PROFILE_SUFFIX}"
+
+
+def load_profile(filepath: str, sheet: str = None) -> Optional[Dict[str, Any]]:
+    """读取与上传文件匹配（大小和修改时间一致）的已保存概况"""
+    path = _profile_path(filepath, sheet)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    stat = os.stat(filepath)
+    source = profile.get('source', {})
+    if (profile.get('version') != PROFILE_VERSION or source.get('size') != stat.st_size
+            or source.get('mtime_ns') != stat.st_mtime_ns):
+        return None
+    return profile
+
+
+def save_profile(filepath: str, profile: Dict[str, Any], sheet: str = None):
+    """将概况保存在上传文件旁边，每个工作表一个文件"""
+    stat = os.stat(filepath)
+    profile['source'] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+    path = _profile_path(filepath, sheet)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def get_profile(filepath: str, sheet: str = None) -> Dict[str, Any]:
+    """获取文件（sheet 为 None 时为第一个工作表）概况：优先复用已保存的结果，否则流式计算并保存"""
+    profile = load_profile(filepath, sheet)
+    if profile is None:
+        profile = profile_file(filepath, sheet)
+        save_profile(filepath, profile, sheet)
+    return profile
+
+
+# 检测文本列时尝试的常见日期格式
+DATETIME_FORMATS = [
+    '%Y-%m-%d', '%Y/%m/%d', '%Y-%m-%d %H:%M:%S', '%Y/%m/%d %H:%M:%S', '%Y-%m-%d %H:%M',
+    '%Y-%m', '%Y%m%d', '%d/%m/%Y', '%m/%d/%Y', '%Y年%m月%d日', '%H:%M:%S'
+]
+
+
+def _as_chunked_array(series: pd.Series) -> pa.ChunkedArray:
+    try:
+        return pa.chunked_array([pa.array(series, from_pandas=True)])
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return pa.chunked_array([pa.array(series.astype(str).where(series.notna(), None), from_pandas=True)])
+
+
+def _iter_dataset_columns(dataset_path: str) -> Iterator[Tuple[str, pa.ChunkedArray]]:
+    """逐列读取缓存数据集：Arrow缓存直接使用内存映射的列，pickle缓存转换为Arrow数组"""
+    if dataset_path.endswith('.arrow'):
+        table = open_mapped_table(dataset_path)
+        for name, column in zip(table.column_names, table.columns):
+            # 导入时压缩为字典编码的文本列按原文本统计
+            if pa.types.is_dictionary(column.type):
+                column = column.cast(column.type.value_type)
+            yield str(name), column
+    else:
+        df = pd.read_pickle(dataset_path)
+        for name in df.columns:
+            yield str(name), _as_chunked_array(df[name])
+
+
+def _top_values(column: pa.ChunkedArray, top_k: int) -> List[List[Any]]:
+    counts = pc.value_counts(column.drop_null())
+    order = pc.array_sort_indices(counts.field('counts'), order='descending')[:top_k]
+    top = counts.take(order)
+    # 只出现一次的值对描述数据分布没有帮助
+    return [[to_json_value(value), count]
+            for value, count in zip(top.field('values').to_pylist(), top.field('counts').to_pylist()) if count > 1]
+
+
+def _text_checks(values: pd.Series) -> Dict[str, Any]:
+    """在抽样的非空文本值上检测可转为数值的比例和日期格式"""
+    values = values.dropna().astype(str).str.strip()
+    if values.empty:
+        return {}
+    numeric_ratio = float(pd.to_numeric(values, errors='coerce').notna().mean())
+    checks = {'numeric_ratio': round(numeric_ratio, 4)}
+    if numeric_ratio < 0.5:
+        formats = []
+        for fmt in DATETIME_FORMATS:
+            parsed = pd.to_datetime(values, format=fmt, errors='coerce')
+            if parsed.notna().mean() >= 0.8:
+                formats.append(fmt)
+        if formats:
+            checks['datetime_formats'] = formats
+    return checks
+
+
+def profile_columns(dataset_path: str, profile: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    计算紧凑的逐列概况：空值比例、不同值数量、最小/最大值、常见值，
+    以及文本列中可转为数值的比例和检测到的日期格式。
+    聚合统计在整列上用 pyarrow.compute 向量化计算；文本检测使用流式概况中的蓄水池样本。
+    """
+    top_k = Config.COLUMN_PROFILE_TOP_K
+    sample = pd.DataFrame(profile.get('sample') or [], columns=profile['columns'])
+    result = {}
+    for name, column in _iter_dataset_columns(dataset_path):
+        total = len(column)
+        stats: Dict[str, Any] = {'null_ratio': round(column.null_count / total, 4) if total else 0.0}
+        result[name] = stats
+        if total == column.null_count:
+            continue
+
+        dtype = column.type
+        stats['distinct'] = pc.count_distinct(column).as_py()
+        if pa.types.is_integer(dtype) or pa.types.is_floating(dtype) or pa.types.is_temporal(dtype):
+            min_max = pc.min_max(column)
+            stats['min'] = to_json_value(min_max['min'].as_py())
+            stats['max'] = to_json_value(min_max['max'].as_py())
+        is_text = pa.types.is_string(dtype) or pa.types.is_large_string(dtype)
+        if is_text or pa.types.is_boolean(dtype) or (pa.types.is_integer(dtype) and stats['distinct'] <= 1000):
+            top_values = _top_values(column, top_k)
+            if top_values:
+                stats['top_values'] = top_values
+        if is_text:
+            values = sample[name] if name in sample.columns else column.slice(0, Config.PROFILE_SAMPLE_ROWS).to_pandas()
+            stats.update(_text_checks(values))
+    return result
+
+
+def get_column_profile(filepath: str, dataset_path: str, sheet: str = None) -> Dict[str, Dict[str, Any]]:
+    """获取逐列概况：每个数据集只计算一次，随上传文件的概况一起保存"""
+    profile = get_profile(filepath, sheet)
+    column_profile = profile.get('column_profile')
+    if column_profile is None:
+        column_profile = profile_columns(dataset_path, profile)
+        profile['column_profile'] = column_profile
+        save_profile(filepath, profile, sheet)
+    return column_profile
@@ -0,0 +1,626 @@
+import os
+import io
+import sys
+import time
+import queue
+import pickle
+import signal
+import builtins
+import linecache
+import threading
+import traceback
+import multiprocessing
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Any, Callable, Dict, List, Tuple, Union
+# 预先导入：forkserver 预加载本模块后，工作进程无需再次导入 pandas/numpy
+import numpy as np
+import pandas as pd
+from config import Config
+import metrics
+from dataset_cache import LazySheets, load_dataset, enable_copy_on_write
+from result_store import store_table
+try:
+    import resource
+except ImportError:  # Windows 不支持 setrlimit
+    resource = None
+
+# 分析脚本运行环境：结构化输出工具和print重定向。
+# 结果在产生时即保证可序列化，经工作进程管道以二进制形式回传，不再经过标准输出。
+ANALYSIS_HARNESS = '''
+import pandas as pd
+import numpy as np
+from typing import Dict, List, Any
+import sys
+import traceback
+import json
+import os
+import math
+import datetime as _dt
+
+def _to_builtin(value):
+    """将单个值转换为JSON可直接序列化的Python内置类型"""
+    if value is None or isinstance(value, (bool, int, str)):
+        return value
+    if isinstance(value, float):
+        return value if math.isfinite(value) else None
+    if isinstance(value, np.generic):
+        return _to_builtin(value.item())
+    if isinstance(value, dict):
+        return {str(k): _to_builtin(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [_to_builtin(v) for v in value]
+    if isinstance(value, pd.Series):
+        return [_to_builtin(v) for v in value.tolist()]
+    if isinstance(value, np.ndarray):
+        return [_to_builtin(v) for v in value.tolist()]
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if isinstance(value, (_dt.datetime, _dt.date, _dt.time)):
+        return value.isoformat()
+    return str(value)
+
+def _column_to_builtin(series: pd.Series) -> list:
+    """按列向量化转换为内置类型列表"""
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        if not series.hasnans:
+            return series.astype(object).tolist()
+    elif pd.api.types.is_float_dtype(series):
+        values = series.astype(float)
+        return values.astype(object).where(np.isfinite(values), None).tolist()
+    elif pd.api.types.is_datetime64_any_dtype(series):
+        return series.dt.strftime('%Y-%m-%dT%H:%M:%S').astype(object).where(series.notna(), None).tolist()
+    return [_to_builtin(v) for v in series.tolist()]
+
+class AnalysisOutput:
+    """结构化输出工具：所有值在写入时即转换为可序列化的内置类型"""
+    def __init__(self):
+        self.sections = []
+        self.current_section = None
+        # 每个部分完成时的回调，用于向前端流式推送
+        self.on_section = None
+
+    def _finish_section(self):
+        self.sections.append(self.current_section)
+        if self.on_section is not None:
+            self.on_section(self.current_section)
+        self.current_section = None
+
+    def start_section(self, title: str):
+        if self.current_section:
+            self._finish_section()
+        self.current_section = {"title": str(title), "content": [], "data": {}, "charts": []}
+
+    def add_text(self, text: str):
+        if self.current_section:
+            self.current_section["content"].append({"type": "text", "text": str(text)})
+
+    def add_table(self, df: pd.DataFrame, description: str = ""):
+        if self.current_section:
+            if isinstance(df, pd.Series):
+                df = df.to_frame()
+            item = {"type": "table", "columns": [str(col) for col in df.columns], "description": str(description)}
+            # 超过阈值的大表写入结果存储，结果中只保留首页和句柄，其余按页读取
+            if _table_store is not None and len(df) > _table_store["max_rows"]:
+                item["handle"] = _table_store["store"](df)
+                item["row_count"] = len(df)
+                df = df.head(_table_store["page_rows"])
+            columns = [_column_to_builtin(df.iloc[:, i]) for i in range(df.shape[1])]
+            item["rows"] = [list(row) for row in zip(*columns)]
+            self.current_section["content"].append(item)
+
+    def add_stat(self, name: str, value: Any):
+        if self.current_section:
+            if isinstance(value, (dict, list)):
+                self.current_section["data"][str(name)] = _to_builtin(value)
+            else:
+                self.current_section["data"][str(name)] = str(value)
+
+    def end_section(self):
+        if self.current_section:
+            self._finish_section()
+
+    def get_output(self) -> dict:
+        if self.current_section:
+            self.end_section()
+        return {"sections": self.sections}
+
+# 大表卸载设置，由执行进程注入：{"max_rows", "page_rows", "store"}
+_table_store = None
+
+# 创建全局输出对象
+output = AnalysisOutput()
+orig_print = print
+
+def print(*args, **kwargs):
+    text = " ".join(str(arg) for arg in args)
+    output.add_text(text)
+    orig_print(*args, **kwargs)
+'''
+
+SCRIPT_FILENAME = '<analysis_script>'
+
+# 工作进程中是否以零拷贝方式附加数据集（需要写时复制支持）
+_ZERO_COPY = False
+
+
+def _current_rss() -> int:
+    """
+    返回当前进程的匿名常驻内存（字节）。
+    内存映射的缓存数据集页面属于文件页，可随时被回收且由各进程共享，不计入回收判断。
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('RssAnon:'):
+                    return int(line.split()[1]) * 1024
+        # 没有 RssAnon 的旧内核：常驻内存减去共享（文件映射）页面
+        with open('/proc/self/statm') as f:
+            fields = f.read().split()
+        return (int(fields[1]) - int(fields[2])) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class CPUTimeExceeded(BaseException):
+    """脚本CPU时间超过上限；继承 BaseException，避免被脚本中的 except Exception 吞掉"""
+
+
+def _on_cpu_limit(signum, frame):
+    raise CPUTimeExceeded()
+
+
+class ScriptTimeout(BaseException):
+    """批量执行中单个脚本超过墙钟时间上限，由工作进程内的定时器触发"""
+
+
+def _on_script_timeout(signum, frame):
+    raise ScriptTimeout()
+
+
+def _set_script_timer(seconds: float):
+    """设置单个脚本的墙钟时间上限（SIGALRM），seconds 为空时取消"""
+    if hasattr(signal, 'setitimer'):
+        signal.setitimer(signal.ITIMER_REAL, seconds or 0)
+
+
+def _apply_memory_limit(max_bytes: int):
+    """
+    限制工作进程的数据段（堆和匿名内存），超出时分配失败并抛出 MemoryError。
+    使用 RLIMIT_DATA 而不是 RLIMIT_AS：内存映射的缓存数据集和共享库映射不计入，
+    数据集大小不会占用脚本可用的内存额度。
+    """
+    if resource is None or not max_bytes:
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_DATA)
+    if hard != resource.RLIM_INFINITY:
+        max_bytes = min(max_bytes, hard)
+    resource.setrlimit(resource.RLIMIT_DATA, (max_bytes, hard))
+
+
+def _set_cpu_limit(seconds: float):
+    """
+    设置本次任务的CPU时间软上限（按工作进程已用CPU时间累加），seconds 为空时解除限制。
+    超限后内核发送 SIGXCPU，由 _on_cpu_limit 转换为 CPUTimeExceeded。
+    """
+    if resource is None or not hasattr(signal, 'SIGXCPU'):
+        return
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    soft = hard
+    if seconds:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        soft = int(usage.ru_utime + usage.ru_stime + seconds) + 1
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _load_frame(data_path: str) -> pd.DataFrame:
+    # 附加到已物化的缓存数据集，无需重新解析或复制
+    df = load_dataset(data_path, zero_copy=_ZERO_COPY)
+    df.columns = df.columns.astype(str)
+    return df
+
+
+def _run_job(script: str, data_path: str, on_section: Callable[[dict], None] = None,
+             options: dict = None, df: pd.DataFrame = None) -> Tuple[str, Any, str, dict]:
+    """
+    在全新的命名空间中执行分析脚本，返回 (状态, 结果, 标准输出, 各阶段耗时)。
+    状态为 'ok'、'error'，或超出资源上限时的 'cpu_limit'、'memory_limit'，批量执行时还可能为 'timeout'。
+    options 为 ExecutorPool.job_options() 给出的资源上限和大表卸载设置；
+    其中 sheets（工作表名 -> 缓存数据集路径，第一项即 data_path）存在时脚本可通过 sheets 引用多个工作表。
+    df 为批量执行时已加载的数据集，脚本使用它的副本。
+    """
+    options = options or {}
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    namespace = {'__name__': '__analysis__', '__builtins__': builtins}
+    timings = {}
+    lines = script.splitlines(True)
+    linecache.cache[SCRIPT_FILENAME] = (len(script), None, lines, SCRIPT_FILENAME)
+
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            _set_cpu_limit(options.get('cpu_seconds'))
+            _set_script_timer(options.get('script_timeout'))
+            exec(compile(ANALYSIS_HARNESS, '<analysis_harness>', 'exec'), namespace)
+            if options.get('table_max_rows'):
+                folder = options['result_store_folder']
+                namespace['_table_store'] = {
+                    'max_rows': options['table_max_rows'],
+                    'page_rows': options['table_page_rows'],
+                    'store': lambda df: store_table(df, folder)
+                }
+            exec(compile(script, SCRIPT_FILENAME, 'exec'), namespace)
+            namespace['output'].on_section = on_section
+
+            start = time.perf_counter()
+            if df is None:
+                df = _load_frame(data_path)
+            else:
+                # 写时复制模式下浅拷贝共享数据，脚本修改时才复制被修改的列，不影响同一批次的其他脚本；
+                # 不支持写时复制时只能深拷贝
+                df = df.copy(deep=not _ZERO_COPY)
+            timings['dataset_load'] = time.perf_counter() - start
+            # 多工作表分析：其余工作表在脚本第一次访问时才加载
+            sheet_paths = options.get('sheets')
+            if sheet_paths:
+                primary = next(iter(sheet_paths))
+                namespace['sheets'] = LazySheets(sheet_paths, {primary: df}, zero_copy=_ZERO_COPY)
+
+            # 执行分析
+            start = time.perf_counter()
+            namespace['analyze_data'](df)
+            result = namespace['output'].get_output()
+            timings['script_run'] = time.perf_counter() - start
+        except CPUTimeExceeded:
+            return 'cpu_limit', "CPU时间超出上限", stdout.getvalue(), timings
+        except ScriptTimeout:
+            return 'timeout', "执行超时", stdout.getvalue(), timings
+        except MemoryError:
+            return 'memory_limit', "内存超出上限", stdout.getvalue(), timings
+        except BaseException as e:
+            print(f"执行出错: {str(e)}", file=sys.stderr)
+            print("\n详细错误信息:", file=sys.stderr)
+            traceback.print_exc(file=sys.stderr)
+            return 'error', stderr.getvalue(), stdout.getvalue(), timings
+        finally:
+            _set_script_timer(None)
+            _set_cpu_limit(None)
+            linecache.cache.pop(SCRIPT_FILENAME, None)
+
+    return 'ok', result, stdout.getvalue(), timings
+
+
+def _run_batch(scripts: List[str], data_path: str, options: dict) -> Tuple[List[tuple], dict]:
+    """
+    批量执行：数据集只加载一次，每个脚本在各自的命名空间中使用数据集的浅拷贝执行，
+    单个脚本出错、超时或超出资源上限不影响其余脚本。返回 ([(状态, 结果, 标准输出)], 各阶段耗时)。
+    """
+    start = time.perf_counter()
+    try:
+        df = _load_frame(data_path)
+    except MemoryError:
+        return [('memory_limit', "内存超出上限", '')] * len(scripts), {}
+    except Exception as e:
+        return [('error', f"读取数据集失败: {str(e)}", '')] * len(scripts), {}
+    timings = {'dataset_load': time.perf_counter() - start, 'script_run': 0.0}
+    # 每个脚本单独计时，超时只终止该脚本
+    options = dict(options, script_timeout=options.get('timeout'))
+    max_output = options.get('max_output_bytes')
+    # 整批结果通过一条消息回传，总大小与单次执行的结果使用同一上限，超出部分的脚本按结果过大处理
+    total = 0
+    items = []
+    for script in scripts:
+        status, payload, stdout, job_timings = _run_job(script, data_path, None, options, df)
+        timings['script_run'] += job_timings.get('script_run', 0.0)
+        stdout = _truncate_stdout(stdout, max_output)
+        try:
+            size = len(pickle.dumps((status, payload, stdout), pickle.HIGHEST_PROTOCOL))
+        except Exception as e:
+            status, payload, size = 'error', f"执行结果无法传输: {str(e)}", 0
+        if max_output and (size > max_output or total + size > max_output):
+            status, payload, stdout = 'output_limit', size, ''
+        else:
+            total += size
+        items.append((status, payload, stdout))
+    return items, timings
+
+
+def _truncate_stdout(stdout: str, max_output: int) -> str:
+    if max_output and len(stdout) > max_output:
+        return stdout[:max_output] + "\n...（输出过长，已截断）"
+    return stdout
+
+
+def _send_done(conn, status: str, payload: Any, stdout: str, timings: dict, max_output: int):
+    """回传执行结果；序列化后超过 max_output 字节时改为回传 'output_limit' 状态"""
+    stdout = _truncate_stdout(stdout, max_output)
+    try:
+        data = pickle.dumps(('done', status, payload, stdout, _current_rss(), timings), pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        data = pickle.dumps(('done', 'error', f"执行结果无法传输: {str(e)}", stdout, _current_rss(), timings))
+    if max_output and len(data) > max_output:
+        data = pickle.dumps(('done', 'output_limit', len(data), '', _current_rss(), timings))
+    conn.send_bytes(data)
+
+
+def _worker_main(conn, memory_limit: int = None):
+    """
+    工作进程主循环：接收任务、执行并回传结果和当前内存占用。
+    需要流式输出时，每个分析部分完成后先发送 ('section', 部分)，最后发送 ('done', ...)，
+    其中包含工作进程内测得的数据加载和脚本执行耗时。
+    """
+    global _ZERO_COPY
+    _ZERO_COPY = enable_copy_on_write()
+    _apply_memory_limit(memory_limit)
+    if hasattr(signal, 'SIGXCPU'):
+        signal.signal(signal.SIGXCPU, _on_cpu_limit)
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, _on_script_timeout)
+    while True:
+        try:
+            job = conn.recv()
+        except (EOFError, OSError):
+            break
+        if job is None:
+            break
+        script, data_path, stream_sections, options = job
+        if isinstance(script, list):
+            items, timings = _run_batch(script, data_path, options)
+            conn.send_bytes(pickle.dumps(('done', 'batch', items, '', _current_rss(), timings),
+                                         pickle.HIGHEST_PROTOCOL))
+            continue
+        on_section = (lambda section: conn.send(('section', section))) if stream_sections else None
+        status, payload, stdout, timings = _run_job(script, data_path, on_section, options)
+        _send_done(conn, status, payload, stdout, timings, options.get('max_output_bytes'))
+    conn.close()
+
+
+class ExecutionCancelled(Exception):
+    """执行中的任务被取消"""
+
+
+class ExecutionTimeout(Exception):
+    """任务执行超过墙钟时间上限"""
+
+
+# 超出资源上限的状态；出现后替换工作进程
+LIMIT_STATUSES = ('timeout', 'cpu_limit', 'memory_limit', 'output_limit')
+
+
+# 等待工作进程结果时检查取消信号的间隔（秒）
+POLL_INTERVAL = 0.1
+
+
+class _Worker:
+    def __init__(self, ctx, memory_limit: int = None):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn, memory_limit), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.rss = 0
+        self.last_timings = {}
+
+    def run(self, script: Union[str, List[str]], data_path: str, cancel_event: threading.Event = None,
+            on_section: Callable[[dict], None] = None, options: dict = None,
+            timeout: float = None) -> Tuple[str, Any, str]:
+        """script 为脚本列表时批量执行，状态为 'batch'，结果为各脚本的 (状态, 结果, 标准输出)"""
+        options = options or {}
+        self.conn.send((script, data_path, on_section is not None, options))
+        timeout = timeout if timeout is not None else options.get('timeout')
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            while not self.conn.poll(POLL_INTERVAL):
+                if cancel_event is not None and cancel_event.is_set():
+                    raise ExecutionCancelled()
+                if deadline is not None and time.monotonic() > deadline:
+                    raise ExecutionTimeout()
+            message = self.conn.recv()
+            if message[0] == 'section':
+                on_section(message[1])
+                continue
+            _, status, payload, stdout, self.rss, self.last_timings = message
+            self.jobs += 1
+            return status, payload, stdout
+
+    def stop(self):
+        try:
+            self.conn.send(None)
+            self.conn.close()
+        except OSError:
+            pass
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.kill()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+
+
+class ExecutorPool:
+    """
+    预热的脚本执行进程池。
+    工作进程通过 forkserver 创建，pandas/numpy 已预先导入；每个任务在全新的命名空间中执行，
+    工作进程执行满指定次数或内存增长超过上限后被替换，以保持隔离性。
+    每个任务受墙钟时间、CPU时间、匿名内存和结果大小限制；同时执行的任务数由准入控制限制，其余排队等待。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, size: int = None, max_jobs: int = None, max_memory: int = None):
+        self.size = size or Config.EXECUTOR_POOL_SIZE
+        self.max_jobs = max_jobs or Config.EXECUTOR_MAX_JOBS_PER_WORKER
+        self.max_memory = max_memory or Config.EXECUTOR_MAX_WORKER_MEMORY
+        self.memory_limit = Config.EXECUTOR_MEMORY_LIMIT
+        self._admission = threading.BoundedSemaphore(Config.EXECUTOR_MAX_CONCURRENT or os.cpu_count() or 1)
+
+        if 'forkserver' in multiprocessing.get_all_start_methods():
+            self._ctx = multiprocessing.get_context('forkserver')
+            self._ctx.set_forkserver_preload([__name__])
+        else:
+            self._ctx = multiprocessing.get_context('spawn')
+
+        self._idle = queue.Queue()
+        for _ in range(self.size):
+            self._idle.put(_Worker(self._ctx, self.memory_limit))
+
+    @classmethod
+    def get_instance(cls) -> 'ExecutorPool':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ExecutorPool()
+            return cls._instance
+
+    def _admit(self, cancel_event: threading.Event = None) -> bool:
+        """等待准入名额，等待期间任务被取消时返回False"""
+        if cancel_event is None:
+            return self._admission.acquire()
+        while not cancel_event.is_set():
+            if self._admission.acquire(timeout=POLL_INTERVAL):
+                return True
+        return False
+
+    def _acquire(self, cancel_event: threading.Event = None):
+        """获取空闲工作进程，等待期间任务被取消时返回None"""
+        if cancel_event is None:
+            return self._idle.get()
+        while not cancel_event.is_set():
+            try:
+                return self._idle.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                continue
+        return None
+
+    @staticmethod
+    def job_options() -> dict:
+        """随任务发送给工作进程的设置：资源上限和大表卸载"""
+        return {
+            'timeout': Config.EXECUTOR_TIMEOUT,
+            'cpu_seconds': Config.EXECUTOR_CPU_LIMIT,
+            'max_output_bytes': Config.EXECUTOR_MAX_OUTPUT_BYTES,
+            'table_max_rows': Config.RESULT_TABLE_MAX_ROWS,
+            'table_page_rows': Config.RESULT_TABLE_PAGE_ROWS,
+            'result_store_folder': os.path.abspath(Config.RESULT_STORE_FOLDER)
+        }
+
+    def run(self, script: str, data_path: str, cancel_event: threading.Event = None,
+            on_section: Callable[[dict], None] = None, sheets: Dict[str, str] = None,
+            timing: Dict[str, float] = None) -> Tuple[str, Any, str]:
+        """
+        在空闲工作进程中执行脚本，返回 (状态, 结果或错误信息, 标准输出)。
+        sheets 为多工作表分析时 {工作表名: 缓存数据集路径}，第一项对应 data_path。
+        提供 timing 时写入工作进程内测得的各阶段耗时，其中 script_run 为脚本本身的运行时间，不含排队等待。
+        cancel_event 被设置时立即终止正在执行的工作进程，状态为 'cancelled'；
+        提供 on_section 时每个分析部分完成即回调。
+        超出资源上限时状态为 LIMIT_STATUSES 之一，'output_limit' 的结果为序列化后的字节数。
+        """
+        with metrics.timer('executor_wait'):
+            admitted = self._admit(cancel_event)
+            worker = self._acquire(cancel_event) if admitted else None
+        if worker is None:
+            if admitted:
+                self._admission.release()
+            return 'cancelled', "分析已取消", ''
+        status = None
+        options = self.job_options()
+        if sheets:
+            options['sheets'] = sheets
+        try:
+            start = time.perf_counter()
+            status, payload, stdout = worker.run(script, data_path, cancel_event, on_section, options)
+            if timing is not None:
+                timing.update(worker.last_timings)
+            if metrics.enabled():
+                elapsed = time.perf_counter() - start
+                for stage, seconds in worker.last_timings.items():
+                    metrics.record(stage, seconds)
+                # 任务分发、结果序列化和管道传输的耗时
+                metrics.record('result_transfer', max(0.0, elapsed - sum(worker.last_timings.values())))
+            return status, payload, stdout
+        except ExecutionCancelled:
+            worker.kill()
+            worker = None
+            return 'cancelled', "分析已取消", ''
+        except ExecutionTimeout:
+            worker.kill()
+            worker = None
+            status = 'timeout'
+            return 'timeout', "执行超时", ''
+        except (EOFError, OSError):
+            worker.kill()
+            worker = None
+            return 'error', "执行进程异常退出", ''
+        finally:
+            self._release(worker, [status])
+
+    def run_batch(self, scripts: List[str], data_path: str, cancel_event: threading.Event = None,
+                  sheets: Dict[str, str] = None) -> List[Tuple[str, Any, str]]:
+        """
+        在同一个工作进程中批量执行多个脚本，数据集只加载一次，返回每个脚本的 (状态, 结果或错误信息, 标准输出)。
+        每个脚本在独立的命名空间中使用数据集的浅拷贝执行，单个脚本的失败、超时或资源超限不影响其余脚本；
+        整批结果的总大小不超过 EXECUTOR_MAX_OUTPUT_BYTES，超出后的脚本状态为 'output_limit'；
+        整批被取消或工作进程异常退出时所有脚本状态相同。
+        """
+        if not scripts:
+            return []
+        with metrics.timer('executor_wait'):
+            admitted = self._admit(cancel_event)
+            worker = self._acquire(cancel_event) if admitted else None
+        if worker is None:
+            if admitted:
+                self._admission.release()
+            return [('cancelled', "分析已取消", '')] * len(scripts)
+        statuses = []
+        options = self.job_options()
+        if sheets:
+            options['sheets'] = sheets
+        # 单个脚本的超时在工作进程内处理，这里只防止整批卡死
+        timeout = options['timeout'] * (len(scripts) + 1) if options.get('timeout') else None
+        try:
+            _, items, _ = worker.run(scripts, data_path, cancel_event, None, options, timeout)
+            statuses = [item[0] for item in items]
+            if metrics.enabled():
+                for stage, seconds in worker.last_timings.items():
+                    metrics.record(stage, seconds)
+            return items
+        except ExecutionCancelled:
+            worker.kill()
+            worker = None
+            return [('cancelled', "分析已取消", '')] * len(scripts)
+        except ExecutionTimeout:
+            worker.kill()
+            worker = None
+            statuses = ['timeout'] * len(scripts)
+            return [('timeout', "执行超时", '')] * len(scripts)
+        except (EOFError, OSError):
+            worker.kill()
+            worker = None
+            return [('error', "执行进程异常退出", '')] * len(scripts)
+        finally:
+            self._release(worker, statuses)
+
+    def _release(self, worker: '_Worker', statuses: List[str]):
+        """
+        归还工作进程：已被终止的进程重新创建；超出资源上限、执行满次数或内存增长过多的进程被替换。
+        """
+        self._admission.release()
+        limited = [status for status in statuses if status in LIMIT_STATUSES]
+        for status in limited:
+            metrics.inc('executor_limit_total', reason=status)
+        if worker is None:
+            worker = _Worker(self._ctx, self.memory_limit)
+        elif limited or worker.jobs >= self.max_jobs or worker.rss > self.max_memory:
+            worker.stop()
+            worker = _Worker(self._ctx, self.memory_limit)
+        self._idle.put(worker)
+
+    def shutdown(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().stop()
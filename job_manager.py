@@ -0,0 +1,181 @@
+import time
+import uuid
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from config import Config
+
+
+class JobQueueFull(Exception):
+    """排队任务数已达上限"""
+
+
+class Job:
+    """一次异步分析任务"""
+
+    def __init__(self, user: str, data: Dict[str, Any]):
+        self.id = uuid.uuid4().hex
+        self.user = user
+        self.data = data
+        self.status = 'queued'  # queued / running / succeeded / failed / cancelled
+        self.stage = None
+        self.attempt = 0
+        self.max_attempts = None
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_event = threading.Event()
+        # 事件日志：[(事件名, 信息)]，供SSE按序号推送及断线续传
+        self.events: List[Tuple[str, Dict[str, Any]]] = []
+        self._events_changed = threading.Condition()
+
+    def on_event(self, event: str, info: Dict[str, Any]):
+        """Analyzer 进度回调：记录当前阶段和尝试次数，并写入事件日志"""
+        if event in ('generating', 'executing'):
+            self.stage = event
+            self.attempt = info.get('attempt', self.attempt)
+            self.max_attempts = info.get('max_attempts', self.max_attempts)
+        self._append_event(event, info)
+
+    def _append_event(self, event: str, info: Dict[str, Any]):
+        with self._events_changed:
+            self.events.append((event, info))
+            self._events_changed.notify_all()
+
+    def finish(self, status: str):
+        """标记任务结束，并追加携带最终结果的 done 事件"""
+        self.finished_at = time.time()
+        self.status = status
+        self._append_event('done', self.to_dict())
+
+    def wait_events(self, start: int, timeout: float) -> List[Tuple[str, Dict[str, Any]]]:
+        """返回序号 start 之后的事件，暂无新事件时最多等待 timeout 秒"""
+        with self._events_changed:
+            if len(self.events) <= start:
+                self._events_changed.wait(timeout)
+            return self.events[start:]
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ('succeeded', 'failed', 'cancelled')
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'job_id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'attempt': self.attempt,
+            'max_attempts': self.max_attempts,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'result': self.result,
+            'error': self.error
+        }
+
+
+class JobManager:
+    """
+    异步分析任务调度器。
+    固定数量的工作线程执行任务；每个用户拥有独立队列，调度时在用户之间轮转以保证公平，
+    并限制全局和单用户的排队深度。已完成的任务在 JOB_RESULT_TTL 秒后清理。
+    """
+
+    def __init__(self, runner: Callable[[Job], Dict[str, Any]], workers: int = None,
+                 max_queued: int = None, max_queued_per_user: int = None, result_ttl: float = None):
+        self.runner = runner
+        self.workers = workers or Config.JOB_WORKERS
+        self.max_queued = max_queued or Config.JOB_MAX_QUEUED
+        self.max_queued_per_user = max_queued_per_user or Config.JOB_MAX_QUEUED_PER_USER
+        self.result_ttl = result_ttl or Config.JOB_RESULT_TTL
+
+        self._jobs: Dict[str, Job] = {}
+        self._queues: 'OrderedDict[str, deque]' = OrderedDict()
+        self._queued = 0
+        self._condition = threading.Condition()
+        self._threads = []
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._worker_loop, name=f'analysis-job-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def submit(self, user: str, data: Dict[str, Any]) -> Job:
+        """提交任务，队列已满时抛出 JobQueueFull"""
+        with self._condition:
+            self._cleanup()
+            user_queue = self._queues.get(user)
+            if self._queued >= self.max_queued:
+                raise JobQueueFull(f"任务队列已满（{self.max_queued}），请稍后重试")
+            if user_queue is not None and len(user_queue) >= self.max_queued_per_user:
+                raise JobQueueFull(f"您的排队任务已达上限（{self.max_queued_per_user}），请等待已有任务完成")
+
+            job = Job(user, data)
+            self._jobs[job.id] = job
+            self._queues.setdefault(user, deque()).append(job)
+            self._queued += 1
+            self._ensure_started()
+            self._condition.notify()
+            return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """取消任务：排队中的任务直接移出队列，运行中的任务终止其执行进程"""
+        with self._condition:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return job
+            job.cancel_event.set()
+            if job.status == 'queued':
+                user_queue = self._queues.get(job.user)
+                if user_queue is not None and job in user_queue:
+                    user_queue.remove(job)
+                    self._queued -= 1
+                    if not user_queue:
+                        del self._queues[job.user]
+                job.finish('cancelled')
+            return job
+
+    def _next_job(self) -> Job:
+        """在有排队任务的用户之间轮转取出下一个任务"""
+        with self._condition:
+            while not self._queues:
+                self._condition.wait()
+            user, user_queue = next(iter(self._queues.items()))
+            job = user_queue.popleft()
+            self._queued -= 1
+            del self._queues[user]
+            if user_queue:
+                self._queues[user] = user_queue
+            job.status = 'running'
+            job.started_at = time.time()
+            return job
+
+    def _worker_loop(self):
+        while True:
+            job = self._next_job()
+            try:
+                job.result = self.runner(job)
+                if job.cancel_event.is_set():
+                    status = 'cancelled'
+                else:
+                    status = 'succeeded' if job.result.get('success') else 'failed'
+                    job.error = job.result.get('error')
+            except Exception as e:
+                job.error = str(e)
+                status = 'failed'
+            job.finish(status)
+
+    def _cleanup(self):
+        now = time.time()
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished and now - job.finished_at > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
@@ -0,0 +1,196 @@
+import time
+import bisect
+import threading
+import contextvars
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+# 阶段耗时直方图的标签；未提供的标签取空字符串，保证同一指标的标签集合一致
+STAGE_LABELS = ('stage', 'model', 'attempt', 'rows')
+
+
+def rows_bucket(row_count: int) -> str:
+    """将数据集行数归入少量区间，避免标签基数过高"""
+    for limit, label in ((1000, '<1k'), (100000, '<100k'), (1000000, '<1m')):
+        if row_count < limit:
+            return label
+    return '>=1m'
+
+
+class MetricsRegistry:
+    """进程内的计数器和直方图，按 Prometheus 文本格式导出"""
+
+    def __init__(self, buckets: List[float] = None):
+        self.buckets = sorted(buckets or Config.METRICS_BUCKETS)
+        self._lock = threading.Lock()
+        self._help: Dict[str, Tuple[str, str]] = {}
+        self._counters: Dict[str, Dict[Tuple, float]] = defaultdict(lambda: defaultdict(float))
+        # 直方图：{指标名: {标签: [各区间计数..., 总和, 总数]}}
+        self._histograms: Dict[str, Dict[Tuple, List[float]]] = defaultdict(dict)
+
+    def describe(self, name: str, kind: str, help_text: str):
+        self._help[name] = (kind, help_text)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            self._counters[name][key] += value
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._histograms[name].get(key)
+            if series is None:
+                series = self._histograms[name][key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Tuple = ()) -> str:
+        items = list(labels) + list(extra)
+        if not items:
+            return ''
+        escaped = []
+        for key, value in items:
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+            escaped.append(f'{key}="{value}"')
+        return '{' + ','.join(escaped) + '}'
+
+    def render(self) -> str:
+        """导出为 Prometheus 文本格式"""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self._counters.items()):
+                kind, help_text = self._help.get(name, ('counter', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in sorted(series.items()):
+                    lines.append(f"{name}{self._format_labels(labels)} {value:g}")
+            for name, series in sorted(self._histograms.items()):
+                _, help_text = self._help.get(name, ('histogram', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} histogram")
+                for labels, values in sorted(series.items()):
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, values):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{self._format_labels(labels, (('le', f'{bound:g}'),))} {cumulative:g}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, (('le', '+Inf'),))} {values[-1]:g}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {values[-2]:.6f}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {values[-1]:g}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+registry.describe('analysis_stage_seconds', 'histogram', '分析各阶段耗时（秒）')
+registry.describe('analysis_requests_total', 'counter', '分析请求数，按结果分类')
+registry.describe('analysis_attempts_total', 'counter', '生成-执行尝试次数，按模型和结果分类')
+registry.describe('batch_queries_total', 'counter', '批量分析中的查询数，按结果分类')
+registry.describe('slow_pattern_total', 'counter', '生成脚本中检测到的低效写法次数，按写法分类')
+registry.describe('executor_limit_total', 'counter', '超出资源上限被终止的脚本执行次数，按原因分类')
+
+
+class _Scope:
+    """一次请求的公共标签，以及（需要返回耗时明细时）收集的阶段耗时"""
+
+    def __init__(self, labels: Dict[str, Any], timings: Optional[List[Dict[str, Any]]]):
+        self.labels = labels
+        self.timings = timings
+
+
+_scope: contextvars.ContextVar = contextvars.ContextVar('metrics_scope', default=None)
+
+
+class _NoopTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NOOP = _NoopTimer()
+
+
+def enabled() -> bool:
+    scope = _scope.get()
+    return Config.METRICS_ENABLED or (scope is not None and scope.timings is not None)
+
+
+def record(stage: str, seconds: float, **labels):
+    """记录一个已测得的阶段耗时"""
+    scope = _scope.get()
+    collect = scope is not None and scope.timings is not None
+    if not Config.METRICS_ENABLED and not collect:
+        return
+    merged = dict(scope.labels) if scope is not None else {}
+    merged.update(labels)
+    merged['stage'] = stage
+    if Config.METRICS_ENABLED:
+        registry.observe('analysis_stage_seconds', seconds,
+                         **{name: str(merged.get(name, '')) for name in STAGE_LABELS})
+    if collect:
+        entry = {'stage': stage, 'seconds': round(seconds, 6)}
+        if 'attempt' in merged:
+            entry['attempt'] = merged['attempt']
+        scope.timings.append(entry)
+
+
+class _Timer:
+    def __init__(self, stage: str, labels: Dict[str, Any]):
+        self.stage = stage
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.stage, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+def timer(stage: str, **labels):
+    """阶段计时上下文管理器；指标关闭且当前请求不需要耗时明细时几乎没有开销"""
+    if not enabled():
+        return _NOOP
+    return _Timer(stage, labels)
+
+
+def inc(name: str, value: float = 1, **labels):
+    if Config.METRICS_ENABLED:
+        registry.inc(name, value, **labels)
+
+
+@contextmanager
+def request_scope(collect: bool = False, **labels):
+    """
+    设置一次请求的公共标签（模型、数据集规模等）。
+    collect 为 True 时收集该请求所有阶段的耗时，作为 [{'stage', 'seconds', 'attempt'?}] 返回。
+    """
+    scope = _Scope(labels, [] if collect else None)
+    token = _scope.set(scope)
+    try:
+        yield scope.timings
+    finally:
+        _scope.reset(token)
+
+
+def update_scope(**labels):
+    """在请求进行中补充公共标签"""
+    scope = _scope.get()
+    if scope is not None:
+        scope.labels.update(labels)
+
+
+def summarize(timings: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """汇总耗时明细：各阶段总耗时及按发生顺序的明细"""
+    stages: Dict[str, float] = {}
+    for entry in timings:
+        stages[entry['stage']] = round(stages.get(entry['stage'], 0.0) + entry['seconds'], 6)
+    return {'stages': stages, 'events': timings}
@@ -0,0 +1,184 @@
+import re
+import pandas as pd
+from typing import Any, Dict, List, Tuple
+from config import Config
+
+# 中日韩文字及全角符号大约每个字符一个token，其余字符约四个字符一个token
+_CJK_PATTERN = re.compile(r'[　-〿㐀-䶿一-鿿＀-￯]')
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+_CJK_RUN_PATTERN = re.compile(r'[㐀-䶿一-鿿]+')
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的token数量"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+
+def truncate_value(value: Any, width: int = 20) -> str:
+    text = f"{value:.6g}" if isinstance(value, float) else str(value)
+    return text if len(text) <= width else text[:width - 1] + '…'
+
+
+def format_column_profile_line(col: str, stats: Dict[str, Any]) -> str:
+    """将单列概况格式化为一行提示文本"""
+    parts = [f"空值{stats['null_ratio']:.1%}"]
+    if 'distinct' in stats:
+        parts.append(f"不同值{stats['distinct']}")
+    if 'min' in stats:
+        parts.append(f"范围 {truncate_value(stats['min'])} ~ {truncate_value(stats['max'])}")
+    if 'numeric_ratio' in stats and stats['numeric_ratio'] > 0:
+        parts.append(f"可转为数值{stats['numeric_ratio']:.0%}")
+    if stats.get('datetime_formats'):
+        parts.append(f"日期格式 {' / '.join(stats['datetime_formats'])}")
+    if stats.get('top_values'):
+        parts.append("常见值 " + "、".join(f"{truncate_value(v)}({c})" for v, c in stats['top_values']))
+    return f"- {col}: " + "，".join(parts)
+
+
+def format_column_profile(column_profile: Dict[str, Dict[str, Any]], max_chars: int = None) -> str:
+    """将逐列概况格式化为紧凑的提示文本，超出字符预算的列被省略"""
+    max_chars = max_chars or Config.PROMPT_PROFILE_MAX_CHARS
+    lines = []
+    used = 0
+    for i, (col, stats) in enumerate(column_profile.items()):
+        line = format_column_profile_line(col, stats)
+        if used + len(line) > max_chars:
+            lines.append(f"（其余{len(column_profile) - i}列的概况已省略）")
+            break
+        lines.append(line)
+        used += len(line) + 1
+    return "\n".join(lines)
+
+
+def _terms(text: str) -> set:
+    """提取用于词法匹配的词：英文单词/数字，以及中文的单字和双字组合"""
+    text = text.lower()
+    terms = set(_WORD_PATTERN.findall(text))
+    for run in _CJK_RUN_PATTERN.findall(text):
+        terms.update(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def rank_columns(user_query: str, excel_info: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """
+    按与查询的词法相关度对列排序，返回 [(列名, 得分)]，得分相同的列保持原有顺序。
+    列名直接出现在查询中得分最高，其次是列名与查询的词重合，以及列的常见值或预览值出现在查询中。
+    """
+    query = user_query.lower()
+    query_terms = _terms(user_query)
+    column_profile = excel_info.get('column_profile') or {}
+    head_rows = excel_info.get('head_rows') or []
+
+    scores = []
+    for index, col in enumerate(excel_info['columns']):
+        name = col.lower().strip()
+        score = 0.0
+        if name and name in query:
+            score += 10
+        name_terms = _terms(col)
+        if name_terms:
+            score += 5 * len(name_terms & query_terms) / len(name_terms)
+
+        values = [value for value, _ in column_profile.get(col, {}).get('top_values', [])]
+        values += [row[index] for row in head_rows if index < len(row)]
+        matched = {str(value).lower() for value in values
+                   if isinstance(value, str) and len(value) >= 2 and value.lower() in query}
+        score += min(3 * len(matched), 6)
+        scores.append((col, score))
+    return sorted(scores, key=lambda item: -item[1])
+
+
+def _render_preview(excel_info: Dict[str, Any], columns: List[str], cell_width: int) -> str:
+    """只包含指定列、单元格截断到 cell_width 字符的预览"""
+    head_rows = excel_info.get('head_rows')
+    if not head_rows or not columns:
+        return ""
+    head = pd.DataFrame(head_rows, columns=excel_info['columns'])[columns]
+    # DataFrame.map 从 pandas 2.1 开始提供，之前的版本使用 applymap
+    map_cells = head.map if hasattr(head, 'map') else head.applymap
+    return map_cells(lambda v: '' if v is None else truncate_value(v, cell_width)).to_string(index=False)
+
+
+def compact_data_sections(user_query: str, excel_info: Dict[str, Any], budget: int) -> Tuple[Dict[str, str], Dict[str, Any]]:
+    """
+    生成提示词中的数据描述部分（类型信息、预览、列概况），使其估计token数不超过 budget。
+    依次尝试：完整内容 → 截断预览单元格 → 按相关度保留部分列的详情，其余列只列出名称或省略。
+    返回 (各部分文本, 压缩决策)。
+    """
+    columns = excel_info['columns']
+    dtypes = excel_info['dtypes']
+    column_profile = excel_info.get('column_profile') or {}
+    cell_width = Config.PROMPT_PREVIEW_CELL_WIDTH
+
+    sections = {
+        'type_info': "\n".join(f"{col}: {dtype}" for col, dtype in dtypes.items()),
+        'preview': excel_info['preview'],
+        'profile_info': format_column_profile(column_profile) if column_profile else ""
+    }
+    decisions: Dict[str, Any] = {'columns': len(columns), 'budget': budget, 'compacted': False}
+    if sum(estimate_tokens(text) for text in sections.values()) <= budget:
+        return sections, decisions
+
+    # 第一步：截断预览中的长单元格
+    decisions['compacted'] = True
+    decisions['preview_cell_width'] = cell_width
+    truncated_preview = _render_preview(excel_info, columns, cell_width)
+    if truncated_preview:
+        sections['preview'] = truncated_preview
+    if sum(estimate_tokens(text) for text in sections.values()) <= budget:
+        return sections, decisions
+
+    # 第二步：按相关度保留部分列的详情
+    ranked = rank_columns(user_query, excel_info)
+    names_cost = estimate_tokens(", ".join(columns))
+    # 为其余列的名称预留至多一半预算
+    detail_budget = budget - min(names_cost, budget // 2)
+    detailed = []
+    used = 0
+    for col, _ in ranked:
+        cost = estimate_tokens(f"{col}: {dtypes.get(col)}")
+        if col in column_profile:
+            cost += estimate_tokens(format_column_profile_line(col, column_profile[col]))
+        # 预览中该列的占用：列名加上每行截断后的值
+        cost += estimate_tokens(col) + len(excel_info.get('head_rows') or []) * (cell_width // 4 + 1)
+        if used + cost > detail_budget:
+            break
+        detailed.append(col)
+        used += cost
+
+    kept = set(detailed)
+    detailed = [col for col in columns if col in kept]
+    others = [col for col in columns if col not in kept]
+    listed = []
+    for col, _ in ranked:
+        if col in kept:
+            continue
+        cost = estimate_tokens(col) + 1
+        if used + cost > budget:
+            break
+        listed.append(col)
+        used += cost
+    listed_set = set(listed)
+    listed = [col for col in others if col in listed_set]
+
+    type_info = "\n".join(f"{col}: {dtypes.get(col)}" for col in detailed)
+    if listed:
+        type_info += f"\n其他列（与需求相关度较低，仅列出列名）：{', '.join(listed)}"
+    if len(others) > len(listed):
+        type_info += f"\n（另有{len(others) - len(listed)}列未列出）"
+    sections['type_info'] = type_info.strip()
+    sections['preview'] = _render_preview(excel_info, detailed, cell_width) or sections['preview']
+    sections['profile_info'] = "\n".join(format_column_profile_line(col, column_profile[col])
+                                         for col in detailed if col in column_profile)
+
+    decisions.update({
+        'detailed_columns': len(detailed),
+        'listed_columns': len(listed),
+        'omitted_columns': len(others) - len(listed),
+        'top_columns': [col for col, score in ranked[:5] if score > 0]
+    })
+    return sections, decisions
@@ -0,0 +1,108 @@
+import os
+import ast
+import json
+import zlib
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from config import Config
+
+
+def normalize_script(script: str) -> str:
+    """去除注释、空白和格式差异后的脚本文本；无法解析时按原文去除首尾空白"""
+    try:
+        return ast.unparse(ast.parse(script))
+    except (SyntaxError, ValueError):
+        return script.strip()
+
+
+def dataset_digest(data_path: str) -> str:
+    """缓存数据集按内容哈希命名，文件名即数据集的内容指纹；数据变化时指纹随之变化"""
+    return os.path.splitext(os.path.basename(data_path))[0]
+
+
+class ResultCache:
+    """
+    脚本执行结果缓存。
+    键为（规范化脚本的哈希、数据集内容哈希），值为压缩后的结构化结果；
+    总大小超过上限时按LRU淘汰。数据集内容变化后哈希不同，旧结果自然不再命中。
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_bytes: int = None, enabled: bool = None):
+        self.max_bytes = max_bytes if max_bytes is not None else Config.RESULT_CACHE_MAX_BYTES
+        self.enabled = Config.RESULT_CACHE_ENABLED if enabled is None else enabled
+        self._entries: 'OrderedDict[str, bytes]' = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @classmethod
+    def get_instance(cls) -> 'ResultCache':
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = ResultCache()
+            return cls._instance
+
+    @staticmethod
+    def make_key(script: str, data_path: str, sheets: Dict[str, str] = None) -> str:
+        """多工作表分析时键中还包含每个工作表的名称和数据集哈希"""
+        script_hash = hashlib.sha256(normalize_script(script).encode('utf-8')).hexdigest()
+        key = f"{script_hash}:{dataset_digest(data_path)}"
+        if sheets:
+            sheet_digests = json.dumps([[name, dataset_digest(path)] for name, path in sheets.items()],
+                                       ensure_ascii=False)
+            key += ':' + hashlib.sha256(sheet_digests.encode('utf-8')).hexdigest()
+        return key
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        with self._lock:
+            blob = self._entries.get(key)
+            if blob is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        return pickle.loads(zlib.decompress(blob))
+
+    def set(self, key: str, result: Dict[str, Any]):
+        if not self.enabled:
+            return
+        blob = zlib.compress(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), 6)
+        if len(blob) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= len(old)
+            self._entries[key] = blob
+            self._bytes += len(blob)
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, key: str):
+        with self._lock:
+            blob = self._entries.pop(key, None)
+            if blob is not None:
+                self._bytes -= len(blob)
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            'enabled': self.enabled,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            'entries': len(self._entries),
+            'bytes': self._bytes
+        }
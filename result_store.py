@@ -0,0 +1,117 @@
+import os
+import re
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Tuple
+import pandas as pd
+import pyarrow as pa
+from config import Config
+from dataset_cache import open_mapped_table, to_json_rows
+
+# 表格句柄：uuid4 的十六进制形式
+HANDLE_PATTERN = re.compile(r'[0-9a-f]{32}')
+
+
+def _table_path(handle: str, folder: str = None) -> str:
+    return os.path.join(folder or Config.RESULT_STORE_FOLDER, handle + '.arrow')
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    """转换为 Arrow 表；混合类型的列无法直接转换时按字符串保存"""
+    df = df.reset_index(drop=True)
+    df.columns = [str(col) for col in df.columns]
+    try:
+        return pa.Table.from_pandas(df, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+        mixed = {col: df[col].map(lambda v: None if pd.isna(v) else str(v))
+                 for col in df.columns if df[col].dtype == object}
+        return pa.Table.from_pandas(df.assign(**mixed), preserve_index=False)
+
+
+def store_batches(schema: pa.Schema, batches: Iterable[pa.RecordBatch], folder: str = None) -> Tuple[str, int]:
+    """将记录批次逐批写入列式结果存储，不在内存中物化整个表；返回 (句柄, 行数)"""
+    folder = folder or Config.RESULT_STORE_FOLDER
+    os.makedirs(folder, exist_ok=True)
+    handle = uuid.uuid4().hex
+    path = _table_path(handle, folder)
+    tmp_path = path + '.tmp'
+    rows = 0
+    with pa.OSFile(tmp_path, 'wb') as sink:
+        with pa.ipc.new_file(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                rows += batch.num_rows
+    os.replace(tmp_path, path)
+    return handle, rows
+
+
+def store_table(df: pd.DataFrame, folder: str = None) -> str:
+    """将结果表格写入列式结果存储，返回句柄"""
+    table = _to_arrow(df)
+    handle, _ = store_batches(table.schema, table.to_batches(), folder)
+    return handle
+
+
+def table_exists(handle: str) -> bool:
+    return bool(HANDLE_PATTERN.fullmatch(handle)) and os.path.exists(_table_path(handle))
+
+
+def read_table_rows(handle: str, offset: int, limit: int) -> Dict[str, Any]:
+    """读取已存储表格的一页：{columns, rows, offset, total}；表格不存在时抛出 FileNotFoundError"""
+    if not HANDLE_PATTERN.fullmatch(handle):
+        raise FileNotFoundError(handle)
+    path = _table_path(handle)
+    table = open_mapped_table(path)
+    # 读取时刷新访问时间（保留修改时间），作为保留期限和LRU淘汰的依据
+    os.utime(path, ns=(time.time_ns(), os.stat(path).st_mtime_ns))
+    return {
+        'columns': table.column_names,
+        'rows': to_json_rows(table.slice(offset, limit).to_pandas()),
+        'offset': offset,
+        'total': table.num_rows
+    }
+
+
+def table_handles(result: Any) -> List[str]:
+    """结构化结果中引用的所有表格句柄"""
+    if not isinstance(result, dict):
+        return []
+    return [item['handle'] for section in result.get('sections', [])
+            for item in section.get('content', []) if item.get('type') == 'table' and item.get('handle')]
+
+
+def evict(max_bytes: int = None, ttl: float = None):
+    """删除超过保留时间未被访问的表格，总大小仍超过上限时按最近访问时间淘汰"""
+    folder = Config.RESULT_STORE_FOLDER
+    max_bytes = max_bytes if max_bytes is not None else Config.RESULT_STORE_MAX_BYTES
+    ttl = ttl if ttl is not None else Config.RESULT_STORE_TTL
+    if not os.path.isdir(folder):
+        return
+    now = time.time()
+    entries = []
+    for name in os.listdir(folder):
+        if not name.endswith('.arrow'):
+            continue
+        path = os.path.join(folder, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        if now - stat.st_atime > ttl:
+            _remove(path)
+        else:
+            entries.append((stat.st_atime, stat.st_size, path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        _remove(path)
+        total -= size
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
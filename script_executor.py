@@ -1,10 +1,35 @@
-import os
-import tempfile
-import subprocess
 import traceback
 import re
-import json
-from typing import Tuple, Dict, Any, Union
+import threading
+from typing import Tuple, Dict, Any, List, Optional, Union, Callable
+from config import Config
+from executor_pool import ExecutorPool
+from result_cache import ResultCache
+import result_store
+
+
+def _format_bytes(size: int) -> str:
+    return f"{size / 1024 ** 2:.0f}MB" if size >= 1024 ** 2 else f"{size / 1024:.0f}KB"
+
+
+def limit_error(status: str, payload: Any = None) -> str:
+    """超出资源上限时的错误说明，作为重试的错误上下文，提示模型如何修正脚本"""
+    if status == 'timeout':
+        return (f"执行超时：脚本运行超过{Config.EXECUTOR_TIMEOUT}秒后被终止。"
+                "请改用向量化的 pandas/numpy 操作，避免 iterrows、apply(axis=1) 和逐行的 Python 循环，"
+                "并检查 merge 是否因连接键重复产生了笛卡尔积。")
+    if status == 'cpu_limit':
+        return (f"CPU时间超限：脚本占用CPU超过{Config.EXECUTOR_CPU_LIMIT}秒后被终止。"
+                "请改用向量化操作或 groupby 聚合替代逐行计算，减少重复的全表扫描。")
+    if status == 'memory_limit':
+        return (f"内存超限：脚本申请的内存超过{_format_bytes(Config.EXECUTOR_MEMORY_LIMIT)}上限。"
+                "请先筛选需要的行和列再计算，避免复制整个数据集、产生笛卡尔积的 merge 或构造过大的中间结果。")
+    if status == 'output_limit':
+        size = f"（{_format_bytes(payload)}）" if isinstance(payload, int) else ""
+        return (f"输出过大：分析结果{size}超过{_format_bytes(Config.EXECUTOR_MAX_OUTPUT_BYTES)}上限。"
+                "请只输出汇总统计或前若干行（例如 head(100)），不要把整个数据集加入结果表格。")
+    return f"执行脚本时出错:\n{payload}"
+
 
 class ScriptExecutor:
     @staticmethod
@@ -26,143 +51,86 @@ class ScriptExecutor:
         return code.strip()
 
     @staticmethod
-    def execute(script: str, excel_path: str) -> Tuple[Union[Dict[str, Any], str], bool]:
-        """执行生成的脚本并返回结果和执行状态"""
+    def execute(script: str, excel_path: str, cancel_event: threading.Event = None,
+                on_section: Callable[[Dict[str, Any]], None] = None,
+                sheets: Dict[str, str] = None,
+                timing: Dict[str, float] = None) -> Tuple[Union[Dict[str, Any], str], bool]:
+        """
+        在预热的工作进程中执行生成的脚本并返回结果和执行状态，on_section 在每个分析部分完成时回调。
+        sheets 为多工作表分析时 {工作表名: 缓存数据集路径}，脚本中以 sheets["名称"] 引用。
+        提供 timing 时写入工作进程内测得的耗时（script_run 为脚本运行时间），命中结果缓存时不写入。
+        相同脚本在同一数据集上的结构化结果直接从结果缓存返回，不再启动执行。
+        """
+        cache_key = ResultCache.get_instance().make_key(script, excel_path, sheets)
+        cached = ScriptExecutor._cached_result(cache_key)
+        if cached is not None:
+            if on_section is not None:
+                for section in cached['sections']:
+                    on_section(section)
+            return cached, True
+        
         try:
-            # 创建一个临时文件来存储脚本
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                full_script = f"""
-import pandas as pd
-import numpy as np
-from typing import Dict, List, Any
-import sys
-import traceback
-import json
-import os
-
-class AnalysisOutput:
-    def __init__(self):
-        self.sections = []
-        self.current_section = None
-    
-    def start_section(self, title: str):
-        if self.current_section:
-            self.sections.append(self.current_section)
-        self.current_section = {{"title": title, "content": [], "data": {{}}, "charts": []}}
-    
-    def add_text(self, text: str):
-        if self.current_section:
-            self.current_section["content"].append({{"type": "text", "text": text}})
-    
-    def add_table(self, df: pd.DataFrame, description: str = ""):
-        if self.current_section:
-            self.current_section["content"].append({{
-                "type": "table",
-                "data": df.to_dict(orient="records"),
-                "description": description
-            }})
-    
-    def add_stat(self, name: str, value: Any):
-        if self.current_section:
-            # 确保值是JSON可序列化的
-            if isinstance(value, dict) or isinstance(value, list):
-                self.current_section["data"][name] = value
-            else:
-                self.current_section["data"][name] = str(value)
-    
-    def end_section(self):
-        if self.current_section:
-            self.sections.append(self.current_section)
-            self.current_section = None
-    
-    def get_output(self) -> dict:
-        if self.current_section:
-            self.end_section()
-        return {{"sections": self.sections}}
-
-# 创建全局输出对象
-output = AnalysisOutput()
-orig_print = print
-
-def print(*args, **kwargs):
-    text = " ".join(str(arg) for arg in args)
-    output.add_text(text)
-    orig_print(*args, **kwargs)
+            status, payload, stdout = ExecutorPool.get_instance().run(script, excel_path, cancel_event, on_section, sheets,
+                                                                      timing)
+            return ScriptExecutor._finish(status, payload, stdout, cache_key)
+        except Exception as e:
+            return f"执行脚本时发生错误:\n{traceback.format_exc()}", False
 
-{script}
+    @staticmethod
+    def _cached_result(cache_key: str) -> Optional[Dict[str, Any]]:
+        result_cache = ResultCache.get_instance()
+        cached = result_cache.get(cache_key)
+        # 结果引用的大表已被结果存储淘汰时重新执行
+        if cached is not None and not all(result_store.table_exists(h) for h in result_store.table_handles(cached)):
+            result_cache.invalidate(cache_key)
+            cached = None
+        return cached
 
-def main():
-    try:
-        # 根据文件扩展名选择读取方式
-        file_ext = os.path.splitext(r'{excel_path}')[1].lower()
-        if file_ext == '.csv':
-            df = pd.read_csv(r'{excel_path}')
-        else:
-            df = pd.read_excel(r'{excel_path}')
-        df.columns = df.columns.astype(str)
-        
-        # 执行分析
-        analyze_data(df)
+    @staticmethod
+    def _finish(status: str, payload: Any, stdout: str, cache_key: str) -> Tuple[Union[Dict[str, Any], str], bool]:
+        """将工作进程返回的执行状态转换为 (结果或错误信息, 是否成功)，成功的结构化结果写入结果缓存"""
+        if status == 'cancelled':
+            return payload, False
+        if status != 'ok':
+            return limit_error(status, payload), False
         
-        # 输出结构化结果
-        result = output.get_output()
-        print("\\n=== ANALYSIS_RESULT_JSON_START ===")
-        print(json.dumps(result))
-        print("=== ANALYSIS_RESULT_JSON_END ===")
+        # 结构化结果在工作进程中产生时已保证可序列化
+        if isinstance(payload, dict) and 'sections' in payload:
+            ResultCache.get_instance().set(cache_key, payload)
+            if result_store.table_handles(payload):
+                result_store.evict()
+            return payload, True
         
-    except Exception as e:
-        print(f"执行出错: {{str(e)}}", file=sys.stderr)
-        print("\\n详细错误信息:", file=sys.stderr)
-        traceback.print_exc(file=sys.stderr)
-        sys.exit(1)
+        # 如果无法提取结构化结果，返回原始输出
+        output = stdout if stdout.strip() else "执行成功但没有输出"
+        return output, True
 
-if __name__ == '__main__':
-    main()
-"""
-                f.write(full_script)
-                temp_path = f.name
-            
-            # 执行脚本并捕获输出
-            result = subprocess.run(['python', temp_path], 
-                                 capture_output=True, 
-                                 text=True)
-            
-            # 删除临时文件
-            os.unlink(temp_path)
-            
-            if result.returncode != 0:
-                return f"执行脚本时出错:\n{result.stderr}", False
-            
-            # 尝试从输出中提取JSON结果
+    @staticmethod
+    def execute_batch(scripts: List[str], excel_path: str, cancel_event: threading.Event = None,
+                      sheets: Dict[str, str] = None) -> List[Tuple[Union[Dict[str, Any], str], bool]]:
+        """
+        批量执行多个脚本，返回与 scripts 一一对应的 (结果或错误信息, 是否成功)。
+        命中结果缓存的脚本直接返回，其余脚本在同一个工作进程中执行，数据集只加载一次。
+        """
+        result_cache = ResultCache.get_instance()
+        keys = [result_cache.make_key(script, excel_path, sheets) for script in scripts]
+        results: List[Optional[Tuple[Union[Dict[str, Any], str], bool]]] = [None] * len(scripts)
+        pending = []
+        for index, key in enumerate(keys):
+            cached = ScriptExecutor._cached_result(key)
+            if cached is not None:
+                results[index] = (cached, True)
+            else:
+                pending.append(index)
+        
+        if pending:
             try:
-                output = result.stdout
-                json_start = output.find("=== ANALYSIS_RESULT_JSON_START ===")
-                json_end = output.find("=== ANALYSIS_RESULT_JSON_END ===")
-                
-                if json_start != -1 and json_end != -1:
-                    json_str = output[json_start + len("=== ANALYSIS_RESULT_JSON_START ==="):json_end].strip()
-                    structured_result = json.loads(json_str)
-                    
-                    # 确保所有值都是JSON可序列化的
-                    if 'sections' in structured_result:
-                        for section in structured_result['sections']:
-                            if 'data' in section and isinstance(section['data'], dict):
-                                for key, value in list(section['data'].items()):
-                                    # 确保数据是可序列化的
-                                    try:
-                                        json.dumps({key: value})
-                                    except:
-                                        # 如果不能序列化，转换为字符串
-                                        section['data'][key] = str(value)
-                    
-                    return structured_result, True
+                items = ExecutorPool.get_instance().run_batch([scripts[i] for i in pending], excel_path,
+                                                              cancel_event, sheets)
+                for index, (status, payload, stdout) in zip(pending, items):
+                    results[index] = ScriptExecutor._finish(status, payload, stdout, keys[index])
             except Exception as e:
-                print(f"解析JSON结果失败: {str(e)}")
-                traceback.print_exc()
-            
-            # 如果无法提取结构化结果，返回原始输出
-            output = result.stdout if result.stdout.strip() else "执行成功但没有输出"
-            return output, True
-            
-        except Exception as e:
-            return f"执行脚本时发生错误:\n{traceback.format_exc()}", False
+                error = f"执行脚本时发生错误:\n{traceback.format_exc()}"
+                for index in pending:
+                    results[index] = (error, False)
+        return results
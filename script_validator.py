@@ -0,0 +1,272 @@
+import ast
+import difflib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from config import Config
+
+# 可能以无法静态跟踪的方式改变列集合的 DataFrame 方法；脚本中出现时跳过列名检查
+_COLUMN_CHANGING_METHODS = {
+    'rename', 'set_axis', 'assign', 'merge', 'join', 'pivot', 'pivot_table', 'melt', 'stack', 'unstack',
+    'reset_index', 'add_prefix', 'add_suffix', 'insert', 'transpose', 'explode', 'get_dummies', 'concat',
+    'read_csv', 'read_excel', 'from_dict', 'from_records'
+}
+
+# 返回值与原 DataFrame 列相同的方法，df = df.xxx(...) 后仍可检查列名
+_COLUMN_PRESERVING_METHODS = {
+    'copy', 'dropna', 'fillna', 'sort_values', 'sort_index', 'query', 'head', 'tail', 'drop_duplicates', 'sample'
+}
+
+
+class _ScriptChecker(ast.NodeVisitor):
+    """遍历脚本语法树，收集禁止的导入和对数据集列的字面量引用"""
+
+    def __init__(self, df_name: str):
+        self.df_name = df_name
+        self.problems: List[str] = []
+        self.column_refs = []  # [(行号, 列名)]
+        self.created_columns: Set[str] = set()
+        self.columns_untrackable = False
+        self.forbidden = set(Config.SCRIPT_FORBIDDEN_MODULES)
+
+    def _check_module(self, module: Optional[str], lineno: int):
+        root = (module or '').split('.')[0]
+        if root in self.forbidden:
+            self.problems.append(f"第{lineno}行：不允许导入模块 '{module}'，分析脚本只能使用 pandas/numpy 等数据分析库")
+
+    def visit_Import(self, node: ast.Import):
+        for alias in node.names:
+            self._check_module(alias.name, node.lineno)
+        self.generic_visit(node)
+
+    def visit_ImportFrom(self, node: ast.ImportFrom):
+        self._check_module(node.module, node.lineno)
+        self.generic_visit(node)
+
+    def visit_Call(self, node: ast.Call):
+        func = node.func
+        if isinstance(func, ast.Name) and func.id == '__import__':
+            if node.args and isinstance(node.args[0], ast.Constant) and isinstance(node.args[0].value, str):
+                self._check_module(node.args[0].value, node.lineno)
+        if isinstance(func, ast.Attribute) and func.attr in _COLUMN_CHANGING_METHODS:
+            self.columns_untrackable = True
+        self.generic_visit(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        for target in node.targets:
+            # df.columns = [...] 或 df = 其他对象：无法再确定列集合
+            if isinstance(target, ast.Attribute) and target.attr == 'columns':
+                self.columns_untrackable = True
+            if isinstance(target, ast.Name) and target.id == self.df_name and not self._is_df_copy(node.value):
+                self.columns_untrackable = True
+        self.generic_visit(node)
+
+    def _is_df_copy(self, value: ast.AST) -> bool:
+        """df = df.copy()、df = df[条件]、df = df.dropna() 等写法不改变列集合"""
+        if isinstance(value, ast.Name):
+            return value.id == self.df_name
+        if isinstance(value, ast.Subscript):
+            return (isinstance(value.value, ast.Name) and value.value.id == self.df_name
+                    and not _string_literals(value.slice))
+        return (isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute)
+                and value.func.attr in _COLUMN_PRESERVING_METHODS and isinstance(value.func.value, ast.Name)
+                and value.func.value.id == self.df_name)
+
+    def visit_Subscript(self, node: ast.Subscript):
+        target = node.value
+        # df.loc[..., '列'] 中新建的列
+        if isinstance(target, ast.Attribute) and target.attr in ('loc', 'at'):
+            if isinstance(node.ctx, ast.Store) and isinstance(node.slice, ast.Tuple) and len(node.slice.elts) == 2:
+                self.created_columns.update(_string_literals(node.slice.elts[1]))
+        elif isinstance(target, ast.Name) and target.id == self.df_name:
+            names = _string_literals(node.slice)
+            if isinstance(node.ctx, ast.Store):
+                if not names:
+                    # 以变量为列名新建的列无法静态确定
+                    self.columns_untrackable = True
+                self.created_columns.update(names)
+            else:
+                self.column_refs.extend((node.lineno, name) for name in names)
+        self.generic_visit(node)
+
+
+def _string_literals(node: ast.AST) -> List[str]:
+    """提取 '列' 或 ['列1', '列2'] 形式的字符串字面量"""
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return [node.value]
+    if isinstance(node, (ast.List, ast.Tuple)):
+        if node.elts and all(isinstance(e, ast.Constant) and isinstance(e.value, str) for e in node.elts):
+            return [e.value for e in node.elts]
+    return []
+
+
+def _find_entry(tree: ast.Module) -> Optional[ast.FunctionDef]:
+    for node in tree.body:
+        if isinstance(node, ast.FunctionDef) and node.name == 'analyze_data':
+            return node
+    return None
+
+
+def validate_script(script: str, columns: Iterable[str] = None) -> Optional[str]:
+    """
+    在执行前对生成的脚本做静态预检，发现问题时返回可直接作为修正上下文的错误说明，否则返回None。
+    检查项：语法、顶层的 analyze_data(df) 定义、禁止导入的模块，
+    以及 df['列名'] 字面量引用的列是否存在（脚本可能以无法跟踪的方式改变列时跳过此项）。
+    """
+    try:
+        tree = ast.parse(script)
+    except SyntaxError as e:
+        line = (e.text or '').rstrip()
+        return f"脚本预检未通过：第{e.lineno}行存在语法错误：{e.msg}" + (f"\n  {line}" if line else "")
+
+    entry = _find_entry(tree)
+    if entry is None:
+        return "脚本预检未通过：未找到顶层函数 analyze_data(df) 的定义，脚本必须定义该函数"
+    params = entry.args.posonlyargs + entry.args.args
+    if not params:
+        return "脚本预检未通过：analyze_data 必须接收一个参数 df"
+
+    checker = _ScriptChecker(params[0].arg)
+    checker.visit(tree)
+    problems = list(checker.problems)
+
+    if columns is not None and not checker.columns_untrackable:
+        known = {str(col) for col in columns} | checker.created_columns
+        reported = set()
+        for lineno, name in checker.column_refs:
+            if name in known or name in reported:
+                continue
+            reported.add(name)
+            message = f"第{lineno}行：列 '{name}' 不存在"
+            similar = difflib.get_close_matches(name, [str(col) for col in columns], n=3, cutoff=0.5)
+            if similar:
+                message += "，相近的列：" + "、".join(f"'{col}'" for col in similar)
+            problems.append(message)
+
+    if problems:
+        return "脚本预检未通过：\n" + "\n".join(f"- {problem}" for problem in problems)
+    return None
+
+
+# 已知的低效写法：(标识, 说明)
+SLOW_PATTERNS = {
+    'iterrows': "使用 iterrows/itertuples 逐行遍历",
+    'apply_axis1': "使用 apply(axis=1) 逐行计算",
+    'row_loop': "使用 Python 循环按行或按索引遍历 DataFrame/Series",
+    'repeated_copy': "多次复制同一个 DataFrame，或在循环中复制（copy）",
+}
+
+# 结果为少量元素（列名、分组、唯一值等）而不是逐行数据的属性和方法，遍历它们不算逐行循环
+_NON_ROW_ACCESSORS = {
+    'columns', 'keys', 'dtypes', 'unique', 'value_counts', 'groupby', 'resample', 'nunique', 'describe',
+    'head', 'tail', 'nlargest', 'nsmallest', 'sample', 'drop_duplicates', 'sum', 'mean', 'median', 'count',
+    'min', 'max', 'std', 'agg', 'aggregate', 'pivot_table', 'crosstab', 'corr', 'items', 'iteritems'
+}
+
+
+def _chain(node: ast.AST) -> Tuple[Optional[str], List[str]]:
+    """沿属性访问、调用和下标向内展开表达式，返回 (根变量名, 途经的属性/方法名)"""
+    attrs = []
+    while True:
+        if isinstance(node, ast.Attribute):
+            attrs.append(node.attr)
+            node = node.value
+        elif isinstance(node, ast.Call):
+            node = node.func
+        elif isinstance(node, ast.Subscript):
+            node = node.value
+        elif isinstance(node, ast.Name):
+            return node.id, attrs
+        else:
+            return None, attrs
+
+
+class _SlowPatternFinder(ast.NodeVisitor):
+    """
+    按源码顺序遍历脚本，跟踪哪些变量保存着与数据集行数相同的 DataFrame/Series
+    （df 参数及由它筛选、变换得到的变量），只有遍历这些变量的行才算逐行循环。
+    """
+
+    def __init__(self, df_name: str):
+        self.frames = {df_name}
+        self.hits: List[Tuple[str, int]] = []
+        self.copies: Dict[str, List[int]] = {}
+        self.loop_depth = 0
+
+    def _is_frame(self, node: ast.AST) -> bool:
+        root, attrs = _chain(node)
+        return root in self.frames and not _NON_ROW_ACCESSORS.intersection(attrs)
+
+    def _is_row_iterable(self, node: ast.AST) -> bool:
+        """range(len(frame))、frame.index、frame.values、frame['列'].tolist() 等"""
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in ('range', 'enumerate', 'zip'):
+            args = node.args
+            if node.func.id == 'range':
+                args = [arg.args[0] for arg in args if isinstance(arg, ast.Call) and isinstance(arg.func, ast.Name)
+                        and arg.func.id == 'len' and arg.args]
+                return any(self._is_frame(arg) for arg in args)
+            return any(self._is_row_iterable(arg) or self._is_frame_iterable(arg) for arg in args)
+        return self._is_frame_iterable(node)
+
+    def _is_frame_iterable(self, node: ast.AST) -> bool:
+        if isinstance(node, ast.Attribute) and node.attr in ('index', 'values'):
+            return self._is_frame(node.value)
+        if isinstance(node, ast.Call) and isinstance(node.func, ast.Attribute) and \
+                node.func.attr in ('tolist', 'to_list', 'to_numpy'):
+            return self._is_frame(node.func.value)
+        # 直接遍历 Series 即逐个元素；直接遍历 DataFrame 得到的是列名，但无法静态区分，只认 df['列']
+        return isinstance(node, ast.Subscript) and self._is_frame(node)
+
+    def visit_Assign(self, node: ast.Assign):
+        self.visit(node.value)
+        derived = self._is_frame(node.value)
+        for target in node.targets:
+            if isinstance(target, ast.Name):
+                if derived:
+                    self.frames.add(target.id)
+                else:
+                    self.frames.discard(target.id)
+
+    def visit_Call(self, node: ast.Call):
+        if isinstance(node.func, ast.Attribute):
+            attr = node.func.attr
+            if attr in ('iterrows', 'itertuples'):
+                self.hits.append(('iterrows', node.lineno))
+            elif attr == 'apply' and any(
+                    kw.arg == 'axis' and isinstance(kw.value, ast.Constant) and kw.value.value in (1, 'columns')
+                    for kw in node.keywords):
+                self.hits.append(('apply_axis1', node.lineno))
+            elif attr == 'copy' and isinstance(node.func.value, ast.Name) and node.func.value.id in self.frames:
+                # 只统计整表复制；df[条件].copy() 等对子集的复制是推荐写法
+                name = node.func.value.id
+                self.copies.setdefault(name, []).append(node.lineno)
+                if self.loop_depth:
+                    self.hits.append(('repeated_copy', node.lineno))
+                elif len(self.copies[name]) == 2:
+                    self.hits.append(('repeated_copy', node.lineno))
+        self.generic_visit(node)
+
+    def _visit_loop(self, node: ast.AST):
+        self.loop_depth += 1
+        self.generic_visit(node)
+        self.loop_depth -= 1
+
+    def visit_For(self, node: ast.For):
+        if self._is_row_iterable(node.iter):
+            self.hits.append(('row_loop', node.lineno))
+        self._visit_loop(node)
+
+    visit_AsyncFor = visit_For
+    visit_While = _visit_loop
+
+
+def find_slow_patterns(script: str) -> List[Tuple[str, int]]:
+    """检测脚本中已知的低效 pandas 写法，返回 [(标识, 行号)]；脚本无法解析时返回空列表"""
+    try:
+        tree = ast.parse(script)
+    except SyntaxError:
+        return []
+
+    entry = _find_entry(tree)
+    params = (entry.args.posonlyargs + entry.args.args) if entry is not None else []
+    finder = _SlowPatternFinder(params[0].arg if params else 'df')
+    finder.visit(tree)
+    return sorted(set(finder.hits), key=lambda hit: (hit[1], hit[0]))
@@ -0,0 +1,289 @@
+import os
+import re
+import itertools
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+from config import Config
+from dataset_cache import to_json_rows, to_json_value
+from result_cache import ResultCache
+import result_store
+try:
+    import duckdb
+except ImportError:  # 可选依赖：未安装时只能使用 pandas 引擎
+    duckdb = None
+
+# 数据集在SQL中的表名
+TABLE_NAME = 'data'
+
+# 注释指令：-- section: 标题 / -- table: 描述 / -- stat: 名称 / -- text: 文本
+_DIRECTIVE = re.compile(r'^\s*--\s*(section|table|stat|text)\s*[:：]\s*(.*?)\s*$', re.IGNORECASE)
+
+# 同时运行的SQL查询数上限，首次使用时按配置创建
+_slots = None
+_slots_lock = threading.Lock()
+
+
+def available() -> bool:
+    return duckdb is not None
+
+
+def clean_sql(code: str) -> str:
+    """清理模型输出中的代码块标记和说明文本"""
+    match = re.search(r'```(?:sql)?[^\n]*\n(.*?)```', code, re.DOTALL | re.IGNORECASE)
+    if match:
+        code = match.group(1)
+    return code.strip() + '\n'
+
+
+def parse_sql_script(script: str) -> List[Tuple[str, str, Optional[str]]]:
+    """
+    按注释指令将SQL脚本拆分为 [(类型, 参数, SQL)]。
+    类型为 section/text 时 SQL 为 None；未加指令的查询按表格输出。
+    """
+    operations = []
+    pending = ('table', '')
+    buffer: List[str] = []
+
+    def flush():
+        nonlocal pending
+        sql = '\n'.join(buffer).strip().rstrip(';').strip()
+        buffer.clear()
+        if sql:
+            operations.append((pending[0], pending[1], sql))
+            pending = ('table', '')
+
+    for line in script.splitlines():
+        match = _DIRECTIVE.match(line)
+        if match:
+            kind, argument = match.group(1).lower(), match.group(2)
+            if kind in ('section', 'text'):
+                flush()
+                operations.append((kind, argument, None))
+            else:
+                flush()
+                pending = (kind, argument)
+            continue
+        buffer.append(line)
+        if line.rstrip().endswith(';'):
+            flush()
+    flush()
+    return operations
+
+
+def validate_sql(script: str) -> Optional[str]:
+    """执行前检查：至少包含一条查询，且每条都能被解析为只读的 SELECT 语句"""
+    if duckdb is None:
+        return "SQL引擎不可用：未安装 duckdb"
+    queries = [sql for _, _, sql in parse_sql_script(script) if sql]
+    if not queries:
+        return "SQL预检未通过：脚本中没有查询语句"
+    problems = []
+    for index, sql in enumerate(queries, 1):
+        try:
+            statements = duckdb.extract_statements(sql)
+        except duckdb.Error as e:
+            problems.append(f"第{index}条查询存在语法错误：{str(e)}")
+            continue
+        if len(statements) != 1:
+            problems.append(f"第{index}条查询包含多条语句，每条查询需以分号结尾")
+        elif statements[0].type != duckdb.StatementType.SELECT:
+            problems.append(f"第{index}条查询不是 SELECT 查询，只允许读取数据")
+    if problems:
+        return "SQL预检未通过：\n" + "\n".join(f"- {problem}" for problem in problems)
+    return None
+
+
+def _register_source(con, name: str, path: str):
+    """Arrow 缓存以数据集方式按需扫描，pickle 缓存整体读入"""
+    if path.endswith('.arrow'):
+        con.register(name, pads.dataset(path, format='ipc'))
+    else:
+        con.register(name, pd.read_pickle(path))
+
+
+def _connect(data_path: str, sheets: Dict[str, str] = None):
+    """
+    创建只读的 DuckDB 连接并将缓存数据集注册为表 data，多工作表分析时每个工作表另以其名称注册为表。
+    配合内存上限和临时目录，超出内存的中间结果写入磁盘。
+    """
+    temp_dir = os.path.abspath(Config.SQL_ENGINE_TEMP_FOLDER)
+    os.makedirs(temp_dir, exist_ok=True)
+    con = duckdb.connect(config={
+        'threads': Config.SQL_ENGINE_THREADS or os.cpu_count() or 1,
+        'memory_limit': Config.SQL_ENGINE_MEMORY_LIMIT,
+        'temp_directory': temp_dir
+    })
+    for name, path in (sheets or {}).items():
+        if name != TABLE_NAME:
+            _register_source(con, name, path)
+    _register_source(con, TABLE_NAME, data_path)
+    # 禁止查询读写其他文件或修改这些设置
+    con.execute("SET enable_external_access = false")
+    con.execute("SET lock_configuration = true")
+    return con
+
+
+def _watch(con, done: threading.Event, cancel_event: Optional[threading.Event], state: Dict[str, str]):
+    """超时或取消时中断正在执行的查询"""
+    timeout = Config.EXECUTOR_TIMEOUT or None
+    deadline = threading.Event()
+    timer = threading.Timer(timeout, deadline.set) if timeout else None
+    if timer is not None:
+        timer.daemon = True
+        timer.start()
+    try:
+        while not done.wait(0.1):
+            if cancel_event is not None and cancel_event.is_set():
+                state['interrupted'] = 'cancelled'
+            elif deadline.is_set():
+                state['interrupted'] = 'timeout'
+            else:
+                continue
+            con.interrupt()
+            return
+    finally:
+        if timer is not None:
+            timer.cancel()
+
+
+def _table_item(reader: pa.RecordBatchReader, description: str) -> Dict[str, Any]:
+    """查询结果转为表格内容；超过 RESULT_TABLE_MAX_ROWS 行时逐批写入结果存储，只保留首页"""
+    max_rows = Config.RESULT_TABLE_MAX_ROWS
+    head = []
+    rows = 0
+    for batch in reader:
+        head.append(batch)
+        rows += batch.num_rows
+        if max_rows and rows > max_rows:
+            break
+    table = pa.Table.from_batches(head, schema=reader.schema)
+    item = {"type": "table", "columns": [str(name) for name in reader.schema.names], "description": description}
+    if max_rows and rows > max_rows:
+        item["handle"], item["row_count"] = result_store.store_batches(reader.schema, itertools.chain(head, reader))
+        table = table.slice(0, Config.RESULT_TABLE_PAGE_ROWS)
+    item["rows"] = to_json_rows(table.to_pandas())
+    return item
+
+
+def _stat_value(reader: pa.RecordBatchReader) -> Any:
+    """统计查询取第一行：单列时为该值，多列时为 {列名: 值}"""
+    batch = next((batch for batch in reader if batch.num_rows), None)
+    if batch is None:
+        return "无数据"
+    row = {name: to_json_value(values[0]) for name, values in batch.slice(0, 1).to_pydict().items()}
+    if len(row) == 1:
+        return str(next(iter(row.values())))
+    return row
+
+
+class _Interrupted(Exception):
+    """查询因超时或取消被中断"""
+
+
+class _QueryError(Exception):
+    def __init__(self, index: int, sql: str, error: Exception):
+        super().__init__(f"第{index}条查询执行出错：{str(error)}\n{sql}")
+
+
+def _run(script: str, data_path: str, cancel_event: Optional[threading.Event],
+         on_section: Optional[Callable[[Dict[str, Any]], None]], sheets: Dict[str, str] = None) -> Dict[str, Any]:
+    sections = []
+    current = None
+
+    def finish():
+        nonlocal current
+        if current is not None:
+            sections.append(current)
+            if on_section is not None:
+                on_section(current)
+            current = None
+
+    con = _connect(data_path, sheets)
+    done = threading.Event()
+    state: Dict[str, str] = {}
+    watcher = threading.Thread(target=_watch, args=(con, done, cancel_event, state), daemon=True)
+    watcher.start()
+    try:
+        index = 0
+        for kind, argument, sql in parse_sql_script(script):
+            if kind == 'section':
+                finish()
+                current = {"title": argument, "content": [], "data": {}, "charts": []}
+                continue
+            if current is None:
+                current = {"title": "分析结果", "content": [], "data": {}, "charts": []}
+            if kind == 'text':
+                current["content"].append({"type": "text", "text": argument})
+                continue
+            index += 1
+            try:
+                reader = con.execute(sql).fetch_record_batch(Config.SQL_ENGINE_BATCH_ROWS)
+                if kind == 'stat':
+                    current["data"][argument or f"查询{index}"] = _stat_value(reader)
+                else:
+                    current["content"].append(_table_item(reader, argument))
+            except duckdb.Error as e:
+                if state.get('interrupted'):
+                    raise _Interrupted(state['interrupted'])
+                raise _QueryError(index, sql, e)
+        finish()
+        return {"sections": sections}
+    finally:
+        done.set()
+        con.close()
+
+
+def _acquire_slot(cancel_event: Optional[threading.Event]) -> bool:
+    global _slots
+    with _slots_lock:
+        if _slots is None:
+            _slots = threading.BoundedSemaphore(Config.SQL_ENGINE_MAX_CONCURRENT or 1)
+    while not _slots.acquire(timeout=0.1):
+        if cancel_event is not None and cancel_event.is_set():
+            return False
+    return True
+
+
+def execute(script: str, data_path: str, cancel_event: threading.Event = None,
+            on_section: Callable[[Dict[str, Any]], None] = None,
+            sheets: Dict[str, str] = None) -> Tuple[Union[Dict[str, Any], str], bool]:
+    """
+    在嵌入式 DuckDB 中执行生成的SQL脚本，结果按注释指令映射为与 AnalysisOutput 相同的 sections 结构。
+    sheets 为多工作表分析时 {工作表名: 缓存数据集路径}，各工作表可按名称作为表查询。
+    返回 (结果或错误信息, 是否成功)；相同脚本在同一数据集上的结果从结果缓存返回。
+    """
+    if duckdb is None:
+        return "SQL引擎不可用：未安装 duckdb", False
+
+    result_cache = ResultCache.get_instance()
+    cache_key = result_cache.make_key(script, data_path, sheets)
+    cached = result_cache.get(cache_key)
+    if cached is not None and all(result_store.table_exists(h) for h in result_store.table_handles(cached)):
+        if on_section is not None:
+            for section in cached['sections']:
+                on_section(section)
+        return cached, True
+
+    if not _acquire_slot(cancel_event):
+        return "分析已取消", False
+    try:
+        result = _run(script, data_path, cancel_event, on_section, sheets)
+    except _Interrupted as e:
+        if str(e) == 'cancelled':
+            return "分析已取消", False
+        return (f"执行超时：SQL运行超过{Config.EXECUTOR_TIMEOUT}秒后被终止。"
+                "请先用 WHERE 过滤再聚合，检查 JOIN 条件是否产生了大量重复行，并用 LIMIT 限制明细输出。"), False
+    except _QueryError as e:
+        return f"执行SQL时出错:\n{str(e)}", False
+    except Exception as e:
+        return f"执行SQL时发生错误: {str(e)}", False
+    finally:
+        _slots.release()
+
+    result_cache.set(cache_key, result)
+    if result_store.table_handles(result):
+        result_store.evict()
+    return result, True
@@ -1,25 +1,94 @@
 let currentFilename = null;
 let apiConfig = {};
 let isAnalyzing = false;
+let currentJobId = null;
+const JOB_POLL_INTERVAL = 1000;
 
-function togglePreview(element) {
-    const container = element.previousElementSibling;
-    const previewShort = container.querySelector('.preview-short');
-    const previewFull = container.querySelector('.preview-full');
-    const isExpanded = container.classList.toggle('expanded');
+// 数据预览：虚拟滚动表格，只渲染可见行，滚动时按页从服务器读取
+const PREVIEW_ROW_HEIGHT = 32;
+const PREVIEW_PAGE_SIZE = 100;
+const PREVIEW_OVERSCAN = 10;
+// 浏览器对元素高度有上限（Chrome 约3350万像素，Firefox 更低），超出时压缩滚动区域并按比例换算行位置
+const PREVIEW_MAX_SCROLL_HEIGHT = 8000000;
+let preview = null;
+
+function initPreview(datasetId, columns, total) {
+    preview = { datasetId, columns, total, pages: new Map(), pending: new Set() };
     
-    if (isExpanded) {
-        previewShort.style.display = 'none';
-        previewFull.style.display = 'block';
-        element.textContent = '点击收起';
-    } else {
-        previewFull.style.display = 'none';
-        previewShort.style.display = 'block';
-        element.textContent = '点击展开';
-        container.scrollTop = 0;
+    const headRow = document.createElement('tr');
+    columns.forEach(col => {
+        const th = document.createElement('th');
+        th.textContent = col;
+        headRow.appendChild(th);
+    });
+    const thead = document.querySelector('#previewTable thead');
+    thead.innerHTML = '';
+    thead.appendChild(headRow);
+    
+    const contentHeight = (total + 1) * PREVIEW_ROW_HEIGHT;
+    preview.contentHeight = contentHeight;
+    preview.spacerHeight = Math.min(contentHeight, PREVIEW_MAX_SCROLL_HEIGHT);
+    document.getElementById('previewSpacer').style.height = `${preview.spacerHeight}px`;
+    document.getElementById('previewViewport').scrollTop = 0;
+    renderPreview();
+}
+
+async function fetchPreviewPage(page) {
+    const state = preview;
+    if (state.pages.has(page) || state.pending.has(page)) return;
+    state.pending.add(page);
+    try {
+        const response = await fetch(`/datasets/${state.datasetId}/rows?offset=${page * PREVIEW_PAGE_SIZE}&limit=${PREVIEW_PAGE_SIZE}`);
+        const data = await response.json();
+        if (data.error) throw new Error(data.error);
+        state.pages.set(page, data.rows);
+    } catch (error) {
+        console.error('读取预览数据失败:', error);
+    } finally {
+        state.pending.delete(page);
+    }
+    // 上传了新文件时丢弃旧数据集的结果
+    if (state === preview) renderPreview();
+}
+
+function renderPreview() {
+    if (!preview) return;
+    const viewport = document.getElementById('previewViewport');
+    // 滚动区域被压缩时，把实际滚动位置按比例换算为完整内容中的位置
+    const scrollRange = preview.spacerHeight - viewport.clientHeight;
+    const contentRange = preview.contentHeight - viewport.clientHeight;
+    const scale = scrollRange > 0 && contentRange > scrollRange ? contentRange / scrollRange : 1;
+    const offset = viewport.scrollTop * scale;
+    const first = Math.floor(offset / PREVIEW_ROW_HEIGHT);
+    const visible = Math.ceil(viewport.clientHeight / PREVIEW_ROW_HEIGHT);
+    const start = Math.max(0, first - PREVIEW_OVERSCAN);
+    const end = Math.min(preview.total, first + visible + PREVIEW_OVERSCAN);
+    
+    const tbody = document.createElement('tbody');
+    for (let i = start; i < end; i++) {
+        const page = Math.floor(i / PREVIEW_PAGE_SIZE);
+        const rows = preview.pages.get(page);
+        if (!rows) fetchPreviewPage(page);
+        const row = rows ? rows[i % PREVIEW_PAGE_SIZE] : null;
+        
+        const tr = document.createElement('tr');
+        preview.columns.forEach((_, j) => {
+            const td = document.createElement('td');
+            td.textContent = row ? (row[j] === null ? '' : row[j]) : '…';
+            tr.appendChild(td);
+        });
+        tbody.appendChild(tr);
     }
+    
+    const table = document.getElementById('previewTable');
+    table.replaceChild(tbody, table.querySelector('tbody'));
+    table.style.transform = `translateY(${viewport.scrollTop + start * PREVIEW_ROW_HEIGHT - offset}px)`;
 }
 
+document.getElementById('previewViewport').addEventListener('scroll', () => {
+    requestAnimationFrame(renderPreview);
+});
+
 // API配置相关
 document.getElementById('apiType').addEventListener('change', function() {
     const apiBaseGroup = document.getElementById('apiBaseGroup');
@@ -165,19 +234,9 @@ document.getElementById('fileInput').onchange = async (e) => {
         document.getElementById('fileOverview').style.display = 'block';
         document.getElementById('rowCount').textContent = data.analysis.row_count;
         document.getElementById('columnsList').innerHTML = data.analysis.columns.join(', ');
-        document.getElementById('previewData').innerHTML = data.analysis.preview;
-        
-        // 初始化预览状态
-        const previewContainer = document.querySelector('.preview-container');
-        const previewToggle = document.querySelector('.preview-toggle');
-        const previewShort = previewContainer.querySelector('.preview-short');
-        const previewFull = previewContainer.querySelector('.preview-full');
-        
-        // 重置预览状态
-        previewContainer.classList.remove('expanded');
-        previewShort.style.display = 'block';
-        previewFull.style.display = 'none';
-        previewToggle.textContent = '点击展开';
+        initPreview(data.analysis.dataset_id, data.analysis.columns, data.analysis.row_count);
+        renderSheetOptions(data.analysis.sheets || []);
+        renderMemoryInfo(data.analysis.memory);
         
         document.getElementById('analysisResults').style.display = 'block';
     } catch (error) {
@@ -186,6 +245,64 @@ document.getElementById('fileInput').onchange = async (e) => {
     }
 };
 
+function formatBytes(bytes) {
+    const units = ['B', 'KB', 'MB', 'GB'];
+    let index = 0;
+    while (bytes >= 1024 && index < units.length - 1) {
+        bytes /= 1024;
+        index++;
+    }
+    return `${bytes.toFixed(index ? 1 : 0)} ${units[index]}`;
+}
+
+// 导入时列类型压缩前后的内存
+function renderMemoryInfo(memory) {
+    const container = document.getElementById('memoryInfo');
+    container.style.display = memory ? 'block' : 'none';
+    if (!memory) {
+        return;
+    }
+    const changed = Object.keys(memory.columns).length;
+    document.getElementById('memoryUsage').textContent = changed
+        ? `${formatBytes(memory.memory_before)} → ${formatBytes(memory.memory_after)}（已压缩 ${changed} 列的类型）`
+        : formatBytes(memory.memory_after);
+}
+
+// 多工作表的工作簿：列出工作表供选择，默认只分析第一个
+function renderSheetOptions(sheets) {
+    const group = document.getElementById('sheetsGroup');
+    const list = document.getElementById('sheetsList');
+    list.innerHTML = '';
+    group.style.display = sheets.length > 1 ? 'block' : 'none';
+    if (sheets.length <= 1) {
+        return;
+    }
+    sheets.forEach((sheet, index) => {
+        const wrapper = document.createElement('div');
+        wrapper.className = 'form-check';
+        const input = document.createElement('input');
+        input.className = 'form-check-input sheet-option';
+        input.type = 'checkbox';
+        input.id = `sheetOption${index}`;
+        input.value = sheet.name;
+        input.checked = index === 0;
+        const label = document.createElement('label');
+        label.className = 'form-check-label';
+        label.htmlFor = input.id;
+        const size = sheet.rows != null ? `（${sheet.rows}行 × ${sheet.columns}列）` : '';
+        label.textContent = sheet.name + size;
+        wrapper.appendChild(input);
+        wrapper.appendChild(label);
+        list.appendChild(wrapper);
+    });
+}
+
+// 选中的工作表，第一个作为脚本中的 df；未显示选择时返回 undefined
+function selectedSheets() {
+    const options = document.querySelectorAll('#sheetsList .sheet-option:checked');
+    return options.length ? Array.from(options, option => option.value) : undefined;
+}
+
 document.getElementById('analyzeBtn').onclick = async () => {
     if (!apiConfig.key) {
         alert('请先配置API');
@@ -208,7 +325,7 @@ document.getElementById('retryBtn').onclick = async () => {
     await performAnalysis(currentRetries + 1);
 };
 
-async function performAnalysis(retryCount = 0) {
+async function performAnalysis(retryCount = 0, regenerate = false) {
     if (isAnalyzing) return;
     isAnalyzing = true;
 
@@ -233,7 +350,8 @@ async function performAnalysis(retryCount = 0) {
         document.getElementById('generatedScript').textContent = '正在生成分析脚本...';
         document.getElementById('analysisOutput').textContent = '';
 
-        const response = await fetch('/analyze', {
+        // 提交异步分析任务，随后轮询任务状态
+        const response = await fetch('/jobs', {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -243,11 +361,25 @@ async function performAnalysis(retryCount = 0) {
                 query: document.getElementById('queryInput').value.trim(),
                 model: selectedModel,
                 api_config: apiConfig,
-                retry_count: retryCount
+                retry_count: retryCount,
+                regenerate: regenerate,
+                speculative: document.getElementById('speculativeMode').checked || undefined,
+                sheets: selectedSheets(),
+                stream: true
             })
         });
         
-        const data = await response.json();
+        const submitData = await response.json();
+        if (submitData.error) {
+            handleAnalysisResponse({ error: submitData.error, success: false, retry_count: retryCount });
+            return;
+        }
+        
+        currentJobId = submitData.job_id;
+        document.getElementById('cancelBtn').disabled = false;
+        const data = window.EventSource
+            ? await streamJob(currentJobId, retryCount)
+            : await waitForJob(currentJobId, retryCount);
         handleAnalysisResponse(data);
     } catch (error) {
         handleAnalysisError(error);
@@ -256,10 +388,99 @@ async function performAnalysis(retryCount = 0) {
         document.getElementById('retryBtn').disabled = false;
         document.getElementById('regenerateBtn').disabled = false;
         document.getElementById('progressSection').style.display = 'none';
+        currentJobId = null;
         isAnalyzing = false;
     }
 }
 
+function sleep(ms) {
+    return new Promise(resolve => setTimeout(resolve, ms));
+}
+
+// 将结束的任务转换为与 /analyze 相同格式的结果
+function jobToResponse(job, retryCount) {
+    if (job.status === 'cancelled') {
+        return { error: '分析已取消', success: false, retry_count: retryCount, can_retry: true };
+    }
+    return job.result || { error: job.error || '分析失败', success: false, retry_count: retryCount };
+}
+
+// 轮询任务直到结束（浏览器不支持SSE时使用）
+async function waitForJob(jobId, retryCount) {
+    while (true) {
+        await sleep(JOB_POLL_INTERVAL);
+        const response = await fetch(`/jobs/${jobId}`);
+        const job = await response.json();
+        
+        if (job.error && !job.status) {
+            return { error: job.error, success: false, retry_count: retryCount };
+        }
+        if (job.attempt) {
+            document.getElementById('currentAttempt').textContent = job.attempt;
+        }
+        if (job.max_attempts) {
+            document.getElementById('maxAttempts').textContent = job.max_attempts;
+        }
+        
+        if (['succeeded', 'failed', 'cancelled'].includes(job.status)) {
+            return jobToResponse(job, retryCount);
+        }
+    }
+}
+
+// 通过SSE接收任务事件，逐步渲染模型输出和已完成的分析部分
+function streamJob(jobId, retryCount) {
+    return new Promise(resolve => {
+        const source = new EventSource(`/jobs/${jobId}/events`);
+        const scriptElement = document.getElementById('generatedScript');
+        const outputElement = document.getElementById('analysisOutput');
+        
+        source.addEventListener('generating', e => {
+            const info = JSON.parse(e.data);
+            document.getElementById('currentAttempt').textContent = info.attempt;
+            document.getElementById('maxAttempts').textContent = info.max_attempts;
+            scriptElement.textContent = '';
+        });
+        
+        source.addEventListener('token', e => {
+            scriptElement.textContent += JSON.parse(e.data).text;
+        });
+        
+        source.addEventListener('executing', e => {
+            const info = JSON.parse(e.data);
+            document.getElementById('currentAttempt').textContent = info.attempt;
+            scriptElement.textContent = info.script;
+            outputElement.innerHTML = '';
+        });
+        
+        source.addEventListener('section', e => {
+            outputElement.appendChild(renderSection(JSON.parse(e.data).section));
+        });
+        
+        source.addEventListener('done', e => {
+            source.close();
+            resolve(jobToResponse(JSON.parse(e.data), retryCount));
+        });
+        
+        // 连接中断时浏览器会自动重连并续传；连接被关闭时改为轮询
+        source.onerror = () => {
+            if (source.readyState === EventSource.CLOSED) {
+                resolve(waitForJob(jobId, retryCount));
+            }
+        };
+    });
+}
+
+document.getElementById('cancelBtn').onclick = async () => {
+    if (!currentJobId) return;
+    document.getElementById('cancelBtn').disabled = true;
+    try {
+        await fetch(`/jobs/${currentJobId}/cancel`, { method: 'POST' });
+    } catch (error) {
+        console.error('取消任务失败:', error);
+    }
+};
+
 // 初始化复制按钮功能
 document.querySelectorAll('.copy-btn').forEach(button => {
     button.addEventListener('click', function() {
@@ -279,6 +500,158 @@ document.querySelectorAll('.copy-btn').forEach(button => {
     });
 });
 
+// 渲染单个分析部分（流式推送和完整结果共用）
+function renderSection(section) {
+    const sectionDiv = document.createElement('div');
+    sectionDiv.className = 'mb-4';
+    
+    // 添加标题
+    const title = document.createElement('h5');
+    title.className = 'mb-3';
+    title.textContent = section.title;
+    sectionDiv.appendChild(title);
+    
+    // 添加统计数据
+    if (Object.keys(section.data).length > 0) {
+        const statsDiv = document.createElement('div');
+        statsDiv.className = 'stats-grid mb-3';
+        
+        Object.entries(section.data).forEach(([key, value]) => {
+            const statBox = document.createElement('div');
+            statBox.className = 'stat-box';
+            
+            // 检查值是否为对象（字典）
+            if (value && typeof value === 'object' && value.constructor === Object) {
+                // 对于字典类型，创建一个格式化的列表
+                let formattedList = '<ul class="list-unstyled mb-0">';
+                Object.entries(value).forEach(([k, v]) => {
+                    formattedList += `<li><span class="fw-bold">${k}</span>: ${v}</li>`;
+                });
+                formattedList += '</ul>';
+                
+                statBox.innerHTML = `
+                    <div class="stat-label">${key}</div>
+                    <div class="stat-value-list">${formattedList}</div>
+                `;
+            } else {
+                // 对于普通值，使用原来的展示方式
+                statBox.innerHTML = `
+                    <div class="stat-label">${key}</div>
+                    <div class="stat-value">${value}</div>
+                `;
+            }
+            
+            statsDiv.appendChild(statBox);
+        });
+        
+        sectionDiv.appendChild(statsDiv);
+    }
+    
+    // 添加内容
+    section.content.forEach(item => {
+        switch (item.type) {
+            case 'text':
+                const textDiv = document.createElement('div');
+                textDiv.className = 'mb-3';
+                textDiv.textContent = item.text;
+                sectionDiv.appendChild(textDiv);
+                break;
+                
+            case 'table':
+                const tableContainer = document.createElement('div');
+                tableContainer.className = 'table-responsive mb-3';
+                
+                if (item.description) {
+                    const desc = document.createElement('div');
+                    desc.className = 'mb-2';
+                    desc.textContent = item.description;
+                    tableContainer.appendChild(desc);
+                }
+                
+                const table = document.createElement('table');
+                table.className = 'table table-sm table-bordered table-hover';
+                
+                // 创建表头（表格以列名 + 行数组的紧凑格式返回）
+                if (item.columns && item.columns.length > 0) {
+                    const thead = document.createElement('thead');
+                    const headerRow = document.createElement('tr');
+                    item.columns.forEach(key => {
+                        const th = document.createElement('th');
+                        th.textContent = key;
+                        headerRow.appendChild(th);
+                    });
+                    thead.appendChild(headerRow);
+                    table.appendChild(thead);
+                    
+                    // 创建表体
+                    const tbody = document.createElement('tbody');
+                    appendTableRows(tbody, item.rows || []);
+                    table.appendChild(tbody);
+                }
+                
+                tableContainer.appendChild(table);
+                // 大表只返回首页，其余行按页从结果存储读取
+                if (item.handle && (item.rows || []).length < item.row_count) {
+                    tableContainer.appendChild(createLoadMore(item, table.querySelector('tbody')));
+                }
+                sectionDiv.appendChild(tableContainer);
+                break;
+        }
+    });
+    
+    return sectionDiv;
+}
+
+const RESULT_PAGE_SIZE = 100;
+
+function appendTableRows(tbody, rows) {
+    rows.forEach(row => {
+        const tr = document.createElement('tr');
+        row.forEach(value => {
+            const td = document.createElement('td');
+            td.textContent = value === null ? '' : value;
+            tr.appendChild(td);
+        });
+        tbody.appendChild(tr);
+    });
+}
+
+function createLoadMore(item, tbody) {
+    const footer = document.createElement('div');
+    footer.className = 'd-flex align-items-center gap-2';
+    const info = document.createElement('span');
+    info.className = 'text-muted small';
+    const button = document.createElement('button');
+    button.className = 'btn btn-sm btn-outline-secondary';
+    button.textContent = '加载更多';
+    
+    let loaded = (item.rows || []).length;
+    const updateInfo = () => {
+        info.textContent = `已显示 ${loaded} / ${item.row_count} 行`;
+        button.style.display = loaded < item.row_count ? '' : 'none';
+    };
+    button.onclick = async () => {
+        button.disabled = true;
+        try {
+            const response = await fetch(`/results/${item.handle}/rows?offset=${loaded}&limit=${RESULT_PAGE_SIZE}`);
+            const data = await response.json();
+            if (data.error) throw new Error(data.error);
+            appendTableRows(tbody, data.rows);
+            loaded += data.rows.length;
+            updateInfo();
+        } catch (error) {
+            info.textContent = `加载失败: ${error.message}`;
+        } finally {
+            button.disabled = false;
+        }
+    };
+    
+    updateInfo();
+    footer.appendChild(button);
+    footer.appendChild(info);
+    return footer;
+}
+
 function renderAnalysisResult(result) {
     const outputElement = document.getElementById('analysisOutput');
     outputElement.innerHTML = '';
@@ -291,108 +664,7 @@ function renderAnalysisResult(result) {
     const container = document.createElement('div');
     
     result.sections.forEach(section => {
-        const sectionDiv = document.createElement('div');
-        sectionDiv.className = 'mb-4';
-        
-        // 添加标题
-        const title = document.createElement('h5');
-        title.className = 'mb-3';
-        title.textContent = section.title;
-        sectionDiv.appendChild(title);
-        
-        // 添加统计数据
-        if (Object.keys(section.data).length > 0) {
-            const statsDiv = document.createElement('div');
-            statsDiv.className = 'stats-grid mb-3';
-            
-            Object.entries(section.data).forEach(([key, value]) => {
-                const statBox = document.createElement('div');
-                statBox.className = 'stat-box';
-                
-                // 检查值是否为对象（字典）
-                if (value && typeof value === 'object' && value.constructor === Object) {
-                    // 对于字典类型，创建一个格式化的列表
-                    let formattedList = '<ul class="list-unstyled mb-0">';
-                    Object.entries(value).forEach(([k, v]) => {
-                        formattedList += `<li><span class="fw-bold">${k}</span>: ${v}</li>`;
-                    });
-                    formattedList += '</ul>';
-                    
-                    statBox.innerHTML = `
-                        <div class="stat-label">${key}</div>
-                        <div class="stat-value-list">${formattedList}</div>
-                    `;
-                } else {
-                    // 对于普通值，使用原来的展示方式
-                    statBox.innerHTML = `
-                        <div class="stat-label">${key}</div>
-                        <div class="stat-value">${value}</div>
-                    `;
-                }
-                
-                statsDiv.appendChild(statBox);
-            });
-            
-            sectionDiv.appendChild(statsDiv);
-        }
-        
-        // 添加内容
-        section.content.forEach(item => {
-            switch (item.type) {
-                case 'text':
-                    const textDiv = document.createElement('div');
-                    textDiv.className = 'mb-3';
-                    textDiv.textContent = item.text;
-                    sectionDiv.appendChild(textDiv);
-                    break;
-                    
-                case 'table':
-                    const tableContainer = document.createElement('div');
-                    tableContainer.className = 'table-responsive mb-3';
-                    
-                    if (item.description) {
-                        const desc = document.createElement('div');
-                        desc.className = 'mb-2';
-                        desc.textContent = item.description;
-                        tableContainer.appendChild(desc);
-                    }
-                    
-                    const table = document.createElement('table');
-                    table.className = 'table table-sm table-bordered table-hover';
-                    
-                    // 创建表头
-                    if (item.data && item.data.length > 0) {
-                        const thead = document.createElement('thead');
-                        const headerRow = document.createElement('tr');
-                        Object.keys(item.data[0]).forEach(key => {
-                            const th = document.createElement('th');
-                            th.textContent = key;
-                            headerRow.appendChild(th);
-                        });
-                        thead.appendChild(headerRow);
-                        table.appendChild(thead);
-                        
-                        // 创建表体
-                        const tbody = document.createElement('tbody');
-                        item.data.forEach(row => {
-                            const tr = document.createElement('tr');
-                            Object.values(row).forEach(value => {
-                                const td = document.createElement('td');
-                                td.textContent = value;
-                                tr.appendChild(td);
-                            });
-                            tbody.appendChild(tr);
-                        });
-                        table.appendChild(tbody);
-                    }
-                    
-                    tableContainer.appendChild(table);
-                    sectionDiv.appendChild(tableContainer);
-                    break;
-            }
-        });
-        
-        container.appendChild(sectionDiv);
+        container.appendChild(renderSection(section));
     });
     
     outputElement.appendChild(container);
@@ -400,7 +672,7 @@ function renderAnalysisResult(result) {
 
 document.getElementById('regenerateBtn').onclick = async () => {
     if (isAnalyzing) return;
-    await performAnalysis(0);  // 从零开始重新生成
+    await performAnalysis(0, true);  // 从零开始重新生成，跳过已缓存的脚本
 };
 
 function handleAnalysisResponse(data) {
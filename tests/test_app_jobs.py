@@ -0,0 +1,31 @@
+import app as app_module
+from job_manager import JobManager
+
+
+def test_cookieless_submissions_share_user_quota(monkeypatch):
+    # 不启动工作线程，使任务保持排队状态
+    manager = JobManager(lambda job: {}, max_queued_per_user=1)
+    monkeypatch.setattr(manager, '_ensure_started', lambda: None)
+    monkeypatch.setattr(app_module, 'job_manager', manager)
+    client = app_module.app.test_client(use_cookies=False)
+    payload = {'filename': 'data.csv', 'query': '统计'}
+
+    first = client.post('/jobs', json=payload)
+    second = client.post('/jobs', json=payload)
+
+    assert first.status_code == 202
+    assert second.status_code == 429
+    assert 'Set-Cookie' not in first.headers
+
+
+def test_browser_session_gets_own_quota(monkeypatch):
+    manager = JobManager(lambda job: {}, max_queued_per_user=1)
+    monkeypatch.setattr(manager, '_ensure_started', lambda: None)
+    monkeypatch.setattr(app_module, 'job_manager', manager)
+    payload = {'filename': 'data.csv', 'query': '统计'}
+
+    browser = app_module.app.test_client()
+    browser.get('/')
+    assert browser.post('/jobs', json=payload).status_code == 202
+    api_client = app_module.app.test_client(use_cookies=False)
+    assert api_client.post('/jobs', json=payload).status_code == 202
@@ -0,0 +1,81 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from dataset_cache import DatasetCache, enable_copy_on_write, load_dataset, open_mapped_table
+from dataset_profiler import get_profile
+
+
+def _mapped_values(path, column):
+    chunks = open_mapped_table(path).column(column).chunks
+    assert len(chunks) == 1
+    return np.frombuffer(chunks[0].buffers()[1], dtype='float64')
+
+
+@pytest.mark.parametrize('streamed', [True, False])
+def test_zero_copy_load_shares_mapped_buffer(tmp_path, streamed):
+    if not enable_copy_on_write():
+        pytest.skip('pandas 不支持写时复制')
+    rows = 200000
+    source = tmp_path / 'data.csv'
+    pd.DataFrame({
+        'id': np.arange(rows),
+        'value': np.random.default_rng(0).random(rows),
+        'group': [f'g{i % 5}' for i in range(rows)]
+    }).to_csv(source, index=False)
+
+    cache = DatasetCache(folder=str(tmp_path / 'cache'))
+    dtypes = get_profile(str(source))['dtypes'] if streamed else None
+    path = cache.get_path(cache.ingest(str(source), dtypes))
+
+    df = load_dataset(path, zero_copy=True)
+    assert np.shares_memory(df['value'].to_numpy(), _mapped_values(path, 'value'))
+
+
+def test_streamed_rewrite_materializes_one_column_at_a_time(tmp_path):
+    # 在子进程中运行，Arrow 内存池的峰值不受其他测试影响
+    source = tmp_path / 'wide.csv'
+    rng = np.random.default_rng(0)
+    pd.DataFrame({f'v{i}': rng.random(300000) for i in range(8)}).to_csv(source, index=False)
+    script = f'''
+import pyarrow as pa
+from config import Config
+Config.PROFILE_CHUNK_ROWS = 20000
+from dataset_cache import DatasetCache, open_mapped_table
+from dataset_profiler import get_profile
+cache = DatasetCache(folder={str(tmp_path / 'cache')!r})
+path = cache.get_path(cache.ingest({str(source)!r}, get_profile({str(source)!r})['dtypes']))
+table = open_mapped_table(path)
+print(pa.default_memory_pool().max_memory(), table.get_total_buffer_size(), table.column(0).num_chunks)
+'''
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    output = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True, check=True)
+    peak, dataset_bytes, chunks = map(int, output.stdout.split()[-3:])
+    assert chunks == 1
+    # 逐列重写时峰值约为一列的大小，远小于整个数据集
+    assert peak < dataset_bytes / 2
+
+
+def test_lookups_reuse_mapping_and_evict_least_recently_used(tmp_path):
+    cache = DatasetCache(folder=str(tmp_path / 'cache'), max_bytes=10 ** 9)
+    ids = []
+    for name in ('a', 'b', 'c'):
+        source = tmp_path / f'{name}.csv'
+        pd.DataFrame({'value': np.arange(50000) * ord(name)}).to_csv(source, index=False)
+        ids.append(cache.ingest(str(source)))
+    # 刷新访问时间不应使已映射的表失效
+    first = cache.get_path(ids[0])
+    table = open_mapped_table(first)
+    assert open_mapped_table(cache.get_path(ids[0])) is table
+
+    # b 最久未访问，超限时最先淘汰
+    old = cache._find(ids[1])
+    os.utime(old, ns=(1, os.stat(old).st_mtime_ns))
+    cache.max_bytes = os.path.getsize(first) * 2
+    cache._evict()
+    assert cache.get_path(ids[1]) is None
+    assert cache.get_path(ids[0]) and cache.get_path(ids[2])
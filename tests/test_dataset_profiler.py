@@ -0,0 +1,24 @@
+import pandas as pd
+from openpyxl import Workbook
+
+from dataset_cache import DatasetCache
+from dataset_profiler import get_profile
+
+
+def test_duplicate_and_blank_xlsx_headers_match_ingested_columns(tmp_path):
+    source = tmp_path / 'data.xlsx'
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(['名称', '金额', '金额', None, '金额.1', '金额'])
+    sheet.append(['a', 1, 2, 'x', 3, 4])
+    sheet.append(['b', None, 5, 'y', 6, 7])
+    workbook.save(source)
+
+    profile = get_profile(str(source))
+    expected = [str(col) for col in pd.read_excel(source).columns]
+    assert profile['columns'] == expected
+    assert profile['row_count'] == 2
+
+    cache = DatasetCache(folder=str(tmp_path / 'cache'))
+    dataset_id = cache.ingest(str(source), profile['dtypes'])
+    assert list(cache.schema_dtypes(dataset_id)) == profile['columns']
@@ -0,0 +1,54 @@
+from analyzer import SCRIPT_EXAMPLE
+from script_validator import find_slow_patterns, validate_script
+
+
+def test_prompt_example_passes_checks():
+    assert validate_script(SCRIPT_EXAMPLE, ['班级', '学号', '姓名', '成绩']) is None
+    assert find_slow_patterns(SCRIPT_EXAMPLE) == []
+
+
+def test_loops_over_columns_and_small_lists_are_not_row_loops():
+    script = '''def analyze_data(df):
+    df = df.copy()
+    for col in df.columns.tolist():
+        df[col] = df[col].fillna(0)
+    for name in df['类别'].unique():
+        output.add_text(str(name))
+    counts = df['类别'].value_counts()
+    for name in counts.index:
+        output.add_stat(str(name), int(counts[name]))
+    labels = ['低', '中', '高']
+    for i in range(len(labels)):
+        output.add_text(labels[i])
+'''
+    assert find_slow_patterns(script) == []
+
+
+def test_row_loops_are_detected():
+    script = '''def analyze_data(df):
+    for i in range(len(df)):
+        pass
+    for idx in df.index:
+        pass
+    failed = df[df['成绩'] < 60]
+    for score in failed['成绩'].tolist():
+        pass
+    for row in df.iterrows():
+        pass
+    df['总分'] = df.apply(lambda row: row['a'] + row['b'], axis=1)
+'''
+    assert find_slow_patterns(script) == [
+        ('row_loop', 2), ('row_loop', 4), ('row_loop', 7), ('iterrows', 9), ('apply_axis1', 11)
+    ]
+
+
+def test_only_repeated_whole_frame_copies_are_reported():
+    script = '''def analyze_data(df):
+    df = df.copy()
+    passed = df[df['成绩'] >= 60].copy()
+    failed = df[df['成绩'] < 60].copy()
+    df = df.copy()
+    for name in ['a', 'b']:
+        snapshot = passed.copy()
+'''
+    assert find_slow_patterns(script) == [('repeated_copy', 5), ('repeated_copy', 7)]
@@ -0,0 +1,110 @@
+import os
+import re
+import zipfile
+import posixpath
+from xml.etree import ElementTree
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+try:
+    import python_calamine
+except ImportError:  # 可选依赖：未安装时使用 openpyxl 只读模式读取
+    python_calamine = None
+# pandas 2.2 起支持 calamine 引擎
+if tuple(int(part) for part in pd.__version__.split('.')[:2]) < (2, 2):
+    python_calamine = None
+
+EXCEL_EXTENSIONS = ('.xlsx', '.xlsm', '.xls')
+
+# 工作表XML开头的 <dimension ref="A1:H200"/> 记录了已使用区域
+_DIMENSION = re.compile(rb'<(?:\w+:)?dimension\s+ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+_SHEET_DATA = re.compile(rb'<(?:\w+:)?sheetData[\s>/]')
+
+
+def _column_number(letters: str) -> int:
+    number = 0
+    for char in letters:
+        number = number * 26 + ord(char) - ord('A') + 1
+    return number
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit('}', 1)[-1]
+
+
+def _read_dimension(archive: zipfile.ZipFile, member: str) -> Tuple[Optional[int], Optional[int]]:
+    """只读取工作表XML开头直到 sheetData 之前的部分，从 dimension 元素得到 (行数, 列数)"""
+    head = b''
+    with archive.open(member) as f:
+        while len(head) < 1024 * 1024:
+            block = f.read(16 * 1024)
+            if not block:
+                break
+            head += block
+            if _DIMENSION.search(head) or _SHEET_DATA.search(head):
+                break
+    match = _DIMENSION.search(head)
+    if match is None:
+        return None, None
+    first_col, first_row, last_col, last_row = match.groups()
+    if last_col is None:
+        last_col, last_row = first_col, first_row
+    rows = int(last_row) - int(first_row) + 1
+    columns = _column_number(last_col.decode()) - _column_number(first_col.decode()) + 1
+    return rows, columns
+
+
+def _xlsx_sheets(filepath: str) -> List[Dict[str, Any]]:
+    """解析工作簿目录和各工作表的 dimension，不读取任何单元格"""
+    with zipfile.ZipFile(filepath) as archive:
+        workbook = ElementTree.fromstring(archive.read('xl/workbook.xml'))
+        relations = ElementTree.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {rel.get('Id'): rel.get('Target') for rel in relations}
+        sheets = []
+        for element in workbook.iter():
+            if _local_name(element.tag) != 'sheet':
+                continue
+            rel_id = next((value for key, value in element.attrib.items() if _local_name(key) == 'id'), None)
+            target = targets.get(rel_id)
+            rows = columns = None
+            if target:
+                member = target.lstrip('/') if target.startswith('/') else posixpath.normpath(posixpath.join('xl', target))
+                if member in archive.namelist():
+                    rows, columns = _read_dimension(archive, member)
+            # 第一行为表头
+            sheets.append({
+                'name': element.get('name'),
+                'rows': max(rows - 1, 0) if rows else None,
+                'columns': columns
+            })
+        return sheets
+
+
+def list_sheets(filepath: str) -> List[Dict[str, Any]]:
+    """
+    列出工作簿中的工作表 [{name, rows, columns}]，不解析单元格数据；CSV文件返回空列表。
+    .xlsx/.xlsm 从工作表XML的 dimension 元素读取行列数，旧版 .xls 只返回名称。
+    """
+    file_ext = os.path.splitext(filepath)[1].lower()
+    if file_ext not in EXCEL_EXTENSIONS:
+        return []
+    if file_ext in ('.xlsx', '.xlsm'):
+        try:
+            return _xlsx_sheets(filepath)
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            print(f"读取工作簿目录失败: {e}")
+            return []
+    try:
+        with pd.ExcelFile(filepath, engine='calamine' if python_calamine is not None else None) as workbook:
+            return [{'name': str(name), 'rows': None, 'columns': None} for name in workbook.sheet_names]
+    except Exception as e:
+        print(f"读取工作簿目录失败: {e}")
+        return []
+
+
+def read_sheet(filepath: str, sheet: str = None) -> pd.DataFrame:
+    """
+    整表读取一个工作表（默认第一个）：安装了 python-calamine 时使用 calamine 引擎（Rust实现，明显快于 openpyxl），
+    否则使用 pandas 默认引擎（openpyxl 只读模式）。
+    """
+    engine = 'calamine' if python_calamine is not None else None
+    return pd.read_excel(filepath, sheet_name=sheet if sheet is not None else 0, engine=engine)